@@ -4,28 +4,58 @@ import random
 import json
 import os
 import math
-from enum import Enum
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional
 
+from puyo_engine import (PuyoEngine, PuyoColor, FixedTimestep, BOARD_WIDTH, BOARD_HEIGHT,
+                         SIMULATION_STEP, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN,
+                         ACTION_ROTATE, ACTION_END, landing_cells)
+from puyo_replay import Replay
+from puyo_hint import HintWorker
+from puyo_puzzle import load_puzzles
+
 # 定数
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
-BOARD_WIDTH = 6
-BOARD_HEIGHT = 12
 CELL_SIZE = 40
 BOARD_X = 50
 BOARD_Y = 50
+# パーティクルの速度・寿命の基準になる1フレームの長さ（60FPS、ミリ秒）
+PARTICLE_FRAME_TIME = 1000 / 60
+# 直前のゲームのリプレイを保存するファイル
+REPLAY_FILE = "last_replay.bin"
+# ヒント（おすすめの置き場所）の半透明表示の不透明度（0〜255）
+HINT_ALPHA = 110
+# 背景色
+BACKGROUND_COLOR = (50, 50, 50)
+# 「次のぷよ」に表示するぷよの大きさ
+NEXT_PUYO_SIZE = CELL_SIZE - 10
+# ぷよ画像のファイルと、あらかじめ縮小しておく大きさ（盤面のセル・次のぷよ）
+PUYO_IMAGE_FILES = {
+    PuyoColor.RED: "red.png",
+    PuyoColor.BLUE: "blue.png",
+    PuyoColor.GREEN: "green.png",
+    PuyoColor.YELLOW: "yellow.png",
+    PuyoColor.OJAMA: "ojama.png",
+}
+PUYO_IMAGE_SIZES = (CELL_SIZE, NEXT_PUYO_SIZE)
+# パーティクルの大きさの範囲（3連鎖以上では1.2倍）
+PARTICLE_MIN_SIZE = 2
+PARTICLE_MAX_SIZE = 6
+# スコアや次のぷよ、操作説明を表示する領域（盤面の右側）
+UI_RECT = pygame.Rect(BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, 0,
+                      WINDOW_WIDTH - (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20), WINDOW_HEIGHT)
 
-# 色定義
-class PuyoColor(Enum):
-    EMPTY = 0
-    RED = 1
-    BLUE = 2
-    GREEN = 3
-    YELLOW = 4
-    OJAMA = 5  # おじゃまぷよ
+# ゲーム操作に使うキーと操作の対応
+KEY_ACTIONS = {
+    pygame.K_LEFT: ACTION_LEFT,
+    pygame.K_RIGHT: ACTION_RIGHT,
+    pygame.K_DOWN: ACTION_DOWN,
+    pygame.K_SPACE: ACTION_ROTATE,
+    pygame.K_q: ACTION_END,  # Qキーでゲーム終了
+}
 
 # 色のRGB値（フォールバック用）
 COLORS = {
@@ -37,6 +67,39 @@ COLORS = {
     PuyoColor.OJAMA: (180, 180, 180)  # グレー
 }
 
+class TextCache:
+    """描画した文字の画像の表（容量を超えたら最も使われていないものから捨てる）
+
+    キーは (フォント, 文字列, 色)。値が変わったときだけ font.render で描き直す。
+    返す画像は共有なので、使う側で書き換えないこと。
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, tuple(color))
+        entries = self.entries
+        surface = entries.get(key)
+        if surface is not None:
+            entries.move_to_end(key)
+            return surface
+        surface = font.render(text, True, color)
+        entries[key] = surface
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+
+# ゲーム画面・ランキング画面・名前入力ダイアログで共有する文字の画像の表
+text_cache = TextCache()
+
+def render_text(font, text, color):
+    """文字をアンチエイリアスありで描いた画像（text_cache から使い回す）"""
+    return text_cache.render(font, text, color)
+
 # スコアランキング機能のデータ構造
 @dataclass
 class ScoreEntry:
@@ -348,17 +411,17 @@ class PlayerInputDialog:
         pygame.draw.rect(self.screen, (255, 255, 255), dialog_rect, 3)
         
         # タイトル
-        title_text = self.font.render("ハイスコア達成！", True, (255, 255, 0))
+        title_text = render_text(self.font, "ハイスコア達成！", (255, 255, 0))
         title_rect = title_text.get_rect(center=(WINDOW_WIDTH // 2, dialog_y + 30))
         self.screen.blit(title_text, title_rect)
         
         # スコア表示
-        score_text = self.small_font.render(f"スコア: {score}", True, (255, 255, 255))
+        score_text = render_text(self.small_font, f"スコア: {score}", (255, 255, 255))
         score_rect = score_text.get_rect(center=(WINDOW_WIDTH // 2, dialog_y + 60))
         self.screen.blit(score_text, score_rect)
         
         # 入力案内
-        prompt_text = self.small_font.render("プレイヤー名を入力してください:", True, (255, 255, 255))
+        prompt_text = render_text(self.small_font, "プレイヤー名を入力してください:", (255, 255, 255))
         prompt_rect = prompt_text.get_rect(center=(WINDOW_WIDTH // 2, dialog_y + 90))
         self.screen.blit(prompt_text, prompt_rect)
         
@@ -374,7 +437,7 @@ class PlayerInputDialog:
         
         # 入力テキスト
         if self.input_text or not self.cursor_visible:
-            text_surface = self.small_font.render(self.input_text, True, (0, 0, 0))
+            text_surface = render_text(self.small_font, self.input_text, (0, 0, 0))
             text_x = input_box_x + 5
             text_y = input_box_y + (input_box_height - text_surface.get_height()) // 2
             self.screen.blit(text_surface, (text_x, text_y))
@@ -387,7 +450,7 @@ class PlayerInputDialog:
                            (cursor_x, cursor_y), (cursor_x, cursor_y + 20), 2)
         
         # 操作案内
-        help_text = self.small_font.render("Enter: 確定  Escape: キャンセル", True, (200, 200, 200))
+        help_text = render_text(self.small_font, "Enter: 確定  Escape: キャンセル", (200, 200, 200))
         help_rect = help_text.get_rect(center=(WINDOW_WIDTH // 2, dialog_y + 160))
         self.screen.blit(help_text, help_rect)
 
@@ -443,7 +506,7 @@ class RankingDisplay:
         self.screen.fill((30, 30, 50))
         
         # タイトル
-        title_text = self.big_font.render("ランキング", True, (255, 255, 0))
+        title_text = render_text(self.big_font, "ランキング", (255, 255, 0))
         title_rect = title_text.get_rect(center=(WINDOW_WIDTH // 2, 50))
         self.screen.blit(title_text, title_rect)
         
@@ -452,7 +515,7 @@ class RankingDisplay:
         
         if not rankings:
             # ランキングが空の場合
-            no_data_text = self.font.render("まだ記録がありません", True, (255, 255, 255))
+            no_data_text = render_text(self.font, "まだ記録がありません", (255, 255, 255))
             no_data_rect = no_data_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
             self.screen.blit(no_data_text, no_data_rect)
         else:
@@ -484,11 +547,11 @@ class RankingDisplay:
         pygame.draw.rect(self.screen, (255, 255, 255), header_rect, 2)
         
         # ヘッダーテキスト
-        rank_text = self.small_font.render("順位", True, (255, 255, 255))
-        name_text = self.small_font.render("プレイヤー名", True, (255, 255, 255))
-        score_text = self.small_font.render("スコア", True, (255, 255, 255))
-        chain_text = self.small_font.render("最大連鎖", True, (255, 255, 255))
-        date_text = self.small_font.render("達成日時", True, (255, 255, 255))
+        rank_text = render_text(self.small_font, "順位", (255, 255, 255))
+        name_text = render_text(self.small_font, "プレイヤー名", (255, 255, 255))
+        score_text = render_text(self.small_font, "スコア", (255, 255, 255))
+        chain_text = render_text(self.small_font, "最大連鎖", (255, 255, 255))
+        date_text = render_text(self.small_font, "達成日時", (255, 255, 255))
         
         self.screen.blit(rank_text, (70, y_pos))
         self.screen.blit(name_text, (150, y_pos))
@@ -524,27 +587,27 @@ class RankingDisplay:
             text_color = (255, 255, 255)  # 白色
         
         # 順位
-        rank_text = self.small_font.render(f"{rank}", True, text_color)
+        rank_text = render_text(self.small_font, f"{rank}", text_color)
         self.screen.blit(rank_text, (80, y_pos))
         
         # プレイヤー名（長い場合は省略）
         player_name = entry.player_name
         if len(player_name) > 8:
             player_name = player_name[:7] + "..."
-        name_text = self.small_font.render(player_name, True, text_color)
+        name_text = render_text(self.small_font, player_name, text_color)
         self.screen.blit(name_text, (150, y_pos))
         
         # スコア
-        score_text = self.small_font.render(f"{entry.score:,}", True, text_color)
+        score_text = render_text(self.small_font, f"{entry.score:,}", text_color)
         self.screen.blit(score_text, (300, y_pos))
         
         # 最大連鎖
-        chain_text = self.small_font.render(f"{entry.chain_count}", True, text_color)
+        chain_text = render_text(self.small_font, f"{entry.chain_count}", text_color)
         self.screen.blit(chain_text, (430, y_pos))
         
         # 達成日時
         date_str = entry.date_time.strftime("%m/%d %H:%M")
-        date_text = self.small_font.render(date_str, True, text_color)
+        date_text = render_text(self.small_font, date_str, text_color)
         self.screen.blit(date_text, (520, y_pos))
     
     def draw_controls(self):
@@ -557,7 +620,7 @@ class RankingDisplay:
         
         y_offset = WINDOW_HEIGHT - 80
         for control in controls:
-            text = self.small_font.render(control, True, (200, 200, 200))
+            text = render_text(self.small_font, control, (200, 200, 200))
             self.screen.blit(text, (50, y_offset))
             y_offset += 25
 
@@ -566,6 +629,9 @@ class Particle:
     def __init__(self, x, y, puyo_color, velocity_x, velocity_y, chain_level=1):
         self.x = x
         self.y = y
+        # 1ステップ前の位置（描画時の補間用）
+        self.prev_x = x
+        self.prev_y = y
         self.puyo_color = puyo_color
         self.velocity_x = velocity_x
         self.velocity_y = velocity_y
@@ -574,7 +640,7 @@ class Particle:
         self.time = 0  # 時間カウンター（虹色エフェクト用）
         
         # 基本サイズ（連鎖レベルで調整）
-        base_size = random.randint(2, 6)
+        base_size = random.randint(PARTICLE_MIN_SIZE, PARTICLE_MAX_SIZE)
         if chain_level >= 3:
             self.size = int(base_size * 1.2)  # 3連鎖以上でサイズアップ
         else:
@@ -597,47 +663,56 @@ class Particle:
             self.gravity = 0.2
             self.color = COLORS.get(puyo_color, (255, 255, 255))
         
-    def update(self):
-        """パーティクルの状態を更新"""
-        self.time += 1  # 時間カウンター更新
+    def update(self, dt=PARTICLE_FRAME_TIME):
+        """パーティクルの状態をdtミリ秒ぶん更新"""
+        # 速度などは60FPSの1フレームあたりの値なので、経過時間で割合を掛ける
+        f = dt / PARTICLE_FRAME_TIME
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.time += f  # 時間カウンター更新
         
         # 虹色パーティクルの色更新
         if self.is_rainbow:
             self.color = self.get_rainbow_color()
             # 虹色は特別な動き（キラキラ）
-            self.velocity_x += random.uniform(-0.2, 0.2)
-            self.velocity_y += random.uniform(-0.2, 0.2)
+            self.velocity_x += random.uniform(-0.2, 0.2) * f
+            self.velocity_y += random.uniform(-0.2, 0.2) * f
         else:
             # 色別特殊効果
             if self.puyo_color == PuyoColor.RED:
                 # 赤：上昇気流効果（炎）
-                self.velocity_y -= 0.1  # 上向きの力
-                self.velocity_x += random.uniform(-0.2, 0.2)  # 揺らぎ
+                self.velocity_y -= 0.1 * f  # 上向きの力
+                self.velocity_x += random.uniform(-0.2, 0.2) * f  # 揺らぎ
             elif self.puyo_color == PuyoColor.BLUE:
                 # 青：重い水滴効果
                 pass  # 通常の重力のみ
             elif self.puyo_color == PuyoColor.GREEN:
                 # 緑：葉っぱの舞い散り効果
-                self.velocity_x += random.uniform(-0.3, 0.3)  # 横風
+                self.velocity_x += random.uniform(-0.3, 0.3) * f  # 横風
             elif self.puyo_color == PuyoColor.YELLOW:
                 # 黄：星の輝き効果（ランダム移動）
-                self.velocity_x += random.uniform(-0.1, 0.1)
-                self.velocity_y += random.uniform(-0.1, 0.1)
+                self.velocity_x += random.uniform(-0.1, 0.1) * f
+                self.velocity_y += random.uniform(-0.1, 0.1) * f
             elif self.puyo_color == PuyoColor.OJAMA:
                 # おじゃま：バウンド効果
-                if random.random() < 0.1:
+                if random.random() < 0.1 * f:
                     self.velocity_x = -self.velocity_x * 0.8
-                self.velocity_y += 0.3  # 重い
+                self.velocity_y += 0.3 * f  # 重い
         
         # 位置更新
-        self.x += self.velocity_x
-        self.y += self.velocity_y
+        self.x += self.velocity_x * f
+        self.y += self.velocity_y * f
         
         # 重力適用
-        self.velocity_y += self.gravity
+        self.velocity_y += self.gravity * f
         
         # 寿命減少
-        self.life -= 0.02  # 約50フレームで消滅
+        self.life -= 0.02 * f  # 約50フレーム（約0.8秒）で消滅
+    
+    def get_position(self, alpha=1.0):
+        """前のステップと現在の位置を補間した描画位置"""
+        return (int(self.prev_x + (self.x - self.prev_x) * alpha),
+                int(self.prev_y + (self.y - self.prev_y) * alpha))
         
     def is_alive(self):
         """生存判定"""
@@ -908,11 +983,71 @@ class DataPersistence:
             "longest_chain_ever": longest_chain
         }
 
+def create_alpha_surface(size):
+    """透明で塗りつぶした画像（画面の形式に合わせて速く描けるようにする）"""
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    try:
+        surface = surface.convert_alpha()
+    except pygame.error:
+        pass  # 画面がまだないとき（画面なしのテストなど）はそのまま使う
+    surface.fill((0, 0, 0, 0))
+    return surface
+
+def load_image(path):
+    """画像を読み込み、画面の形式に変換する（描くたびの形式変換をなくす）"""
+    image = pygame.image.load(path)
+    try:
+        image = image.convert_alpha()
+    except pygame.error:
+        pass  # 画面がまだないときはそのまま使う
+    return image
+
 class ParticleSystem:
     """パーティクルシステム管理クラス"""
     def __init__(self):
         self.particles = []
         self.max_particles = 500  # 最大パーティクル数
+        self.ojama_sprites = {}  # 大きさごとのおじゃまぷよパーティクルの画像
+        # パーティクルの大きさはすべて決まっているので、画像は先に作っておく
+        for base_size in range(PARTICLE_MIN_SIZE, PARTICLE_MAX_SIZE + 1):
+            self.get_ojama_sprite(base_size)
+            self.get_ojama_sprite(int(base_size * 1.2))
+        
+    def get_ojama_sprite(self, size):
+        """おじゃまぷよパーティクルの画像（大きさごとに一度だけ描く）
+
+        中心は画像の (size + 1, size + 1)。
+        """
+        sprite = self.ojama_sprites.get(size)
+        if sprite is not None:
+            return sprite
+        sprite = create_alpha_surface((size * 2 + 3, size * 2 + 3))
+        x = y = size + 1
+        # 灰色の円
+        pygame.draw.circle(sprite, (150, 150, 150), (x, y), size)
+        
+        # 赤い目（サイズに応じて調整）
+        eye_size = max(1, size // 3)
+        eye_offset = max(1, size // 3)
+        
+        # 左目
+        pygame.draw.circle(sprite, (255, 0, 0), 
+                         (x - eye_offset, y - eye_offset), 
+                         eye_size)
+        # 右目
+        pygame.draw.circle(sprite, (255, 0, 0), 
+                         (x + eye_offset, y - eye_offset), 
+                         eye_size)
+        
+        # 牙（簡易版）
+        if size > 3:
+            pygame.draw.polygon(sprite, (255, 255, 255), [
+                (x - size//2, y + eye_offset//2),
+                (x, y + size//2),
+                (x + size//2, y + eye_offset//2)
+            ])
+        self.ojama_sprites[size] = sprite
+        return sprite
         
     def emit_particles(self, x, y, puyo_color, count=8, chain_level=1):
         """パーティクルを生成"""
@@ -937,27 +1072,37 @@ class ParticleSystem:
             if len(self.particles) >= self.max_particles:
                 break
                 
-    def update(self):
-        """全パーティクルの更新"""
+    def update(self, dt=PARTICLE_FRAME_TIME):
+        """全パーティクルをdtミリ秒ぶん更新"""
         # 生きているパーティクルのみ更新
         alive_particles = []
         for particle in self.particles:
-            particle.update()
+            particle.update(dt)
             if particle.is_alive():
                 alive_particles.append(particle)
         
         self.particles = alive_particles
         
-    def draw(self, screen):
-        """全パーティクルの描画"""
+    def get_rects(self, interpolation=1.0):
+        """draw で各パーティクルが描かれる範囲（形や揺らぎを含めて少し大きめに取る）"""
+        rects = []
+        for particle in self.particles:
+            if particle.get_alpha() > 0:
+                x, y = particle.get_position(interpolation)
+                reach = particle.size * 2 + 3
+                rects.append(pygame.Rect(x - reach, y - reach, reach * 2 + 1, reach * 2 + 1))
+        return rects
+    
+    def draw(self, screen, interpolation=1.0):
+        """全パーティクルの描画（interpolationは次のステップまでの進み具合）"""
         for particle in self.particles:
             alpha = particle.get_alpha()
             if alpha > 0:
-                self.draw_particle_shape(screen, particle)
+                self.draw_particle_shape(screen, particle, interpolation)
     
-    def draw_particle_shape(self, screen, particle):
+    def draw_particle_shape(self, screen, particle, interpolation=1.0):
         """パーティクルの形状別描画"""
-        x, y = int(particle.x), int(particle.y)
+        x, y = particle.get_position(interpolation)
         size = particle.size
         color = particle.color
         
@@ -1000,68 +1145,31 @@ class ParticleSystem:
             pygame.draw.circle(screen, color, (x, y), max(1, star_size//3))
             
         elif particle.puyo_color == PuyoColor.OJAMA:
-            # おじゃま：添付画像風の小さなバージョン
-            # 灰色の円
-            pygame.draw.circle(screen, (150, 150, 150), (x, y), size)
-            
-            # 赤い目（サイズに応じて調整）
-            eye_size = max(1, size // 3)
-            eye_offset = max(1, size // 3)
-            
-            # 左目
-            pygame.draw.circle(screen, (255, 0, 0), 
-                             (x - eye_offset, y - eye_offset), 
-                             eye_size)
-            # 右目
-            pygame.draw.circle(screen, (255, 0, 0), 
-                             (x + eye_offset, y - eye_offset), 
-                             eye_size)
-            
-            # 牙（簡易版）
-            if size > 3:
-                pygame.draw.polygon(screen, (255, 255, 255), [
-                    (x - size//2, y + eye_offset//2),
-                    (x, y + size//2),
-                    (x + size//2, y + eye_offset//2)
-                ])
+            # おじゃま：添付画像風の小さなバージョン（大きさごとに描いておいた画像）
+            sprite = self.get_ojama_sprite(size)
+            screen.blit(sprite, (x - size - 1, y - size - 1))
             
         else:
             # デフォルト：円形（バックアップ）
             pygame.draw.circle(screen, color, (x, y), size)
 
-class PuyoGame:
-    def __init__(self):
+class PuyoGame(PuyoEngine):
+    def __init__(self, puzzle=None):
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("ぷよぷよゲーム")
         self.clock = pygame.time.Clock()
+        # 描画のフレームレート。ゲームの進行は固定ステップなので、変えても速さは同じ
+        self.fps = 60
+        self.timestep = FixedTimestep()
         
-        # ゲームボード初期化
-        self.board = [[PuyoColor.EMPTY for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
-        
-        # 現在のぷよペア
-        self.current_puyo = self.create_new_puyo()
-        self.next_puyo = self.create_new_puyo()  # 次のぷよ
-        self.puyo_x = BOARD_WIDTH // 2 - 1
-        self.puyo_y = 0
-        self.puyo_rotation = 0  # 0:上, 1:右, 2:下, 3:左
-        
-        # 落下タイマー
-        self.fall_timer = 0
-        self.fall_speed = 500  # ミリ秒
-        self.base_fall_speed = 500  # 基本落下速度
+        # ゲームルール（ボード、ぷよペア、スコア、レベル、おじゃまぷよ）の初期化
+        super().__init__()
+        # 連鎖は毎フレーム少しずつ進める（消去→落下の各段階を150ミリ秒ずつ見せる）
+        self.chain_delay = 150
+        # 操作とシードを記録（ゲームオーバー時に REPLAY_FILE へ保存）
+        self.replay = Replay.start_recording(self)
         
-        # レベルシステム
-        self.level = 1
-        self.lines_cleared = 0  # 消去したライン数（連鎖回数）
-        
-        # おじゃまぷよシステム
-        self.ojama_timer = 0
-        self.ojama_interval = 30000  # 30秒ごとにおじゃまぷよ
-        self.ojama_count = 0  # 次に落とすおじゃまぷよの数
-        
-        # スコアシステム
-        self.score = 0
         # 日本語対応フォント
         try:
             self.font = pygame.font.Font("C:/Windows/Fonts/msgothic.ttc", 36)
@@ -1073,11 +1181,11 @@ class PuyoGame:
             self.small_font = pygame.font.SysFont("msgothic", 24)
             self.big_font = pygame.font.SysFont("msgothic", 72)
         
-        # ゲーム状態
-        self.game_over = False
-        
-        # ぷよ画像を読み込み
-        self.puyo_images = self.load_puyo_images()
+        # ぷよ画像を読み込み（大きさごとに縮小済み）
+        self.puyo_sprites = self.load_puyo_images()
+        self.puyo_images = self.puyo_sprites[CELL_SIZE] if self.puyo_sprites else None
+        self.next_puyo_images = self.puyo_sprites[NEXT_PUYO_SIZE] if self.puyo_sprites else None
+        self.ojama_cell_image = None  # 最初に描くときに作る
         
         # ハイスコアシステム
         self.high_score = self.load_high_score()
@@ -1090,32 +1198,48 @@ class PuyoGame:
         self.player_input_dialog = PlayerInputDialog(self.screen, self.font, self.small_font)
         self.ranking_display = RankingDisplay(self.screen, self.font, self.small_font, self.big_font)
         self.game_start_time = datetime.now()
-        self.max_chain_count = 0  # 最大連鎖数を記録
+        
+        # ヒント表示（Hキーで切り替え、表示中だけ HintWorker のスレッドが動く）
+        self.hint_worker = None
+        self.hint_images = {}  # 色ごとの半透明のぷよ
+        
+        # なぞぷよモード（puyo_puzzle.Puzzle を渡すとその盤面とペアで始める）
+        self.puzzle = puzzle
+        self.puzzle_cleared = None  # クリアならTrue、失敗ならFalse、途中ならNone
+        
+        # 変わった領域だけを描き直すための盤面の層
+        self.init_board_layer()
+        
+        if self.puzzle:
+            self.reset_game()
         
     def load_puyo_images(self):
-        """ぷよ画像を読み込み"""
+        """ぷよ画像を読み込み、PUYO_IMAGE_SIZES の大きさごとに縮小しておく
+
+        {大きさ: {色: 画像}} を返す（読み込めなければNone）。
+        """
         images = {}
         try:
-            images[PuyoColor.RED] = pygame.image.load("red.png")
-            images[PuyoColor.BLUE] = pygame.image.load("blue.png")
-            images[PuyoColor.GREEN] = pygame.image.load("green.png")
-            images[PuyoColor.YELLOW] = pygame.image.load("yellow.png")
+            for color in (PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW):
+                images[color] = load_image(PUYO_IMAGE_FILES[color])
             
             # おじゃまぷよ画像を読み込み
             try:
-                images[PuyoColor.OJAMA] = pygame.image.load("ojama.png")
+                images[PuyoColor.OJAMA] = load_image(PUYO_IMAGE_FILES[PuyoColor.OJAMA])
             except:
                 print("おじゃまぷよ画像の読み込みに失敗しました")
-            
-            # 画像をセルサイズにリサイズ
-            for color in images:
-                images[color] = pygame.transform.scale(images[color], (CELL_SIZE, CELL_SIZE))
                 
         except pygame.error as e:
             print(f"画像の読み込みに失敗しました: {e}")
             return None
-            
-        return images
+        
+        # 画像をセルサイズにリサイズし、ほかの大きさはセルサイズの画像から縮小する
+        # （変換済みの画像から縮小するので、縮小した画像も画面の形式のまま）
+        cell_images = {color: pygame.transform.scale(image, (CELL_SIZE, CELL_SIZE))
+                       for color, image in images.items()}
+        return {size: {color: pygame.transform.scale(image, (size, size))
+                       for color, image in cell_images.items()}
+                for size in PUYO_IMAGE_SIZES}
     
     def load_high_score(self):
         """ハイスコアを読み込み"""
@@ -1137,32 +1261,19 @@ class PuyoGame:
         except IOError:
             print("ハイスコアの保存に失敗しました")
     
-    def create_new_puyo(self):
-        """新しいぷよペアを作成"""
-        colors = [PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW]
-        return [random.choice(colors), random.choice(colors)]
-    
-    def get_puyo_positions(self):
-        """現在のぷよペアの位置を取得"""
-        # 回転に応じた副ぷよの相対位置
-        rotation_offsets = [
-            (0, -1),  # 0: 上
-            (1, 0),   # 1: 右
-            (0, 1),   # 2: 下
-            (-1, 0)   # 3: 左
-        ]
-        
-        main_pos = (self.puyo_x, self.puyo_y)
-        offset_x, offset_y = rotation_offsets[self.puyo_rotation]
-        sub_pos = (self.puyo_x + offset_x, self.puyo_y + offset_y)
-        
-        return main_pos, sub_pos
+    def save_replay(self):
+        """リプレイを保存"""
+        self.replay.finish(self)
+        try:
+            self.replay.save(REPLAY_FILE)
+        except IOError:
+            print("リプレイの保存に失敗しました")
     
     def run(self):
         """メインゲームループ"""
         running = True
         while running:
-            dt = self.clock.tick(60)
+            dt = self.clock.tick(self.fps)
             
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -1170,23 +1281,25 @@ class PuyoGame:
                 elif event.type == pygame.KEYDOWN:
                     self.handle_input(event.key)
             
-            # ぷよの自動落下（ゲームオーバー時は停止）
-            if not self.game_over:
-                self.fall_timer += dt
-                if self.fall_timer >= self.fall_speed:
-                    self.move_puyo_down()
-                    self.fall_timer = 0
+            # 経過時間ぶんだけ固定ステップで進める
+            # （ぷよの自動落下・おじゃまぷよタイマー・パーティクル）
+            for _ in range(self.timestep.advance(dt)):
+                self.step()
+                self.particle_system.update(SIMULATION_STEP)
             
-            # パーティクルシステム更新
-            self.particle_system.update()
+            # なぞぷよモードでは目標を達成するかペアを使い切ったら終わり
+            if self.puzzle and not self.game_over:
+                self.check_puzzle()
             
-            # おじゃまぷよタイマー更新
-            self.update_ojama_timer(dt)
+            # 新しいペアが出ていればヒントを探し直す（待たずにすぐ戻る）
+            if self.hint_worker:
+                self.hint_worker.update(self)
             
-            # 描画
-            self.draw()
-            pygame.display.flip()
+            # 描画（変わった領域だけを画面に送る）
+            pygame.display.update(self.draw())
         
+        if self.hint_worker:
+            self.hint_worker.stop()
         pygame.quit()
         sys.exit()
     
@@ -1198,470 +1311,353 @@ class PuyoGame:
                 self.reset_game()
             elif key == pygame.K_l:  # Lキーでランキング表示
                 self.ranking_display.show_ranking(self.ranking_manager)
+                self.full_redraw = True
             elif key == pygame.K_q:
                 pygame.quit()
                 sys.exit()
         else:
-            # 通常のゲーム操作
-            if key == pygame.K_LEFT:
-                self.move_puyo(-1, 0)
-            elif key == pygame.K_RIGHT:
-                self.move_puyo(1, 0)
-            elif key == pygame.K_DOWN:
-                self.move_puyo_down()
-            elif key == pygame.K_SPACE:
-                self.rotate_puyo()
-            elif key == pygame.K_q:  # Qキーでゲーム終了
-                self.end_game()
+            # 通常のゲーム操作（リプレイに記録される）
+            if key in KEY_ACTIONS:
+                self.apply_action(KEY_ACTIONS[key])
             elif key == pygame.K_l:  # Lキーでランキング表示
                 self.ranking_display.show_ranking(self.ranking_manager)
+                self.full_redraw = True
+            elif key == pygame.K_h:  # Hキーでヒント表示の切り替え
+                self.toggle_hint()
             elif key == pygame.K_t:  # テスト用：虹色パーティクル生成
                 # 画面中央に虹色パーティクル生成
                 center_x = BOARD_X + (BOARD_WIDTH * CELL_SIZE) // 2
                 center_y = BOARD_Y + (BOARD_HEIGHT * CELL_SIZE) // 2
                 self.particle_system.emit_particles(center_x, center_y, PuyoColor.RED, 10, 5)
     
-    def move_puyo(self, dx, dy):
-        """ぷよを移動"""
-        new_x = self.puyo_x + dx
-        new_y = self.puyo_y + dy
-        
-        if self.is_valid_position(new_x, new_y):
-            self.puyo_x = new_x
-            self.puyo_y = new_y
-            return True
-        return False
-    
-    def move_puyo_down(self):
-        """ぷよを下に移動"""
-        if not self.move_puyo(0, 1):
-            # 着地したらボードに配置
-            self.place_puyo()
-            # 着地後に重力を適用（個別のぷよが独立して落下）
-            self.apply_gravity()
-            self.check_chains()
-            
-            # ゲームオーバーチェック
-            if self.check_game_over():
-                self.game_over = True
-                
-                # ランキング記録処理
-                self.record_score()
-                
-                # ハイスコア更新チェック
-                if self.score > self.high_score:
-                    self.high_score = self.score
-                    self.save_high_score()
-                return
-            
-            # 次のぷよを現在のぷよにして、新しい次のぷよを生成
-            self.current_puyo = self.next_puyo
-            self.next_puyo = self.create_new_puyo()
-            self.puyo_x = BOARD_WIDTH // 2 - 1
-            self.puyo_y = 0
-            self.puyo_rotation = 0
-    
-    def is_valid_position(self, x, y, rotation=None):
-        """位置が有効かチェック"""
-        if rotation is None:
-            rotation = self.puyo_rotation
-            
-        # 回転に応じた副ぷよの相対位置
-        rotation_offsets = [
-            (0, -1),  # 0: 上
-            (1, 0),   # 1: 右
-            (0, 1),   # 2: 下
-            (-1, 0)   # 3: 左
-        ]
-        
-        # 主ぷよの位置チェック
-        if x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT:
-            return False
-        if self.board[y][x] != PuyoColor.EMPTY:
-            return False
-        
-        # 副ぷよの位置チェック
-        offset_x, offset_y = rotation_offsets[rotation]
-        sub_x, sub_y = x + offset_x, y + offset_y
-        
-        if sub_x < 0 or sub_x >= BOARD_WIDTH or sub_y < 0 or sub_y >= BOARD_HEIGHT:
-            return False
-        if self.board[sub_y][sub_x] != PuyoColor.EMPTY:
-            return False
-        
-        return True
-    
-    def place_puyo(self):
-        """ぷよをボードに配置"""
-        main_pos, sub_pos = self.get_puyo_positions()
-        self.board[main_pos[1]][main_pos[0]] = self.current_puyo[0]
-        self.board[sub_pos[1]][sub_pos[0]] = self.current_puyo[1]
-    
-    def rotate_puyo(self):
-        """ぷよを回転（4方向回転）- 壁キック機能付き"""
-        new_rotation = (self.puyo_rotation + 1) % 4
-        
-        # 回転後の位置が有効かチェック
-        if self.is_valid_position(self.puyo_x, self.puyo_y, new_rotation):
-            # 通常回転
-            self.puyo_rotation = new_rotation
+    def toggle_hint(self):
+        """ヒント表示のオン・オフ"""
+        if self.hint_worker:
+            self.hint_worker.stop()
+            self.hint_worker = None
         else:
-            # 壁キック処理（左右に1マスずらして回転を試みる）
-            kick_offsets = [1, -1, 2, -2]  # 右、左、右2マス、左2マス
-            for offset in kick_offsets:
-                if self.is_valid_position(self.puyo_x + offset, self.puyo_y, new_rotation):
-                    self.puyo_x += offset
-                    self.puyo_rotation = new_rotation
-                    break
-    
-    def check_chains(self):
-        """連鎖チェック - 4つ以上つながったぷよを消去"""
-        chains_found = True
-        chain_count = 0
-        total_score = 0
-        
-        while chains_found:
-            chains_found = False
-            to_remove = set()
-            groups = []  # 消去されるグループを記録
-            
-            # 各セルから連結チェック
-            for y in range(BOARD_HEIGHT):
-                for x in range(BOARD_WIDTH):
-                    if self.board[y][x] != PuyoColor.EMPTY:
-                        connected = self.find_connected_puyos(x, y, self.board[y][x])
-                        if len(connected) >= 4:
-                            # 既に処理済みのぷよは除外
-                            new_connected = [pos for pos in connected if pos not in to_remove]
-                            if new_connected:
-                                to_remove.update(new_connected)
-                                groups.append(new_connected)
-                                chains_found = True
-            
-            # 連結したぷよを消去してスコア計算
-            if to_remove:
-                chain_count += 1
-                
-                # スコア計算（連鎖数とぷよ数に応じて）
-                chain_bonus = chain_count * 50  # 連鎖ボーナス
-                puyo_score = len(to_remove) * 10  # ぷよ1個につき10点
-                round_score = puyo_score + chain_bonus
-                total_score += round_score
-                
-                # おじゃまぷよも消去（隣接するものを探す）
-                ojama_to_remove = set()
-                for x, y in to_remove:
-                    # 隣接する4方向をチェック
-                    for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                        nx, ny = x + dx, y + dy
-                        if (0 <= nx < BOARD_WIDTH and 0 <= ny < BOARD_HEIGHT and 
-                            self.board[ny][nx] == PuyoColor.OJAMA):
-                            ojama_to_remove.add((nx, ny))
-                
-                # フェードアウトアニメーションとパーティクル生成を同時に行う
-                self.animate_puyo_removal(to_remove, ojama_to_remove, chain_count)
-                
-                # 重力適用（ぷよを下に落とす）
-                self.apply_gravity()
-                
-                # 少し待機（連鎖の視覚効果）
-                pygame.time.wait(300)
-                self.draw()
-                pygame.display.flip()
-        
-        # 総スコアを加算
-        self.score += total_score
-        
-        # 連鎖があった場合、レベルアップをチェック
-        if chain_count > 0:
-            self.lines_cleared += chain_count
-            self.update_level()
-            # 最大連鎖数を記録
-            self.max_chain_count = max(self.max_chain_count, chain_count)
-        
-        return chain_count
+            self.hint_worker = HintWorker()
+    
+    def get_hint_image(self, color):
+        """ヒント用の半透明のぷよ（色ごとに一度だけ作る）"""
+        image = self.hint_images.get(color)
+        if image is None:
+            image = create_alpha_surface((CELL_SIZE, CELL_SIZE))
+            if self.puyo_images and color in self.puyo_images:
+                image.blit(self.puyo_images[color], (0, 0))
+            else:
+                pygame.draw.rect(image, COLORS[color], image.get_rect())
+                pygame.draw.rect(image, (255, 255, 255), image.get_rect(), 2)
+            image.set_alpha(HINT_ALPHA)
+            self.hint_images[color] = image
+        return image
+    
+    def get_hint_cells(self):
+        """おすすめの置き場所に着地したときのぷよ（位置 → 色、半透明で描く）"""
+        if not self.hint_worker or self.game_over or self.is_resolving_chains():
+            return {}
+        placement = self.hint_worker.get(self)
+        if placement is None:
+            return {}
+        floors = [BOARD_HEIGHT - 1 - height for height in self.heights]
+        _, main_pos, sub_pos = landing_cells(floors, placement.x, placement.rotation)
+        return {tuple(pos): color
+                for pos, color in ((main_pos, self.current_puyo[0]), (sub_pos, self.current_puyo[1]))
+                if pos[1] >= 0}
+    
+    def on_ojama_dropped(self, x, y):
+        """おじゃまぷよ落下時のパーティクルエフェクト"""
+        pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
+        pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
+        self.particle_system.emit_particles(pixel_x, pixel_y, PuyoColor.OJAMA, 3, 1)
+    
+    def check_puzzle(self):
+        """なぞぷよの目標を達成したか・失敗したかを調べる"""
+        result = self.puzzle.result(self)
+        if result is not None:
+            self.puzzle_cleared = result
+            self.game_over = True
     
-    def find_connected_puyos(self, start_x, start_y, color):
-        """指定した色のつながったぷよを探す（深度優先探索）"""
-        if color == PuyoColor.EMPTY:
-            return []
-        
-        visited = set()
-        stack = [(start_x, start_y)]
-        connected = []
-        
-        # 4方向（上下左右）
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        
-        while stack:
-            x, y = stack.pop()
-            
-            if (x, y) in visited:
-                continue
-            
-            if (x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT or
-                self.board[y][x] != color):
-                continue
-            
-            visited.add((x, y))
-            connected.append((x, y))
-            
-            # 隣接セルをスタックに追加
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-                if (nx, ny) not in visited:
-                    stack.append((nx, ny))
-        
-        return connected
-    
-    def update_level(self):
-        """レベルアップをチェックして落下速度を調整"""
-        # 10連鎖ごとにレベルアップ
-        new_level = (self.lines_cleared // 10) + 1
-        
-        if new_level > self.level:
-            self.level = new_level
-            # レベルが上がるごとに落下速度を速くする
-            # レベル1: 500ms, レベル2: 400ms, レベル3: 320ms...
-            self.fall_speed = max(50, self.base_fall_speed - (self.level - 1) * 80)
-    
-    def apply_gravity(self):
-        """重力を適用してぷよを下に落とす"""
-        for x in range(BOARD_WIDTH):
-            # 各列で空でないぷよを下に詰める
-            column = []
-            for y in range(BOARD_HEIGHT):
-                if self.board[y][x] != PuyoColor.EMPTY:
-                    column.append(self.board[y][x])
-            
-            # 列をクリアして下から詰め直す
-            for y in range(BOARD_HEIGHT):
-                self.board[y][x] = PuyoColor.EMPTY
-            
-            # 下から順番に配置
-            for i, puyo in enumerate(reversed(column)):
-                self.board[BOARD_HEIGHT - 1 - i][x] = puyo
-    
-    def check_game_over(self):
-        """ゲームオーバー判定"""
-        # 新しいぷよが配置できるかチェック
-        start_x = BOARD_WIDTH // 2 - 1
-        start_y = 1  # y=1から開始
-        
-        # 4つの回転状態すべてで配置可能かチェック
-        for rotation in range(4):
-            if self.is_valid_position(start_x, start_y, rotation):
-                return False  # どれか1つでも配置できればゲーム続行
-        
-        # どの回転でも配置できない場合のみゲームオーバー
-        return True
-    
-    def update_ojama_timer(self, dt):
-        """おじゃまぷよタイマーの更新"""
-        self.ojama_timer += dt
-        if self.ojama_timer >= self.ojama_interval:
-            self.ojama_timer = 0
-            # レベルに応じておじゃまぷよの数を決定
-            self.ojama_count += self.level
-            self.drop_ojama_puyos()
-    
-    def drop_ojama_puyos(self):
-        """おじゃまぷよを落とす"""
-        if self.ojama_count <= 0:
+    def on_game_over(self):
+        """ゲームオーバー時の記録処理"""
+        if self.puzzle:
+            # なぞぷよはランキングやハイスコアに記録しない
+            self.puzzle_cleared = bool(self.puzzle.result(self))
             return
-            
-        # 各列にランダムにおじゃまぷよを配置
-        columns = list(range(BOARD_WIDTH))
-        random.shuffle(columns)
-        
-        for i in range(min(self.ojama_count, BOARD_WIDTH)):
-            col = columns[i]
-            # 列の一番上の空きマスを探す
-            for row in range(BOARD_HEIGHT):
-                if self.board[row][col] == PuyoColor.EMPTY:
-                    self.board[row][col] = PuyoColor.OJAMA
-                    # パーティクルエフェクト
-                    pixel_x = BOARD_X + col * CELL_SIZE + CELL_SIZE // 2
-                    pixel_y = BOARD_Y + row * CELL_SIZE + CELL_SIZE // 2
-                    self.particle_system.emit_particles(pixel_x, pixel_y, PuyoColor.OJAMA, 3, 1)
-                    break
+        self.save_replay()
         
-        # 残りのおじゃまぷよを次回に持ち越し
-        self.ojama_count -= min(self.ojama_count, BOARD_WIDTH)
+        # ランキング記録処理
+        self.record_score()
         
-        # 重力適用
-        self.apply_gravity()
-        
-    def reset_game(self):
+        # ハイスコア更新チェック
+        if self.score > self.high_score:
+            self.high_score = self.score
+            self.save_high_score()
+    
+    def remove_puyos(self, groups, ojama_to_remove, chain_count):
+        """フェードアウトアニメーションとパーティクル生成を行ってから消去"""
+        self.animate_puyo_removal(groups, ojama_to_remove, chain_count)
+        super().remove_puyos(groups, ojama_to_remove, chain_count)
+    
+    def reset_game(self, seed=None, pair_queue=None):
         """ゲームリセット"""
-        self.board = [[PuyoColor.EMPTY for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
-        self.current_puyo = self.create_new_puyo()
-        self.next_puyo = self.create_new_puyo()  # 次のぷよも生成
-        self.puyo_x = BOARD_WIDTH // 2 - 1
-        self.puyo_y = 0
-        self.puyo_rotation = 0
-        self.score = 0
-        self.game_over = False
-        self.fall_timer = 0
-        # レベルシステムもリセット
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = self.base_fall_speed
-        
-        # おじゃまぷよリセット
-        self.ojama_timer = 0
-        self.ojama_count = 0
+        if self.puzzle and pair_queue is None:
+            pair_queue = self.puzzle.pair_queue()
+        super().reset_game(seed, pair_queue)
+        if self.puzzle:
+            # なぞぷよは同じ盤面からやり直す
+            self.puzzle.setup(self)
+            self.puzzle_cleared = None
+        self.replay = Replay.start_recording(self)
         
         # ランキング関連もリセット
         self.game_start_time = datetime.now()
-        self.max_chain_count = 0
-    
-    def end_game(self):
-        """ゲームを手動で終了"""
-        if not self.game_over:
-            self.game_over = True
-            
-            # ランキング記録処理
-            self.record_score()
-            
-            # ハイスコア更新チェック
-            if self.score > self.high_score:
-                self.high_score = self.score
-                self.save_high_score()
+        # ゲームオーバーの幕を消すため画面全体を描き直す
+        self.full_redraw = True
     
     def draw(self):
-        """画面描画"""
-        self.screen.fill((50, 50, 50))
-        
-        # ボード描画
-        for y in range(BOARD_HEIGHT):
-            for x in range(BOARD_WIDTH):
-                rect = pygame.Rect(
-                    BOARD_X + x * CELL_SIZE,
-                    BOARD_Y + y * CELL_SIZE,
-                    CELL_SIZE,
-                    CELL_SIZE
-                )
-                
-                # 空のセルは黒で塗りつぶし
-                if self.board[y][x] == PuyoColor.EMPTY:
-                    pygame.draw.rect(self.screen, (0, 0, 0), rect)
-                    pygame.draw.rect(self.screen, (255, 255, 255), rect, 1)
-                elif self.board[y][x] == PuyoColor.OJAMA:
-                    # おじゃまぷよは特別描画（添付画像風）
-                    # 灰色の円
-                    color = (150, 150, 150)  # 灰色
-                    pygame.draw.circle(self.screen, color, 
-                                     (rect.centerx, rect.centery), 
-                                     CELL_SIZE // 2 - 2)
-                    
-                    # 赤い目（左）
-                    eye_radius = CELL_SIZE // 6
-                    eye_offset = CELL_SIZE // 6
-                    pygame.draw.circle(self.screen, (255, 0, 0), 
-                                     (rect.centerx - eye_offset, rect.centery - eye_offset), 
-                                     eye_radius)
-                    # 赤い目（右）
-                    pygame.draw.circle(self.screen, (255, 0, 0), 
-                                     (rect.centerx + eye_offset, rect.centery - eye_offset), 
-                                     eye_radius)
-                    
-                    # 白い光沢（目の中）
-                    pygame.draw.circle(self.screen, (255, 255, 255), 
-                                     (rect.centerx - eye_offset, rect.centery - eye_offset - 1), 
-                                     eye_radius // 3)
-                    pygame.draw.circle(self.screen, (255, 255, 255), 
-                                     (rect.centerx + eye_offset, rect.centery - eye_offset - 1), 
-                                     eye_radius // 3)
-                    
-                    # 白い牙（三角形）
-                    teeth_width = CELL_SIZE // 3
-                    teeth_height = CELL_SIZE // 5
-                    teeth_y = rect.centery + eye_offset
-                    
-                    # 左の牙
-                    pygame.draw.polygon(self.screen, (255, 255, 255), [
-                        (rect.centerx - teeth_width, teeth_y),
-                        (rect.centerx - teeth_width//2, teeth_y + teeth_height),
-                        (rect.centerx, teeth_y)
-                    ])
-                    
-                    # 中央の牙
-                    pygame.draw.polygon(self.screen, (255, 255, 255), [
-                        (rect.centerx - teeth_width//2, teeth_y),
-                        (rect.centerx, teeth_y + teeth_height),
-                        (rect.centerx + teeth_width//2, teeth_y)
-                    ])
-                    
-                    # 右の牙
-                    pygame.draw.polygon(self.screen, (255, 255, 255), [
-                        (rect.centerx, teeth_y),
-                        (rect.centerx + teeth_width//2, teeth_y + teeth_height),
-                        (rect.centerx + teeth_width, teeth_y)
-                    ])
-                else:
-                    # 通常ぷよ画像を使用（フォールバック付き）
-                    if self.puyo_images and self.board[y][x] in self.puyo_images:
-                        self.screen.blit(self.puyo_images[self.board[y][x]], rect)
-                    else:
-                        # 画像が読み込めない場合は色で描画
-                        color = COLORS[self.board[y][x]]
-                        pygame.draw.rect(self.screen, color, rect)
-                        pygame.draw.rect(self.screen, (255, 255, 255), rect, 2)
-        
-        # 現在のぷよ描画
-        if self.current_puyo:
-            main_pos, sub_pos = self.get_puyo_positions()
-            
-            # 主ぷよ
-            rect1 = pygame.Rect(
-                BOARD_X + main_pos[0] * CELL_SIZE,
-                BOARD_Y + main_pos[1] * CELL_SIZE,
-                CELL_SIZE,
-                CELL_SIZE
-            )
-            if self.puyo_images and self.current_puyo[0] in self.puyo_images:
-                self.screen.blit(self.puyo_images[self.current_puyo[0]], rect1)
-            else:
-                pygame.draw.rect(self.screen, COLORS[self.current_puyo[0]], rect1)
-                pygame.draw.rect(self.screen, (255, 255, 255), rect1, 2)
-            
-            # 副ぷよ
-            rect2 = pygame.Rect(
-                BOARD_X + sub_pos[0] * CELL_SIZE,
-                BOARD_Y + sub_pos[1] * CELL_SIZE,
-                CELL_SIZE,
-                CELL_SIZE
-            )
-            if self.puyo_images and self.current_puyo[1] in self.puyo_images:
-                self.screen.blit(self.puyo_images[self.current_puyo[1]], rect2)
-            else:
-                pygame.draw.rect(self.screen, COLORS[self.current_puyo[1]], rect2)
-                pygame.draw.rect(self.screen, (255, 255, 255), rect2, 2)
+        """画面描画（前のフレームから変わった領域だけを描き直し、その矩形のリストを返す）
+
+        盤面・ヒント・操作中のぷよは board_layer に描いておき、変わったマスだけを
+        描き直す。画面へは変わった領域を board_layer から写してからパーティクルと
+        UIを重ねるので、返した矩形を pygame.display.update に渡せば画面全体を
+        送り直さなくてよい（何も変わらないフレームでは空のリストになる）。
+        """
+        board_rects = self.update_board_layer()
+        alpha = self.timestep.alpha
+        particle_rects = self.particle_system.get_rects(alpha)
+        ui_state = self.get_ui_state()
+        ui_changed = ui_state != self.drawn_ui_state
+        dirty = board_rects + self.drawn_particle_rects + particle_rects
+        self.drawn_ui_state = ui_state
+        self.drawn_particle_rects = particle_rects
+
+        if self.full_redraw or (self.game_over and (dirty or ui_changed)):
+            # ゲームオーバー画面は全体に半透明の幕がかかるので、変わったら全体を描き直す
+            self.full_redraw = False
+            dirty = [self.screen.get_rect()]
+            ui_changed = True
+        elif ui_changed or any(rect.colliderect(UI_RECT) for rect in dirty):
+            # UIの文字はパーティクルより上に描くので、UIの領域ごと描き直す
+            dirty.append(UI_RECT)
+            ui_changed = True
+        if not dirty:
+            return dirty
+
+        for rect in dirty:
+            self.screen.blit(self.board_layer, rect, rect)
         
         # パーティクル描画
-        self.particle_system.draw(self.screen)
+        self.particle_system.draw(self.screen, alpha)
         
         # スコア表示
-        self.draw_ui()
+        if ui_changed:
+            self.draw_ui()
         
         # ゲームオーバー表示
         if self.game_over:
             self.draw_game_over()
+        return dirty
+    
+    def update_board_layer(self):
+        """盤面の層のうち前のフレームから見た目が変わったマスを描き直し、その矩形を返す
+
+        ぷよの画像はマスより大きいことがあり、右・下・右下のマスにはみ出す。
+        そこで各マスの見た目を、そのマスと左・上・左上のマスの中身
+        （ぷよ、ヒント、操作中のぷよ）で決まるものとして比べる。
+        """
+        # 盤面の外（左右・上下）を None で埋めた色の表。grid[y + 2][x] が (x, y) の色
+        grid = [[None] * (BOARD_WIDTH + 1) for _ in range(2)]
+        grid += [list(row) + [None] for row in self.board]
+        grid.append([None] * (BOARD_WIDTH + 1))
+        hint = self.get_hint_cells()
+        pieces = {}  # 操作中のぷよの位置 → (色, 描く順番)
+        if self.current_puyo and not self.is_resolving_chains():
+            main_pos, sub_pos = self.get_puyo_positions()
+            pieces[tuple(main_pos)] = (self.current_puyo[0], 0)
+            pieces[tuple(sub_pos)] = (self.current_puyo[1], 1)
+
+        rects = []
+        keys = self.tile_keys
+        for (x, y), rect in self.tile_rects.items():
+            up, row = grid[y + 1], grid[y + 2]
+            key = (up[x - 1], up[x], row[x - 1], row[x], hint.get((x, y)),
+                   pieces.get((x - 1, y - 1)), pieces.get((x, y - 1)),
+                   pieces.get((x - 1, y)), pieces.get((x, y)))
+            if keys.get((x, y)) != key:
+                keys[(x, y)] = key
+                self.draw_tile(x, y, rect, grid, hint, pieces)
+                rects.append(rect)
+        return rects
+    
+    def draw_tile(self, x, y, rect, grid, hint, pieces):
+        """board_layer の1マスぶん（rect）を、はみ出してくるぷよも含めて描き直す"""
+        layer = self.board_layer
+        layer.set_clip(rect)
+        around = ((x - 1, y - 1), (x, y - 1), (x - 1, y), (x, y))
+        if grid[y + 2][x] == PuyoColor.EMPTY:
+            # 空のマスは背景の黒いマスと枠線のまま（はみ出してきたぷよも隠れる）
+            layer.blit(self.background, rect, rect)
+        else:
+            layer.fill(BACKGROUND_COLOR, rect)
+            # ボード（上の段から、左から順に描く）
+            for cell_x, cell_y in around:
+                color = grid[cell_y + 2][cell_x]
+                if color is not None and color != PuyoColor.EMPTY:
+                    self.draw_cell(layer, self.cell_rect(cell_x, cell_y), color)
+        # ヒント（おすすめの置き場所）
+        if (x, y) in hint:
+            layer.blit(self.get_hint_image(hint[(x, y)]), rect.topleft)
+        # 現在のぷよ（主ぷよ、副ぷよの順）
+        for pos, (color, _) in sorted(pieces.items(), key=lambda item: item[1][1]):
+            if pos in around:
+                self.draw_puyo(layer, self.cell_rect(*pos), color)
+        layer.set_clip(None)
+    
+    @staticmethod
+    def cell_rect(x, y):
+        """盤面のマス (x, y) の画面上の矩形"""
+        return pygame.Rect(BOARD_X + x * CELL_SIZE, BOARD_Y + y * CELL_SIZE,
+                           CELL_SIZE, CELL_SIZE)
+    
+    def create_background(self):
+        """毎フレーム変わらない背景（背景色と、盤面の黒いマスと枠線）を描いておく"""
+        background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        background.fill(BACKGROUND_COLOR)
+        for y in range(BOARD_HEIGHT):
+            for x in range(BOARD_WIDTH):
+                self.draw_cell(background, self.cell_rect(x, y), PuyoColor.EMPTY)
+        return background
+    
+    def init_board_layer(self):
+        """背景と盤面の層、マスごとの描き直しの範囲を用意する"""
+        self.background = self.create_background()
+        # 盤面の層は背景から始め、空でないマスだけを描き足していく
+        self.board_layer = self.background.copy()
+        # ぷよ画像がマスからはみ出す幅
+        overflow = max([0] + [max(image.get_size()) - CELL_SIZE
+                              for image in (self.puyo_images or {}).values()])
+        # 盤面の上の段（出現直後の副ぷよ）からはみ出しの幅までが盤面の層の範囲
+        area = pygame.Rect(BOARD_X, BOARD_Y - CELL_SIZE, BOARD_WIDTH * CELL_SIZE + overflow,
+                           (BOARD_HEIGHT + 1) * CELL_SIZE + overflow)
+        self.tile_rects = {}
+        for y in range(-1, BOARD_HEIGHT + 1):
+            for x in range(BOARD_WIDTH + 1):
+                rect = self.cell_rect(x, y).clip(area)
+                if rect.width and rect.height:
+                    self.tile_rects[(x, y)] = rect
+        self.tile_keys = {}  # マスごとの最後に描いた中身
+        self.drawn_ui_state = None
+        self.drawn_particle_rects = []
+        self.full_redraw = True  # 次のフレームで画面全体を描き直す
+    
+    def get_ui_state(self):
+        """UIに表示している値（変わったときだけUIを描き直す）"""
+        return (self.score, self.level, self.high_score, self.pieces_placed,
+                tuple(self.next_puyo or ()), self.pair_index, self.game_over,
+                self.puzzle_cleared)
+    
+    def draw_cell(self, surface, rect, color):
+        """ボードの1マスを描く"""
+        # 空のセルは黒で塗りつぶし
+        if color == PuyoColor.EMPTY:
+            pygame.draw.rect(surface, (0, 0, 0), rect)
+            pygame.draw.rect(surface, (255, 255, 255), rect, 1)
+        elif color == PuyoColor.OJAMA:
+            # おじゃまぷよは特別描画（添付画像風、最初に一度だけ描いておく）
+            surface.blit(self.get_ojama_cell_image(), rect)
+        else:
+            # 通常ぷよ画像を使用（フォールバック付き）
+            self.draw_puyo(surface, rect, color)
+    
+    def get_ojama_cell_image(self):
+        """ボードのおじゃまぷよの画像（灰色の円に赤い目と白い牙）"""
+        if self.ojama_cell_image is not None:
+            return self.ojama_cell_image
+        image = create_alpha_surface((CELL_SIZE, CELL_SIZE))
+        rect = image.get_rect()
+        # 灰色の円
+        color = (150, 150, 150)  # 灰色
+        pygame.draw.circle(image, color, 
+                         (rect.centerx, rect.centery), 
+                         CELL_SIZE // 2 - 2)
+
+        # 赤い目（左）
+        eye_radius = CELL_SIZE // 6
+        eye_offset = CELL_SIZE // 6
+        pygame.draw.circle(image, (255, 0, 0), 
+                         (rect.centerx - eye_offset, rect.centery - eye_offset), 
+                         eye_radius)
+        # 赤い目（右）
+        pygame.draw.circle(image, (255, 0, 0), 
+                         (rect.centerx + eye_offset, rect.centery - eye_offset), 
+                         eye_radius)
+
+        # 白い光沢（目の中）
+        pygame.draw.circle(image, (255, 255, 255), 
+                         (rect.centerx - eye_offset, rect.centery - eye_offset - 1), 
+                         eye_radius // 3)
+        pygame.draw.circle(image, (255, 255, 255), 
+                         (rect.centerx + eye_offset, rect.centery - eye_offset - 1), 
+                         eye_radius // 3)
+
+        # 白い牙（三角形）
+        teeth_width = CELL_SIZE // 3
+        teeth_height = CELL_SIZE // 5
+        teeth_y = rect.centery + eye_offset
+
+        # 左の牙
+        pygame.draw.polygon(image, (255, 255, 255), [
+            (rect.centerx - teeth_width, teeth_y),
+            (rect.centerx - teeth_width//2, teeth_y + teeth_height),
+            (rect.centerx, teeth_y)
+        ])
+
+        # 中央の牙
+        pygame.draw.polygon(image, (255, 255, 255), [
+            (rect.centerx - teeth_width//2, teeth_y),
+            (rect.centerx, teeth_y + teeth_height),
+            (rect.centerx + teeth_width//2, teeth_y)
+        ])
+
+        # 右の牙
+        pygame.draw.polygon(image, (255, 255, 255), [
+            (rect.centerx, teeth_y),
+            (rect.centerx + teeth_width//2, teeth_y + teeth_height),
+            (rect.centerx + teeth_width, teeth_y)
+        ])
+        self.ojama_cell_image = image
+        return image
+    
+    def draw_puyo(self, surface, rect, color):
+        """ぷよを1つ描く（画像がなければ色で描く）"""
+        if self.puyo_images and color in self.puyo_images:
+            surface.blit(self.puyo_images[color], rect)
+        else:
+            # 画像が読み込めない場合は色で描画
+            pygame.draw.rect(surface, COLORS[color], rect)
+            pygame.draw.rect(surface, (255, 255, 255), rect, 2)
     
     def draw_ui(self):
         """UI要素（スコアなど）を描画"""
         # スコア表示
-        score_text = self.font.render(f"スコア: {self.score}", True, (255, 255, 255))
+        score_text = render_text(self.font, f"スコア: {self.score}", (255, 255, 255))
         self.screen.blit(score_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y))
         
         # レベル表示
-        level_text = self.font.render(f"レベル: {self.level}", True, (255, 255, 255))
+        level_text = render_text(self.font, f"レベル: {self.level}", (255, 255, 255))
         self.screen.blit(level_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y + 35))
         
-        # ハイスコア表示
-        high_score_text = self.small_font.render(f"ハイスコア: {self.high_score}", True, (255, 255, 0))
-        self.screen.blit(high_score_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y + 70))
+        if self.puzzle:
+            # なぞぷよの目標と残りのペア数
+            remaining = max(0, len(self.puzzle.pairs) - self.pieces_placed)
+            goal_text = render_text(
+                self.small_font, f"{self.puzzle.description}（残り{remaining}手）", (255, 255, 0))
+            self.screen.blit(goal_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y + 70))
+        else:
+            # ハイスコア表示
+            high_score_text = render_text(self.small_font, f"ハイスコア: {self.high_score}", (255, 255, 0))
+            self.screen.blit(high_score_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y + 70))
         
         # 次のぷよ表示
         self.draw_next_puyo()
@@ -1672,20 +1668,21 @@ class PuyoGame:
             "←→: 移動",
             "↓: 高速落下",
             "スペース: 回転",
+            "H: ヒント表示",
             "L: ランキング表示",
             "Q: ゲーム終了"
         ]
         
         y_offset = BOARD_Y + 220  # さらに下にずらす
         for instruction in instructions:
-            text = self.small_font.render(instruction, True, (200, 200, 200))
+            text = render_text(self.small_font, instruction, (200, 200, 200))
             self.screen.blit(text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, y_offset))
             y_offset += 30  # 行間を広げる
     
     def draw_next_puyo(self):
         """次のぷよを表示"""
         # 次のぷよのタイトル
-        next_text = self.small_font.render("次のぷよ:", True, (255, 255, 255))
+        next_text = render_text(self.small_font, "次のぷよ:", (255, 255, 255))
         self.screen.blit(next_text, (BOARD_X + BOARD_WIDTH * CELL_SIZE + 20, BOARD_Y + 100))
         
         # 次のぷよの表示位置
@@ -1693,47 +1690,40 @@ class PuyoGame:
         next_y = BOARD_Y + 130
         
         # 次のぷよを縦に表示（主ぷよが上、副ぷよが下）
-        if self.next_puyo:
+        # なぞぷよで次のペアがもうないときは表示しない
+        if self.next_puyo and (not self.puzzle or self.pair_index <= len(self.puzzle.pairs)):
             # 主ぷよ（上）
-            rect1 = pygame.Rect(next_x, next_y, CELL_SIZE - 10, CELL_SIZE - 10)
-            if self.puyo_images and self.next_puyo[0] in self.puyo_images:
-                # 画像をリサイズして表示
-                small_image = pygame.transform.scale(self.puyo_images[self.next_puyo[0]], (CELL_SIZE - 10, CELL_SIZE - 10))
-                self.screen.blit(small_image, rect1)
+            rect1 = pygame.Rect(next_x, next_y, NEXT_PUYO_SIZE, NEXT_PUYO_SIZE)
+            if self.next_puyo_images and self.next_puyo[0] in self.next_puyo_images:
+                # 縮小済みの画像を表示
+                self.screen.blit(self.next_puyo_images[self.next_puyo[0]], rect1)
             else:
                 pygame.draw.rect(self.screen, COLORS[self.next_puyo[0]], rect1)
                 pygame.draw.rect(self.screen, (255, 255, 255), rect1, 2)
             
             # 副ぷよ（下）
-            rect2 = pygame.Rect(next_x, next_y + CELL_SIZE - 5, CELL_SIZE - 10, CELL_SIZE - 10)
-            if self.puyo_images and self.next_puyo[1] in self.puyo_images:
-                # 画像をリサイズして表示
-                small_image = pygame.transform.scale(self.puyo_images[self.next_puyo[1]], (CELL_SIZE - 10, CELL_SIZE - 10))
-                self.screen.blit(small_image, rect2)
+            rect2 = pygame.Rect(next_x, next_y + CELL_SIZE - 5, NEXT_PUYO_SIZE, NEXT_PUYO_SIZE)
+            if self.next_puyo_images and self.next_puyo[1] in self.next_puyo_images:
+                # 縮小済みの画像を表示
+                self.screen.blit(self.next_puyo_images[self.next_puyo[1]], rect2)
             else:
                 pygame.draw.rect(self.screen, COLORS[self.next_puyo[1]], rect2)
                 pygame.draw.rect(self.screen, (255, 255, 255), rect2, 2)
     
-    def animate_puyo_removal(self, to_remove, ojama_to_remove, chain_count):
+    def animate_puyo_removal(self, groups, ojama_to_remove, chain_count):
         """ぷよ消去時のアニメーション効果"""
-        # パーティクル生成
-        for x, y in to_remove:
-            pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
-            pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
-            puyo_color = self.board[y][x]
-            self.particle_system.emit_particles(pixel_x, pixel_y, puyo_color, 8, chain_count)
+        # パーティクル生成（グループごとの色で）
+        for group in groups:
+            for x, y in group.cells:
+                pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
+                pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
+                self.particle_system.emit_particles(pixel_x, pixel_y, group.color, 8, chain_count)
         
         # おじゃまぷよのパーティクル生成
         for x, y in ojama_to_remove:
             pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
             pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
             self.particle_system.emit_particles(pixel_x, pixel_y, PuyoColor.OJAMA, 5, 1)
-        
-        # ぷよを実際に削除
-        for x, y in to_remove:
-            self.board[y][x] = PuyoColor.EMPTY
-        for x, y in ojama_to_remove:
-            self.board[y][x] = PuyoColor.EMPTY
 
     def record_score(self):
         """ゲーム終了時にスコアをランキングに記録"""
@@ -1770,11 +1760,11 @@ class PuyoGame:
         
         # 結果表示
         if rank > 0:
-            result_text = self.font.render(f"{player_name}さん", True, (255, 255, 255))
-            rank_text = self.font.render(f"{rank}位にランクイン！", True, (255, 255, 0))
+            result_text = render_text(self.font, f"{player_name}さん", (255, 255, 255))
+            rank_text = render_text(self.font, f"{rank}位にランクイン！", (255, 255, 0))
         else:
-            result_text = self.font.render(f"{player_name}さん", True, (255, 255, 255))
-            rank_text = self.font.render("記録されました！", True, (255, 255, 0))
+            result_text = render_text(self.font, f"{player_name}さん", (255, 255, 255))
+            rank_text = render_text(self.font, "記録されました！", (255, 255, 0))
         
         result_rect = result_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 20))
         rank_rect = rank_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 20))
@@ -1783,7 +1773,7 @@ class PuyoGame:
         self.screen.blit(rank_text, rank_rect)
         
         # 続行案内
-        continue_text = self.small_font.render("何かキーを押して続行...", True, (200, 200, 200))
+        continue_text = render_text(self.small_font, "何かキーを押して続行...", (200, 200, 200))
         continue_rect = continue_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 60))
         self.screen.blit(continue_text, continue_rect)
         
@@ -1807,31 +1797,42 @@ class PuyoGame:
         overlay.fill((0, 0, 0))
         self.screen.blit(overlay, (0, 0))
         
-        # ゲームオーバーテキスト
-        game_over_text = self.big_font.render("GAME OVER", True, (255, 0, 0))
+        # ゲームオーバーテキスト（なぞぷよではクリアか失敗か）
+        if self.puzzle and self.puzzle_cleared:
+            game_over_text = render_text(self.big_font, "CLEAR!", (255, 255, 0))
+        else:
+            game_over_text = render_text(self.big_font, "GAME OVER", (255, 0, 0))
         text_rect = game_over_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 50))
         self.screen.blit(game_over_text, text_rect)
         
         # 最終スコア表示
-        final_score_text = self.font.render(f"最終スコア: {self.score}", True, (255, 255, 255))
+        final_score_text = render_text(self.font, f"最終スコア: {self.score}", (255, 255, 255))
         score_rect = final_score_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
         self.screen.blit(final_score_text, score_rect)
         
         # 操作案内
-        restart_text = self.small_font.render("Rキーを押してリスタート", True, (255, 255, 255))
+        restart_text = render_text(self.small_font, "Rキーを押してリスタート", (255, 255, 255))
         restart_rect = restart_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 50))
         self.screen.blit(restart_text, restart_rect)
         
         # ランキング表示案内
-        ranking_text = self.small_font.render("Lキーでランキング表示", True, (200, 200, 200))
+        ranking_text = render_text(self.small_font, "Lキーでランキング表示", (200, 200, 200))
         ranking_rect = ranking_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 80))
         self.screen.blit(ranking_text, ranking_rect)
         
         # 終了案内
-        quit_text = self.small_font.render("Qキーでゲーム終了", True, (200, 200, 200))
+        quit_text = render_text(self.small_font, "Qキーでゲーム終了", (200, 200, 200))
         quit_rect = quit_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 110))
         self.screen.blit(quit_text, quit_rect)
 
 if __name__ == "__main__":
-    game = PuyoGame()
+    # python main.py パズルファイル [番号] でなぞぷよモード（番号は0から）
+    puzzle = None
+    if len(sys.argv) > 1:
+        try:
+            puzzle = load_puzzles(sys.argv[1])[int(sys.argv[2]) if len(sys.argv) > 2 else 0]
+        except (IOError, ValueError, KeyError, IndexError) as e:
+            print(f"パズルを読み込めません: {e}")
+            sys.exit(1)
+    game = PuyoGame(puzzle)
     game.run()
\ No newline at end of file
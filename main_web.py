@@ -5,28 +5,32 @@ import random
 import json
 import os
 import math
-from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional
 
+from puyo_engine import (PuyoEngine, PuyoColor, FixedTimestep, BOARD_WIDTH, BOARD_HEIGHT,
+                         SIMULATION_STEP, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN,
+                         ACTION_ROTATE, ACTION_END)
+from puyo_replay import Replay
+
 # 定数
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
-BOARD_WIDTH = 6
-BOARD_HEIGHT = 12
 CELL_SIZE = 40
 BOARD_X = 50
 BOARD_Y = 50
+# パーティクルの速度・寿命の基準になる1フレームの長さ（60FPS、ミリ秒）
+PARTICLE_FRAME_TIME = 1000 / 60
 
-# 色定義
-class PuyoColor(Enum):
-    EMPTY = 0
-    RED = 1
-    BLUE = 2
-    GREEN = 3
-    YELLOW = 4
-    OJAMA = 5  # おじゃまぷよ
+# ゲーム操作に使うキーと操作の対応
+KEY_ACTIONS = {
+    pygame.K_LEFT: ACTION_LEFT,
+    pygame.K_RIGHT: ACTION_RIGHT,
+    pygame.K_DOWN: ACTION_DOWN,
+    pygame.K_SPACE: ACTION_ROTATE,
+    pygame.K_q: ACTION_END,
+}
 
 # 色のRGB値（フォールバック用）
 COLORS = {
@@ -77,26 +81,34 @@ class SimpleParticle:
     def __init__(self, x, y, color, velocity_x, velocity_y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.color = color
         self.velocity_x = velocity_x
         self.velocity_y = velocity_y
         self.life = 1.0
         self.size = random.randint(2, 5)
     
-    def update(self):
-        self.x += self.velocity_x
-        self.y += self.velocity_y
-        self.velocity_y += 0.2  # 重力
-        self.life -= 0.02
+    def update(self, dt=PARTICLE_FRAME_TIME):
+        f = dt / PARTICLE_FRAME_TIME  # 60FPSの1フレームを1とした経過時間
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.x += self.velocity_x * f
+        self.y += self.velocity_y * f
+        self.velocity_y += 0.2 * f  # 重力
+        self.life -= 0.02 * f
     
     def is_alive(self):
         return self.life > 0 and self.y < WINDOW_HEIGHT + 50
     
-    def draw(self, screen):
+    def draw(self, screen, interpolation=1.0):
         if self.life > 0:
             alpha = max(0, min(255, int(self.life * 255)))
             color_with_alpha = (*self.color[:3], alpha)
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.size)
+            # 前のステップと現在の位置を補間して描く
+            x = self.prev_x + (self.x - self.prev_x) * interpolation
+            y = self.prev_y + (self.y - self.prev_y) * interpolation
+            pygame.draw.circle(screen, self.color, (int(x), int(y)), self.size)
 
 class SimpleParticleSystem:
     def __init__(self):
@@ -116,46 +128,38 @@ class SimpleParticleSystem:
             if len(self.particles) >= self.max_particles:
                 break
     
-    def update(self):
+    def update(self, dt=PARTICLE_FRAME_TIME):
         alive_particles = []
         for particle in self.particles:
-            particle.update()
+            particle.update(dt)
             if particle.is_alive():
                 alive_particles.append(particle)
         self.particles = alive_particles
     
-    def draw(self, screen):
+    def draw(self, screen, interpolation=1.0):
         for particle in self.particles:
-            particle.draw(screen)
+            particle.draw(screen, interpolation)
 
-class PuyoGame:
+class PuyoGame(PuyoEngine):
+    # Web版は壁キック1マスまで、おじゃまぷよなし
+    KICK_OFFSETS = (1, -1)
+    OJAMA_ENABLED = False
+    
     def __init__(self):
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("ぷよぷよゲーム")
         self.clock = pygame.time.Clock()
+        # 描画のフレームレート（ゲームの進行は固定ステップ）
+        self.fps = 60
+        self.timestep = FixedTimestep()
         
-        # ゲームボード初期化
-        self.board = [[PuyoColor.EMPTY for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
-        
-        # 現在のぷよペア
-        self.current_puyo = self.create_new_puyo()
-        self.next_puyo = self.create_new_puyo()
-        self.puyo_x = BOARD_WIDTH // 2 - 1
-        self.puyo_y = 0
-        self.puyo_rotation = 0
-        
-        # 落下タイマー
-        self.fall_timer = 0
-        self.fall_speed = 500
-        self.base_fall_speed = 500
-        
-        # レベルシステム
-        self.level = 1
-        self.lines_cleared = 0
-        
-        # スコアシステム
-        self.score = 0
+        # ゲームルールの初期化
+        super().__init__()
+        # 連鎖は毎フレーム少しずつ進める（ブラウザを止めない）
+        self.chain_delay = 150
+        # 操作とシードを記録（ブラウザではファイルに保存せずメモリに残す）
+        self.replay = Replay.start_recording(self)
         
         # Web版用フォント設定
         try:
@@ -167,40 +171,16 @@ class PuyoGame:
             self.small_font = pygame.font.SysFont(None, 24)
             self.big_font = pygame.font.SysFont(None, 72)
         
-        # ゲーム状態
-        self.game_over = False
-        
         # 簡略化されたシステム
         self.particle_system = SimpleParticleSystem()
         self.high_score = 0
         self.game_start_time = datetime.now()
-        self.max_chain_count = 0
-    
-    def create_new_puyo(self):
-        """新しいぷよペアを作成"""
-        colors = [PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW]
-        return [random.choice(colors), random.choice(colors)]
-    
-    def get_puyo_positions(self):
-        """現在のぷよペアの位置を取得"""
-        rotation_offsets = [
-            (0, -1),  # 0: 上
-            (1, 0),   # 1: 右
-            (0, 1),   # 2: 下
-            (-1, 0)   # 3: 左
-        ]
-        
-        main_pos = (self.puyo_x, self.puyo_y)
-        offset_x, offset_y = rotation_offsets[self.puyo_rotation]
-        sub_pos = (self.puyo_x + offset_x, self.puyo_y + offset_y)
-        
-        return main_pos, sub_pos
     
     async def run(self):
         """非同期メインループ"""
         running = True
         while running:
-            dt = self.clock.tick(60)
+            dt = self.clock.tick(self.fps)
             
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -208,15 +188,10 @@ class PuyoGame:
                 elif event.type == pygame.KEYDOWN:
                     self.handle_input(event.key)
             
-            # ぷよの自動落下
-            if not self.game_over:
-                self.fall_timer += dt
-                if self.fall_timer >= self.fall_speed:
-                    self.move_puyo_down()
-                    self.fall_timer = 0
-            
-            # パーティクルシステム更新
-            self.particle_system.update()
+            # 経過時間ぶんだけ固定ステップで進める（ぷよの自動落下・パーティクル）
+            for _ in range(self.timestep.advance(dt)):
+                self.step()
+                self.particle_system.update(SIMULATION_STEP)
             
             # 描画
             self.draw()
@@ -232,229 +207,30 @@ class PuyoGame:
         if self.game_over:
             if key == pygame.K_r:
                 self.reset_game()
-        else:
-            if key == pygame.K_LEFT:
-                self.move_puyo(-1, 0)
-            elif key == pygame.K_RIGHT:
-                self.move_puyo(1, 0)
-            elif key == pygame.K_DOWN:
-                self.move_puyo_down()
-            elif key == pygame.K_SPACE:
-                self.rotate_puyo()
-            elif key == pygame.K_q:
-                self.end_game()
-    
-    def move_puyo(self, dx, dy):
-        """ぷよを移動"""
-        new_x = self.puyo_x + dx
-        new_y = self.puyo_y + dy
-        
-        if self.is_valid_position(new_x, new_y):
-            self.puyo_x = new_x
-            self.puyo_y = new_y
-            return True
-        return False
-    
-    def move_puyo_down(self):
-        """ぷよを下に移動"""
-        if not self.move_puyo(0, 1):
-            self.place_puyo()
-            self.apply_gravity()
-            self.check_chains()
-            
-            if self.check_game_over():
-                self.game_over = True
-                if self.score > self.high_score:
-                    self.high_score = self.score
-                return
-            
-            self.current_puyo = self.next_puyo
-            self.next_puyo = self.create_new_puyo()
-            self.puyo_x = BOARD_WIDTH // 2 - 1
-            self.puyo_y = 0
-            self.puyo_rotation = 0
-    
-    def is_valid_position(self, x, y, rotation=None):
-        """位置が有効かチェック"""
-        if rotation is None:
-            rotation = self.puyo_rotation
-            
-        rotation_offsets = [
-            (0, -1), (1, 0), (0, 1), (-1, 0)
-        ]
-        
-        # 主ぷよの位置チェック
-        if x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT:
-            return False
-        if self.board[y][x] != PuyoColor.EMPTY:
-            return False
-        
-        # 副ぷよの位置チェック
-        offset_x, offset_y = rotation_offsets[rotation]
-        sub_x, sub_y = x + offset_x, y + offset_y
-        
-        if sub_x < 0 or sub_x >= BOARD_WIDTH or sub_y < 0 or sub_y >= BOARD_HEIGHT:
-            return False
-        if self.board[sub_y][sub_x] != PuyoColor.EMPTY:
-            return False
-        
-        return True
-    
-    def place_puyo(self):
-        """ぷよをボードに配置"""
-        main_pos, sub_pos = self.get_puyo_positions()
-        self.board[main_pos[1]][main_pos[0]] = self.current_puyo[0]
-        self.board[sub_pos[1]][sub_pos[0]] = self.current_puyo[1]
+        elif key in KEY_ACTIONS:
+            self.apply_action(KEY_ACTIONS[key])
     
-    def rotate_puyo(self):
-        """ぷよを回転"""
-        new_rotation = (self.puyo_rotation + 1) % 4
-        
-        if self.is_valid_position(self.puyo_x, self.puyo_y, new_rotation):
-            self.puyo_rotation = new_rotation
-        else:
-            # 壁キック
-            for offset in [1, -1]:
-                if self.is_valid_position(self.puyo_x + offset, self.puyo_y, new_rotation):
-                    self.puyo_x += offset
-                    self.puyo_rotation = new_rotation
-                    break
-    
-    def check_chains(self):
-        """連鎖チェック"""
-        chains_found = True
-        chain_count = 0
-        total_score = 0
-        
-        while chains_found:
-            chains_found = False
-            to_remove = set()
-            
-            for y in range(BOARD_HEIGHT):
-                for x in range(BOARD_WIDTH):
-                    if self.board[y][x] != PuyoColor.EMPTY:
-                        connected = self.find_connected_puyos(x, y, self.board[y][x])
-                        if len(connected) >= 4:
-                            new_connected = [pos for pos in connected if pos not in to_remove]
-                            if new_connected:
-                                to_remove.update(new_connected)
-                                chains_found = True
-            
-            if to_remove:
-                chain_count += 1
-                chain_bonus = chain_count * 50
-                puyo_score = len(to_remove) * 10
-                round_score = puyo_score + chain_bonus
-                total_score += round_score
-                
-                # パーティクル生成
-                for x, y in to_remove:
-                    pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
-                    pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
-                    puyo_color = self.board[y][x]
-                    self.particle_system.emit_particles(pixel_x, pixel_y, puyo_color, 5, chain_count)
-                
-                # ぷよを削除
-                for x, y in to_remove:
-                    self.board[y][x] = PuyoColor.EMPTY
-                
-                self.apply_gravity()
-        
-        self.score += total_score
-        
-        if chain_count > 0:
-            self.lines_cleared += chain_count
-            self.max_chain_count = max(self.max_chain_count, chain_count)
-            self.update_level()
-        
-        return chain_count
-    
-    def find_connected_puyos(self, start_x, start_y, color):
-        """つながったぷよを探す"""
-        if color == PuyoColor.EMPTY:
-            return []
-        
-        visited = set()
-        stack = [(start_x, start_y)]
-        connected = []
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        
-        while stack:
-            x, y = stack.pop()
-            
-            if (x, y) in visited:
-                continue
-            
-            if (x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT or
-                self.board[y][x] != color):
-                continue
-            
-            visited.add((x, y))
-            connected.append((x, y))
-            
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-                if (nx, ny) not in visited:
-                    stack.append((nx, ny))
-        
-        return connected
-    
-    def update_level(self):
-        """レベルアップ"""
-        new_level = (self.lines_cleared // 10) + 1
-        
-        if new_level > self.level:
-            self.level = new_level
-            self.fall_speed = max(50, self.base_fall_speed - (self.level - 1) * 80)
-    
-    def apply_gravity(self):
-        """重力適用"""
-        for x in range(BOARD_WIDTH):
-            column = []
-            for y in range(BOARD_HEIGHT):
-                if self.board[y][x] != PuyoColor.EMPTY:
-                    column.append(self.board[y][x])
-            
-            for y in range(BOARD_HEIGHT):
-                self.board[y][x] = PuyoColor.EMPTY
-            
-            for i, puyo in enumerate(reversed(column)):
-                self.board[BOARD_HEIGHT - 1 - i][x] = puyo
-    
-    def check_game_over(self):
-        """ゲームオーバー判定"""
-        start_x = BOARD_WIDTH // 2 - 1
-        start_y = 1
-        
-        for rotation in range(4):
-            if self.is_valid_position(start_x, start_y, rotation):
-                return False
-        
-        return True
+    def remove_puyos(self, groups, ojama_to_remove, chain_count):
+        """パーティクルを生成してから消去"""
+        for group in groups:
+            for x, y in group.cells:
+                pixel_x = BOARD_X + x * CELL_SIZE + CELL_SIZE // 2
+                pixel_y = BOARD_Y + y * CELL_SIZE + CELL_SIZE // 2
+                self.particle_system.emit_particles(pixel_x, pixel_y, group.color, 5, chain_count)
+        
+        super().remove_puyos(groups, ojama_to_remove, chain_count)
     
-    def end_game(self):
-        """ゲーム終了"""
-        if not self.game_over:
-            self.game_over = True
-            if self.score > self.high_score:
-                self.high_score = self.score
+    def on_game_over(self):
+        """ハイスコア更新"""
+        self.replay.finish(self)
+        if self.score > self.high_score:
+            self.high_score = self.score
     
-    def reset_game(self):
+    def reset_game(self, seed=None, pair_queue=None):
         """ゲームリセット"""
-        self.board = [[PuyoColor.EMPTY for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
-        self.current_puyo = self.create_new_puyo()
-        self.next_puyo = self.create_new_puyo()
-        self.puyo_x = BOARD_WIDTH // 2 - 1
-        self.puyo_y = 0
-        self.puyo_rotation = 0
-        self.score = 0
-        self.game_over = False
-        self.fall_timer = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_speed = self.base_fall_speed
+        super().reset_game(seed, pair_queue)
+        self.replay = Replay.start_recording(self)
         self.game_start_time = datetime.now()
-        self.max_chain_count = 0
     
     def draw(self):
         """画面描画"""
@@ -478,8 +254,8 @@ class PuyoGame:
                     pygame.draw.rect(self.screen, color, rect)
                     pygame.draw.rect(self.screen, (255, 255, 255), rect, 2)
         
-        # 現在のぷよ描画
-        if self.current_puyo:
+        # 現在のぷよ描画（連鎖処理中は操作ぷよがないので描かない）
+        if self.current_puyo and not self.is_resolving_chains():
             main_pos, sub_pos = self.get_puyo_positions()
             
             # 主ぷよ
@@ -503,7 +279,7 @@ class PuyoGame:
             pygame.draw.rect(self.screen, (255, 255, 255), rect2, 2)
         
         # パーティクル描画
-        self.particle_system.draw(self.screen)
+        self.particle_system.draw(self.screen, self.timestep.alpha)
         
         # UI描画
         self.draw_ui()
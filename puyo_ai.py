@@ -0,0 +1,273 @@
+"""
+ビームサーチで連鎖を組むAI
+
+操作中のぷよペアを置ける場所（列・向き・壁キックを含む）を
+puyo_engine.generate_placements で重複なく列挙し、
+next_puyo とその先のペアを使って数手先まで読む。各手順の盤面は
+「すでに得た点数」と「1個足せば始まる連鎖の点数（連鎖のタネ）」などで評価し、
+良いものだけを beam_width 個残して次の手へ進む。
+
+1手あたりの思考時間（time_budget、ミリ秒）を超えたら読みを打ち切り、
+それまでに見つかった最善手を返すので、ゲーム中の対戦相手や一括シミュレーション
+（puyo_simulate.py の --policy beam）に使ってもフレームレートを落とさない。
+
+使い方:
+    ai = BeamSearchAI(depth=3, beam_width=8, time_budget=5.0)
+    placement = ai.choose(engine)
+    for action in placement.actions:
+        engine.apply_action(action)
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from puyo_engine import (PuyoEngine, PuyoColor, TranspositionTable, PUYO_COLORS,
+                         ZOBRIST_KEYS, BOARD_WIDTH, BOARD_HEIGHT, chain_step_score,
+                         generate_placements)
+from puyo_bitboard import (BitBoard, FULL_MASK, cell_bit, cells_to_mask, expand,
+                           flood_fill, mask_to_cells, popcount)
+
+# 盤面評価の重み
+CONNECTION_WEIGHT = 4  # 2個・3個つながった同色ぷよ（大きさの2乗）
+HEIGHT_WEIGHT = 3  # 一番高い列の高さ
+DANGER_ROW = 3  # 出現位置の列がこの段より上まで積まれると危険
+DANGER_PENALTY = 2000
+# 思考時間のうち、最後の候補の並べ替えと結果を返すために残しておく割合
+DEADLINE_MARGIN = 0.1
+
+@dataclass
+class Placement:
+    """ぷよペアの置き方と、置いたあとの結果"""
+    x: int  # 着地したときの主ぷよの列
+    y: int  # 着地したときの主ぷよの段（ちぎれる前）
+    rotation: int
+    actions: List[int]  # 出現位置からこの置き方にするための操作（最後の落下は含まない）
+    board: BitBoard = None  # 連鎖まで処理したあとの盤面
+    board_hash: int = 0
+    score: int = 0  # この手で得た点数
+    chain_count: int = 0
+
+@dataclass
+class SearchNode:
+    """ビームサーチの1候補"""
+    board: BitBoard
+    board_hash: int
+    total_score: int  # ここまでの手で得た点数の合計
+    value: float  # 評価値（大きいほど良い）
+    first: Optional[Placement] = None  # この候補につながる最初の手
+    pending: int = 0  # まだ連鎖判定をしていないセルのマスク（エンジンの dirty_cells）
+
+class BeamSearchAI:
+    """ビームサーチで置き場所を選ぶAI"""
+    def __init__(self, depth=3, beam_width=8, time_budget=5.0, table_size=20000):
+        self.depth = depth  # 何手先まで読むか（1なら操作中のぷよだけ）
+        self.beam_width = beam_width  # 各手で残す候補の数
+        self.time_budget = time_budget  # 1手あたりの思考時間（ミリ秒）
+        # 手順が違っても同じ盤面になった候補を読み飛ばすための表
+        self.table = TranspositionTable(table_size)
+        # ゲームオーバー判定に使う作業用エンジン
+        self.scratch = PuyoEngine(BitBoard, seed=0)
+        self.kick_offsets = PuyoEngine.KICK_OFFSETS
+
+        # 思考中の締め切り（time.perf_counter の値）と打ち切り用の関数
+        self.deadline = None
+        self.stop = None
+        self.has_result = False  # 返せる手が1つ以上見つかったか（見つかるまでは打ち切らない）
+
+        # 直前の思考の統計
+        self.nodes_searched = 0
+        self.depth_reached = 0
+
+    def __call__(self, engine, rng=None):
+        """puyo_simulate の方針として使う（policy(engine, rng)）"""
+        return self.choose(engine)
+
+    def choose(self, engine, stop=None) -> Optional[Placement]:
+        """操作中のぷよの最善の置き方を返す（連鎖処理中・ゲームオーバー時はNone）
+
+        stop に関数を渡すと候補を1つ調べるごとに呼び、True が返ったら
+        思考時間の途中でも読みを打ち切る（バックグラウンドでの中断用）。
+        """
+        if engine.game_over or engine.is_resolving_chains():
+            return None
+        # 壁キックは対戦相手のルール（Web版は1マスまで）に合わせる
+        self.kick_offsets = engine.KICK_OFFSETS
+
+        self.deadline = (time.perf_counter() +
+                         self.time_budget * (1 - DEADLINE_MARGIN) / 1000)
+        self.stop = stop
+        self.has_result = False
+        pairs = [engine.current_puyo, engine.next_puyo]
+        if self.depth > 2:
+            pairs += engine.get_upcoming_pairs(self.depth - 2)
+        pairs = pairs[:max(1, self.depth)]
+
+        board = BitBoard.from_rows(engine.board)
+        pending = (FULL_MASK if engine.dirty_cells is None
+                   else cells_to_mask(engine.dirty_cells))
+        root = SearchNode(board, engine.board_hash, 0, 0.0, pending=pending)
+        start = (engine.puyo_x, engine.puyo_y, engine.puyo_rotation)
+        self.table.clear()
+        self.nodes_searched = 0
+        self.depth_reached = 0
+
+        beam = [root]
+        best = None
+        for depth, pair in enumerate(pairs):
+            children = []
+            for node in beam:
+                # 2手目以降は出現位置から置く
+                origin = start if depth == 0 else (BOARD_WIDTH // 2 - 1, 0, 0)
+                for placement in self.expand(node, pair, origin):
+                    key = (placement.board_hash, depth)
+                    total = node.total_score + placement.score
+                    seen = self.table.get(key)
+                    if seen is not None and seen >= total:
+                        continue
+                    # 盤面の評価（連鎖のタネを探す）が一番重いので、その前にも時間を確かめる
+                    if self.time_up():
+                        break
+                    self.table.put(key, total)
+
+                    value = total + evaluate_board(placement.board)
+                    children.append(SearchNode(placement.board, placement.board_hash, total,
+                                               value, node.first or placement))
+                    self.nodes_searched += 1
+                    if depth == 0:
+                        self.has_result = True
+                if self.time_up():
+                    break
+
+            if not children:
+                break
+            children.sort(key=lambda child: child.value, reverse=True)
+            beam = children[:self.beam_width]
+            best = beam[0]
+            self.depth_reached = depth + 1
+            if self.time_up():
+                break
+
+        return best.first if best else None
+
+    def time_up(self) -> bool:
+        """思考時間を使い切ったか、stop で打ち切りを頼まれたか
+
+        返せる手がまだ1つもないうちは False を返し、最初の手の候補は必ず1つ調べる。
+        """
+        if not self.has_result:
+            return False
+        return time.perf_counter() > self.deadline or bool(self.stop and self.stop())
+
+    def expand(self, node, pair, origin):
+        """盤面nodeにペアpairを置いた結果を、置き方ごとに返す（置くと負けるものは除く）"""
+        scratch = self.scratch
+        if self.time_up():
+            return
+        for placed in generate_placements(node.board, pair, origin=origin,
+                                          kick_offsets=self.kick_offsets):
+            if self.time_up():
+                return
+            placement = simulate_placement(placed, node.board_hash, pair, node.pending)
+            scratch.board = placement.board
+            scratch.heights = placement.board.column_heights()
+            if not scratch.check_game_over():
+                yield placement
+
+def simulate_placement(placed, board_hash, pair, pending=0) -> Placement:
+    """generate_placements の置き方 placed の連鎖まで処理した結果（PuyoEngine.lock_puyo と同じ）"""
+    result = placed.board
+    before = BitBoard(result.masks)
+    (main_x, main_y), (sub_x, sub_y) = placed.main_pos, placed.sub_pos
+    board_hash ^= (ZOBRIST_KEYS[main_x][main_y][pair[0].value] ^
+                   ZOBRIST_KEYS[sub_x][sub_y][pair[1].value])
+    seed = pending | cell_bit(main_x, main_y) | cell_bit(sub_x, sub_y)
+    chain_count, score = run_chains(result, seed)
+    if chain_count:
+        board_hash ^= zobrist_delta(before, result)
+    return Placement(placed.x, placed.y, placed.rotation, placed.actions, result,
+                     board_hash, score, chain_count)
+
+def run_chains(board, seed_mask):
+    """BitBoardの上で連鎖を最後まで処理し (連鎖数, 得点) を返す
+
+    PuyoEngine.check_chains と同じ結果をマスク演算だけで求める（読みの高速化用）。
+    """
+    chain_count = 0
+    score = 0
+    ojama_index = PuyoColor.OJAMA.value
+    while True:
+        groups = board.find_group_masks(seed_mask)
+        if not groups:
+            return chain_count, score
+        chain_count += 1
+
+        popped = 0
+        removed_count = 0
+        for _, mask in groups:
+            popped |= mask
+            removed_count += popcount(mask)
+        score += chain_step_score(chain_count, removed_count)
+
+        # 隣接するおじゃまぷよも一緒に消して落とす
+        popped |= expand(popped) & board.masks[ojama_index]
+        keep = ~popped
+        board.masks = [mask & keep for mask in board.masks]
+        seed_mask = board.settle()
+
+def zobrist_delta(before, after) -> int:
+    """盤面 before から after への Zobristハッシュの差分"""
+    delta = 0
+    for index in range(1, len(before.masks)):
+        diff = before.masks[index] ^ after.masks[index]
+        if diff:
+            for x, y in mask_to_cells(diff):
+                delta ^= ZOBRIST_KEYS[x][y][index]
+    return delta
+
+def evaluate_board(board) -> float:
+    """盤面の評価値（連鎖のタネ・つながり・高さ）"""
+    masks = board.masks
+    heights = board.column_heights()
+
+    # 出現位置の列が高いと次のぷよが出せなくなる
+    spawn_x = BOARD_WIDTH // 2 - 1
+    if BOARD_HEIGHT - heights[spawn_x] <= DANGER_ROW:
+        return -DANGER_PENALTY
+
+    value = -HEIGHT_WEIGHT * max(heights)
+
+    # 2個・3個つながった同色ぷよ（あと少しで消せる形）
+    for color in PUYO_COLORS:
+        color_mask = masks[color.value]
+        remaining = color_mask
+        while remaining:
+            group = flood_fill(remaining & -remaining, color_mask)
+            remaining &= ~group
+            size = popcount(group)
+            if size < 4:
+                value += CONNECTION_WEIGHT * size * size
+
+    return value + trigger_score(board, heights)
+
+def trigger_score(board, heights) -> int:
+    """各列の一番上に1個だけ足して始められる連鎖のうち、最も高い点数"""
+    best = 0
+    masks = board.masks
+    for x in range(BOARD_WIDTH):
+        if heights[x] >= BOARD_HEIGHT:
+            continue
+        y = BOARD_HEIGHT - 1 - heights[x]
+        bit = cell_bit(x, y)
+        neighbors = expand(bit) & ~bit & FULL_MASK
+        for color in PUYO_COLORS:
+            index = color.value
+            if not masks[index] & neighbors:
+                continue
+            # 足したぷよを含めて4個以上つながるときだけ連鎖を試す
+            if popcount(flood_fill(bit, masks[index] | bit)) < 4:
+                continue
+            trial = board.copy()
+            trial.masks[index] |= bit
+            best = max(best, run_chains(trial, bit)[1])
+    return best
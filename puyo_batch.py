@@ -0,0 +1,225 @@
+"""
+NumPyで多数の盤面をまとめて進めるバッチエンジン（強化学習・バランス調整用）
+
+N個の盤面を (N, 12, 6) の uint8 配列（値は PuyoColor.value）で持ち、
+重力・連結判定・おじゃまぷよの巻き込み・得点計算を配列演算で全盤面同時に行う。
+結果は PuyoEngine.apply_gravity / check_chains と完全に一致する
+（おじゃまぷよ同士が4つつながっても消えるところまで同じ）。
+
+BatchEngine は1手ごとに「ペアを列xに向きrotationで落とす」だけを扱い、
+時間経過による落下やおじゃまぷよの降下はない。
+
+使い方（numpy が必要）:
+    batch = BatchEngine(1000, seed=0)
+    result = batch.step(columns, rotations)  # 各盤面の列と向き（長さNの配列）
+    print(batch.scores.mean(), result.chain_counts.max())
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from puyo_engine import (PuyoColor, PairQueue, ROTATION_OFFSETS, BOARD_WIDTH, BOARD_HEIGHT)
+
+EMPTY = PuyoColor.EMPTY.value
+OJAMA = PuyoColor.OJAMA.value
+# 盤面1つあたりのセル数（連結ラベルの通し番号に使う）
+CELLS = BOARD_WIDTH * BOARD_HEIGHT
+# ぷよが出現する列（PuyoEngine と同じ）
+SPAWN_X = BOARD_WIDTH // 2 - 1
+
+_OFFSETS_X = np.array([offset[0] for offset in ROTATION_OFFSETS])
+_OFFSETS_Y = np.array([offset[1] for offset in ROTATION_OFFSETS])
+_COLORS = sorted(PuyoColor, key=lambda color: color.value)
+
+# ------------------------------------------------------------
+# ボードとの変換
+# ------------------------------------------------------------
+def board_to_array(board) -> np.ndarray:
+    """ListBoard / BitBoard（board[y][x] 形式）を (12, 6) の配列にする"""
+    return np.array([[color.value for color in row] for row in board], dtype=np.uint8)
+
+def array_to_rows(array):
+    """(12, 6) の配列を board[y][x] 形式の二次元リストにする（load_board に渡せる）"""
+    return [[_COLORS[value] for value in row] for row in array.tolist()]
+
+# ------------------------------------------------------------
+# 盤面の一括処理
+# ------------------------------------------------------------
+def apply_gravity(boards) -> np.ndarray:
+    """全盤面に重力を適用し、中身が変わったセルのマスクを返す（boards を書き換える）
+
+    列ごとに「空かどうか」で安定ソートするので、ぷよの上下の順番は変わらない。
+    """
+    order = np.argsort(boards != EMPTY, axis=1, kind='stable')
+    settled = np.take_along_axis(boards, order, axis=1)
+    changed = settled != boards
+    boards[...] = settled
+    return changed
+
+def find_pop_mask(boards) -> np.ndarray:
+    """4つ以上つながった同色のぷよのマスク（おじゃまぷよ同士も含む）
+
+    各セルに通し番号を振り、同色で隣り合うセルどうしで小さいほうの番号を
+    広げていく（番号の指す先をたどって一気に縮める）。番号が動かなくなったら
+    同じ番号のセルが1つのグループになる。
+    """
+    count = len(boards)
+    filled = boards != EMPTY
+    # 下・右の隣と同色かどうか
+    same_down = filled[:, :-1, :] & (boards[:, :-1, :] == boards[:, 1:, :])
+    same_right = filled[:, :, :-1] & (boards[:, :, :-1] == boards[:, :, 1:])
+
+    labels = np.arange(count * CELLS, dtype=np.int64).reshape(count, BOARD_HEIGHT, BOARD_WIDTH)
+    flat = labels.reshape(-1)
+    while True:
+        new = labels.copy()
+        np.minimum(new[:, :-1, :], np.where(same_down, labels[:, 1:, :], new[:, :-1, :]),
+                   out=new[:, :-1, :])
+        np.minimum(new[:, 1:, :], np.where(same_down, labels[:, :-1, :], new[:, 1:, :]),
+                   out=new[:, 1:, :])
+        np.minimum(new[:, :, :-1], np.where(same_right, labels[:, :, 1:], new[:, :, :-1]),
+                   out=new[:, :, :-1])
+        np.minimum(new[:, :, 1:], np.where(same_right, labels[:, :, :-1], new[:, :, 1:]),
+                   out=new[:, :, 1:])
+        # 番号はグループ内のセルを指しているので、その番号で置き換えてよい
+        new = new.reshape(-1)[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+        flat = labels.reshape(-1)
+
+    sizes = np.bincount(flat[filled.reshape(-1)], minlength=count * CELLS)
+    return filled & (sizes[labels] >= 4)
+
+def adjacent_mask(mask) -> np.ndarray:
+    """mask の上下左右に隣接するセル（mask 自身を含む）"""
+    grown = mask.copy()
+    grown[:, :-1, :] |= mask[:, 1:, :]
+    grown[:, 1:, :] |= mask[:, :-1, :]
+    grown[:, :, :-1] |= mask[:, :, 1:]
+    grown[:, :, 1:] |= mask[:, :, :-1]
+    return grown
+
+def check_chains(boards):
+    """全盤面の連鎖を最後まで処理し (連鎖数, 得点) の配列を返す（boards を書き換える）
+
+    PuyoEngine.check_chains と同じく、連鎖1段ごとに
+    消えた数×10 + 連鎖数×50 点を加える（巻き込まれたおじゃまぷよは数えない）。
+    盤面は重力で落ち切っていること。
+    """
+    count = len(boards)
+    chain_counts = np.zeros(count, dtype=np.int32)
+    scores = np.zeros(count, dtype=np.int64)
+    # まだ連鎖が続いているかもしれない盤面の番号
+    active = np.arange(count)
+    while len(active):
+        sub = boards[active]
+        popped = find_pop_mask(sub)
+        removed = popped.sum(axis=(1, 2))
+        chained = removed > 0
+        if not chained.any():
+            break
+        active, sub, popped, removed = (active[chained], sub[chained], popped[chained],
+                                        removed[chained])
+
+        chain_counts[active] += 1
+        # chain_step_score と同じ計算
+        scores[active] += removed * 10 + chain_counts[active] * 50
+
+        # 隣接するおじゃまぷよも一緒に消して落とす
+        cleared = popped | (adjacent_mask(popped) & (sub == OJAMA))
+        sub[cleared] = EMPTY
+        apply_gravity(sub)
+        boards[active] = sub
+    return chain_counts, scores
+
+# ------------------------------------------------------------
+# バッチエンジン
+# ------------------------------------------------------------
+@dataclass
+class BatchStepResult:
+    """BatchEngine.step の結果（すべて長さNの配列）"""
+    placed: np.ndarray  # ペアを置けたか（置けない列・向きなら盤面はそのまま）
+    chain_counts: np.ndarray  # この手の連鎖数
+    scores: np.ndarray  # この手で得た点数
+    game_over: np.ndarray  # この手でゲームオーバーになったか
+
+class BatchEngine:
+    """N個のゲームをまとめて1手ずつ進めるエンジン"""
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.boards = np.zeros((count, BOARD_HEIGHT, BOARD_WIDTH), dtype=np.uint8)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.max_chain_counts = np.zeros(count, dtype=np.int32)
+        self.pieces_placed = np.zeros(count, dtype=np.int32)
+        self.game_over = np.zeros(count, dtype=bool)
+        # 盤面 i は PuyoEngine(seed=seed + i) と同じ順番でペアが出る
+        self.pair_queues = [PairQueue(seed + i) for i in range(count)]
+        self.pair_indices = [0] * count
+
+    def reset(self, indices=None, seeds=None):
+        """指定した盤面（省略時は全部）を空にして最初からにする"""
+        if indices is None:
+            indices = range(self.count)
+        indices = list(indices)
+        self.boards[indices] = EMPTY
+        self.scores[indices] = 0
+        self.max_chain_counts[indices] = 0
+        self.pieces_placed[indices] = 0
+        self.game_over[indices] = False
+        for n, i in enumerate(indices):
+            if seeds is not None:
+                self.pair_queues[i] = PairQueue(seeds[n])
+            self.pair_indices[i] = 0
+
+    def get_pairs(self, ahead=0) -> np.ndarray:
+        """各盤面の操作中のペア（ahead=1 で次のペア）を (N, 2) の配列で返す"""
+        return np.array([[color.value for color in queue.get(index + ahead)]
+                         for queue, index in zip(self.pair_queues, self.pair_indices)],
+                        dtype=np.uint8)
+
+    def column_heights(self) -> np.ndarray:
+        """各盤面・各列の高さ（N, 6）"""
+        return (self.boards != EMPTY).sum(axis=1)
+
+    def step(self, columns, rotations) -> BatchStepResult:
+        """各盤面で操作中のペアを列columns・向きrotationsで真下に落とし、連鎖まで進める"""
+        columns = np.asarray(columns, dtype=np.int64)
+        rotations = np.asarray(rotations, dtype=np.int64) % 4
+        pairs = self.get_pairs()
+        heights = self.column_heights()
+        rows = np.arange(self.count)
+
+        # 着地位置（PuyoEngine で落としてから重力を適用したのと同じ場所）
+        sub_columns = columns + _OFFSETS_X[rotations]
+        offset_y = _OFFSETS_Y[rotations]
+        in_board = ((columns >= 0) & (columns < BOARD_WIDTH) &
+                    (sub_columns >= 0) & (sub_columns < BOARD_WIDTH))
+        main_floor = BOARD_HEIGHT - 1 - heights[rows, np.clip(columns, 0, BOARD_WIDTH - 1)]
+        sub_floor = BOARD_HEIGHT - 1 - heights[rows, np.clip(sub_columns, 0, BOARD_WIDTH - 1)]
+        vertical = offset_y != 0
+        main_y = np.where(vertical, main_floor - np.maximum(offset_y, 0), main_floor)
+        sub_y = np.where(vertical, main_y + offset_y, sub_floor)
+        placed = in_board & (main_y >= 0) & (sub_y >= 0) & ~self.game_over
+
+        index = rows[placed]
+        self.boards[index, main_y[placed], columns[placed]] = pairs[placed, 0]
+        self.boards[index, sub_y[placed], sub_columns[placed]] = pairs[placed, 1]
+        self.pieces_placed[placed] += 1
+        for i in index.tolist():
+            self.pair_indices[i] += 1
+
+        chain_counts = np.zeros(self.count, dtype=np.int32)
+        scores = np.zeros(self.count, dtype=np.int64)
+        if len(index):
+            sub_boards = self.boards[index]
+            chain_counts[index], scores[index] = check_chains(sub_boards)
+            self.boards[index] = sub_boards
+        self.scores += scores
+        np.maximum(self.max_chain_counts, chain_counts, out=self.max_chain_counts)
+
+        # PuyoEngine.check_game_over と同じ（出現位置の1段下に主ぷよを置けなければ負け）
+        ended = placed & (self.column_heights()[:, SPAWN_X] >= BOARD_HEIGHT - 1)
+        self.game_over |= ended
+        return BatchStepResult(placed, chain_counts, scores, ended)
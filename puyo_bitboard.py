@@ -0,0 +1,308 @@
+"""
+色ごとの整数ビットマスクで表したボード（BitBoard）
+
+ListBoard と同じメソッドを持ち、PuyoEngine(board_class=BitBoard) のように
+差し替えて使う。連結探索・おじゃまぷよの巻き込み・重力による詰め直しを
+すべてシフトとマスクの演算で行うため、連鎖判定の多いシミュレーションで速い。
+
+ビット配置は列優先で、列 x・下から h 段目のセルが x * COLUMN_STRIDE + h 番目のビット。
+各列の最上段の上には常に0の番兵ビットがあり、上下シフトが隣の列へ漏れない。
+"""
+
+from typing import List
+
+from puyo_engine import PuyoColor, PuyoGroup, BOARD_WIDTH, BOARD_HEIGHT
+
+# 1列あたりのビット数（番兵ビット1つを含む）
+COLUMN_STRIDE = BOARD_HEIGHT + 1
+# 1列ぶんのセルのマスク
+COLUMN_MASK = (1 << BOARD_HEIGHT) - 1
+# 各列の最下段のビット
+BOTTOM_BITS = sum(1 << (x * COLUMN_STRIDE) for x in range(BOARD_WIDTH))
+# 盤面全体のマスク（番兵ビットを除く）
+FULL_MASK = COLUMN_MASK * BOTTOM_BITS
+
+# PuyoColor.value で引ける色の一覧
+_COLORS = sorted(PuyoColor, key=lambda color: color.value)
+# 連結判定の対象になる色（空以外）と masks の添字の組
+_FILLED_COLORS = [(color, color.value) for color in _COLORS if color != PuyoColor.EMPTY]
+_OJAMA_INDEX = PuyoColor.OJAMA.value
+
+def cell_bit(x, y) -> int:
+    """セル(x, y)に対応するビット"""
+    return 1 << (x * COLUMN_STRIDE + BOARD_HEIGHT - 1 - y)
+
+def cells_to_mask(cells) -> int:
+    """セル座標の集まりをビットマスクに変換"""
+    mask = 0
+    for x, y in cells:
+        mask |= 1 << (x * COLUMN_STRIDE + BOARD_HEIGHT - 1 - y)
+    return mask
+
+def mask_to_cells(mask) -> List[tuple]:
+    """ビットマスクをセル座標のリストに変換"""
+    cells = []
+    while mask:
+        low = mask & -mask
+        x, h = divmod(low.bit_length() - 1, COLUMN_STRIDE)
+        cells.append((x, BOARD_HEIGHT - 1 - h))
+        mask ^= low
+    return cells
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python 3.9以前
+    def popcount(mask) -> int:
+        """立っているビットの数"""
+        return bin(mask).count("1")
+
+def expand(mask) -> int:
+    """上下左右に1マス広げたマスク（元のマスクを含む）"""
+    return (mask | (mask << 1) | (mask >> 1) |
+            (mask << COLUMN_STRIDE) | (mask >> COLUMN_STRIDE)) & FULL_MASK
+
+def flood_fill(seed, color_mask) -> int:
+    """seedからcolor_mask内でつながった領域を返す"""
+    group = seed
+    while True:
+        grown = expand(group) & color_mask
+        if grown == group:
+            return group
+        group = grown
+
+def _index(i, length) -> int:
+    """リストと同じく負の添字を末尾からの位置として扱う"""
+    if i < 0:
+        i += length
+    if not 0 <= i < length:
+        raise IndexError(i)
+    return i
+
+class _BitBoardRow:
+    """board[y][x] 形式でアクセスするための行ビュー"""
+    __slots__ = ('board', 'y')
+
+    def __init__(self, board, y):
+        self.board = board
+        self.y = y
+
+    def __getitem__(self, x):
+        return self.board.get(_index(x, BOARD_WIDTH), self.y)
+
+    def __setitem__(self, x, color):
+        self.board.set(_index(x, BOARD_WIDTH), self.y, color)
+
+    def __len__(self):
+        return BOARD_WIDTH
+
+    def __iter__(self):
+        for x in range(BOARD_WIDTH):
+            yield self.board.get(x, self.y)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+class BitBoard:
+    """色ごとのビットマスクで表したボード"""
+    __slots__ = ('masks',)
+
+    def __init__(self, masks=None):
+        # PuyoColor.value ごとのビットマスク（EMPTYの位置は未使用）
+        self.masks = list(masks) if masks is not None else [0] * len(_COLORS)
+
+    @classmethod
+    def from_rows(cls, rows) -> 'BitBoard':
+        """board[y][x] 形式の二次元リストから作成"""
+        board = cls()
+        for y, row in enumerate(rows):
+            for x, color in enumerate(row):
+                if color != PuyoColor.EMPTY:
+                    board.masks[color.value] |= cell_bit(x, y)
+        return board
+
+    def to_rows(self) -> List[List[PuyoColor]]:
+        """board[y][x] 形式の二次元リストに変換"""
+        return [list(self[y]) for y in range(BOARD_HEIGHT)]
+
+    def copy(self) -> 'BitBoard':
+        """ボードを複製"""
+        return BitBoard(self.masks)
+
+    def snapshot(self):
+        """変更できない形（マスクのタプル）で盤面を取り出す"""
+        return tuple(self.masks)
+
+    @classmethod
+    def from_snapshot(cls, data) -> 'BitBoard':
+        """snapshot() で取り出した盤面から作成"""
+        return cls(data)
+
+    def occupied(self) -> int:
+        """ぷよが置かれているセルのマスク"""
+        occupied = 0
+        for mask in self.masks:
+            occupied |= mask
+        return occupied
+
+    # ------------------------------------------------------------
+    # board[y][x] 互換のアクセス
+    # ------------------------------------------------------------
+    def __len__(self):
+        return BOARD_HEIGHT
+
+    def __getitem__(self, y):
+        return _BitBoardRow(self, _index(y, BOARD_HEIGHT))
+
+    def __iter__(self):
+        for y in range(BOARD_HEIGHT):
+            yield _BitBoardRow(self, y)
+
+    def __eq__(self, other):
+        if isinstance(other, BitBoard):
+            return self.masks == other.masks
+        return self.to_rows() == [list(row) for row in other]
+
+    def get(self, x, y) -> PuyoColor:
+        """セル(x, y)の色"""
+        bit = cell_bit(x, y)
+        masks = self.masks
+        for color, index in _FILLED_COLORS:
+            if masks[index] & bit:
+                return color
+        return PuyoColor.EMPTY
+
+    def set(self, x, y, color):
+        """セル(x, y)に色を置く"""
+        bit = cell_bit(x, y)
+        masks = self.masks
+        for i in range(len(masks)):
+            masks[i] &= ~bit
+        if color != PuyoColor.EMPTY:
+            masks[color.value] |= bit
+
+    def column_heights(self) -> List[int]:
+        """各列の高さ（一番上のぷよから最下段までの段数）"""
+        occupied = self.occupied()
+        return [((occupied >> (x * COLUMN_STRIDE)) & COLUMN_MASK).bit_length()
+                for x in range(BOARD_WIDTH)]
+
+    def column_counts(self) -> List[int]:
+        """各列のぷよの数（浮いたぷよも数える）"""
+        occupied = self.occupied()
+        return [popcount((occupied >> (x * COLUMN_STRIDE)) & COLUMN_MASK)
+                for x in range(BOARD_WIDTH)]
+
+    def iter_puyos(self):
+        """置かれているぷよを (x, y, 色) で列挙"""
+        masks = self.masks
+        for color, index in _FILLED_COLORS:
+            for x, y in mask_to_cells(masks[index]):
+                yield x, y, color
+
+    # ------------------------------------------------------------
+    # ルール処理（ListBoardと同じインターフェース）
+    # ------------------------------------------------------------
+    def find_connected(self, start_x, start_y, color):
+        """指定した色のつながったぷよを探す"""
+        if color == PuyoColor.EMPTY:
+            return []
+        if not (0 <= start_x < BOARD_WIDTH and 0 <= start_y < BOARD_HEIGHT):
+            return []
+        color_mask = self.masks[color.value]
+        seed = cell_bit(start_x, start_y) & color_mask
+        if not seed:
+            return []
+        return mask_to_cells(flood_fill(seed, color_mask))
+
+    def find_group_masks(self, seed_mask=None):
+        """4つ以上つながったグループを (色, マスク) のリストで返す
+
+        seed_mask を渡した場合は、そのビットを含むグループだけを探す。
+        """
+        groups = []
+        for color, index in _FILLED_COLORS:
+            color_mask = self.masks[index]
+            if popcount(color_mask) < 4:
+                continue
+
+            # 同色の隣接が2方向以上あるセル。3個以上つながった領域は
+            # 必ずこのセルを含むので、ここからだけ探索すればよい
+            up = color_mask & (color_mask >> 1)
+            down = color_mask & (color_mask << 1)
+            left = color_mask & (color_mask << COLUMN_STRIDE)
+            right = color_mask & (color_mask >> COLUMN_STRIDE)
+            seeds = ((up & (down | left | right)) | (down & (left | right)) |
+                     (left & right))
+            if seed_mask is not None and seeds:
+                # 起点に指定されたセルのうち、この色のものから探索する
+                seeds = color_mask & seed_mask
+
+            while seeds:
+                group = flood_fill(seeds & -seeds, color_mask)
+                seeds &= ~group
+                if popcount(group) >= 4:
+                    groups.append((color, group))
+        return groups
+
+    def find_groups(self, seeds=None) -> List[PuyoGroup]:
+        """4つ以上つながったぷよのグループを返す（seedsを含むものだけに絞れる）"""
+        seed_mask = None if seeds is None else cells_to_mask(seeds)
+        return [PuyoGroup(color, mask_to_cells(mask))
+                for color, mask in self.find_group_masks(seed_mask)]
+
+    def find_adjacent_ojama(self, cells):
+        """指定セルに隣接するおじゃまぷよの位置を返す"""
+        ojama_mask = self.masks[_OJAMA_INDEX]
+        if not ojama_mask:
+            return set()
+        return set(mask_to_cells(expand(cells_to_mask(cells)) & ojama_mask))
+
+    def remove_cells(self, cells):
+        """指定セルを空にする"""
+        if not cells:
+            return
+        keep = ~cells_to_mask(cells)
+        self.masks = [mask & keep for mask in self.masks]
+
+    def apply_gravity(self, toggles=None, columns=None):
+        """重力を適用してぷよを下に落とし、中身が変わったセルを返す
+
+        toggles にリストを渡すと、消えた・現れた (x, y, 色) をすべて追加する。
+        全列を一度に詰めるので columns（ListBoard 用の列の指定）は使わない。
+        """
+        original = self.masks
+        changed = self.settle()
+        if changed and toggles is not None:
+            for index, (before, after) in enumerate(zip(original, self.masks)):
+                diff = before ^ after
+                if diff:
+                    color = _COLORS[index]
+                    toggles.extend((x, y, color) for x, y in mask_to_cells(diff))
+        return mask_to_cells(changed)
+
+    def settle(self) -> int:
+        """重力を適用し、中身が変わったセルのマスクを返す（apply_gravity のマスク版）
+
+        列ごとの空きをシフトで詰める。
+        """
+        original = masks = self.masks
+        occupied = self.occupied()
+        while True:
+            # 各列で一番下の空きマス（満杯の列は番兵ビット）
+            first_empty = ~occupied & (occupied + BOTTOM_BITS)
+            # 各列の一番下の空きマス以下
+            settled = (first_empty << 1) - BOTTOM_BITS
+            floating = occupied & ~settled
+            if not floating:
+                break
+
+            # 空きマスより上のぷよを全列同時に1段下げる
+            rising = ~settled
+            masks = [(mask & settled) | ((mask & rising) >> 1) for mask in masks]
+            occupied = (occupied & settled) | (floating >> 1)
+            self.masks = masks
+
+        changed = 0
+        for before, after in zip(original, masks):
+            changed |= before ^ after
+        return changed
@@ -0,0 +1,1252 @@
+"""
+ぷよぷよのゲームルール（pygameに依存しないエンジン）
+
+main.py と main_web.py の PuyoGame はこのクラスを継承して描画と入力を担当する。
+ボットやリプレイ検証ではこのクラスを直接使うことで、画面や待機なしで
+CPU速度のままゲームを進められる。
+"""
+
+import random
+from collections import OrderedDict, deque
+from operator import attrgetter
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional, Tuple
+
+# 盤面サイズ
+BOARD_WIDTH = 6
+BOARD_HEIGHT = 12
+
+# 色定義
+class PuyoColor(Enum):
+    EMPTY = 0
+    RED = 1
+    BLUE = 2
+    GREEN = 3
+    YELLOW = 4
+    OJAMA = 5  # おじゃまぷよ
+
+# 操作ぷよとして出現する色
+PUYO_COLORS = [PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW]
+
+# 回転に応じた副ぷよの相対位置
+ROTATION_OFFSETS = [
+    (0, -1),  # 0: 上
+    (1, 0),   # 1: 右
+    (0, 1),   # 2: 下
+    (-1, 0)   # 3: 左
+]
+
+# 隣接4方向（上下左右）
+DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+
+# シミュレーションの固定ステップ（ミリ秒）。描画のフレームレートに関係なく
+# ゲームはこの刻みで進むため、同じ入力なら同じ結果になる
+SIMULATION_STEP = 10
+
+# 操作（リプレイの記録単位）。ACTION_GRAVITY は入力ではなく自動落下を表す
+ACTION_LEFT = 0
+ACTION_RIGHT = 1
+ACTION_DOWN = 2
+ACTION_ROTATE = 3
+ACTION_END = 4
+ACTION_GRAVITY = 5
+
+# 連鎖処理の段階
+CHAIN_POP = 'pop'        # 4つ以上つながったぷよを探して消す
+CHAIN_SETTLE = 'settle'  # 消えた跡にぷよを落とす
+
+# 盤面の全セル（連結探索を全体で行うときの起点）
+ALL_CELLS = [(x, y) for y in range(BOARD_HEIGHT) for x in range(BOARD_WIDTH)]
+
+# Zobristハッシュの乱数表 ZOBRIST_KEYS[x][y][PuyoColor.value]（空は0なので何も変えない）
+_zobrist_rng = random.Random(0x5A0B)
+ZOBRIST_KEYS = [[[0] + [_zobrist_rng.getrandbits(64) for _ in range(len(PuyoColor) - 1)]
+                 for _ in range(BOARD_HEIGHT)]
+                for _ in range(BOARD_WIDTH)]
+
+def zobrist_hash(board) -> int:
+    """ボード（ListBoard / BitBoard）全体からZobristハッシュを計算
+
+    エンジンは差分で更新するので、盤面の読み込み時と検証用。
+    """
+    h = 0
+    for x, y, color in board.iter_puyos():
+        h ^= ZOBRIST_KEYS[x][y][color.value]
+    return h
+
+class TranspositionTable:
+    """盤面ハッシュなどをキーにした結果の表（容量を超えたら最も使われていないものから捨てる）"""
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """keyの値（なければdefault）"""
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """keyに値を登録"""
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+@dataclass
+class PuyoGroup:
+    """消去対象になる同色ぷよのまとまり"""
+    color: PuyoColor
+    cells: List[Tuple[int, int]]
+
+    @property
+    def size(self) -> int:
+        return len(self.cells)
+
+class ListBoard(list):
+    """二次元リスト（board[y][x]）で表したボード（標準のバックエンド）"""
+    def __init__(self, rows=None):
+        if rows is None:
+            super().__init__([PuyoColor.EMPTY for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT))
+        else:
+            super().__init__(list(row) for row in rows)
+
+    @classmethod
+    def from_rows(cls, rows) -> 'ListBoard':
+        """board[y][x] 形式の二次元リストから作成"""
+        return cls(rows)
+
+    def to_rows(self) -> List[List[PuyoColor]]:
+        """board[y][x] 形式の二次元リストに変換"""
+        return [list(row) for row in self]
+
+    def copy(self) -> 'ListBoard':
+        """ボードを複製"""
+        return ListBoard(self)
+
+    def snapshot(self):
+        """変更できない形（行のタプル）で盤面を取り出す"""
+        return tuple(map(tuple, self))
+
+    @classmethod
+    def from_snapshot(cls, data) -> 'ListBoard':
+        """snapshot() で取り出した盤面から作成"""
+        return cls(data)
+
+    def column_heights(self) -> List[int]:
+        """各列の高さ（一番上のぷよから最下段までの段数）"""
+        heights = []
+        for x in range(BOARD_WIDTH):
+            height = 0
+            for y in range(BOARD_HEIGHT):
+                if self[y][x] != PuyoColor.EMPTY:
+                    height = BOARD_HEIGHT - y
+                    break
+            heights.append(height)
+        return heights
+
+    def column_counts(self) -> List[int]:
+        """各列のぷよの数（浮いたぷよも数える。落ち切った盤面では column_heights と同じ）"""
+        return [sum(row[x] != PuyoColor.EMPTY for row in self) for x in range(BOARD_WIDTH)]
+
+    def iter_puyos(self):
+        """置かれているぷよを (x, y, 色) で列挙"""
+        for y, row in enumerate(self):
+            for x, color in enumerate(row):
+                if color != PuyoColor.EMPTY:
+                    yield x, y, color
+
+    def find_connected(self, start_x, start_y, color):
+        """指定した色のつながったぷよを探す（深度優先探索）"""
+        if color == PuyoColor.EMPTY:
+            return []
+
+        visited = set()
+        stack = [(start_x, start_y)]
+        connected = []
+
+        while stack:
+            x, y = stack.pop()
+
+            if (x, y) in visited:
+                continue
+
+            if (x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT or
+                self[y][x] != color):
+                continue
+
+            visited.add((x, y))
+            connected.append((x, y))
+
+            # 隣接セルをスタックに追加
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if (nx, ny) not in visited:
+                    stack.append((nx, ny))
+
+        return connected
+
+    def find_groups(self, seeds=None) -> List[PuyoGroup]:
+        """4つ以上つながったぷよのグループを返す（各セルは1回だけ訪問）
+
+        seeds を渡した場合は、そのセルを含むグループだけを探す。
+        """
+        groups = []
+        visited = [False] * (BOARD_WIDTH * BOARD_HEIGHT)
+
+        for x, y in (ALL_CELLS if seeds is None else seeds):
+            color = self[y][x]
+            if color == PuyoColor.EMPTY or visited[y * BOARD_WIDTH + x]:
+                continue
+
+            # このセルを含む同色の領域をたどる（各セルは一度だけ訪問される）
+            visited[y * BOARD_WIDTH + x] = True
+            cells = [(x, y)]
+            stack = [(x, y)]
+            while stack:
+                cx, cy = stack.pop()
+                for dx, dy in DIRECTIONS:
+                    nx, ny = cx + dx, cy + dy
+                    if (0 <= nx < BOARD_WIDTH and 0 <= ny < BOARD_HEIGHT and
+                        not visited[ny * BOARD_WIDTH + nx] and self[ny][nx] == color):
+                        visited[ny * BOARD_WIDTH + nx] = True
+                        cells.append((nx, ny))
+                        stack.append((nx, ny))
+
+            if len(cells) >= 4:
+                groups.append(PuyoGroup(color, cells))
+
+        return groups
+
+    def find_adjacent_ojama(self, cells):
+        """指定セルに隣接するおじゃまぷよの位置を返す"""
+        ojama = set()
+        for x, y in cells:
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if (0 <= nx < BOARD_WIDTH and 0 <= ny < BOARD_HEIGHT and
+                    self[ny][nx] == PuyoColor.OJAMA):
+                    ojama.add((nx, ny))
+        return ojama
+
+    def remove_cells(self, cells):
+        """指定セルを空にする"""
+        for x, y in cells:
+            self[y][x] = PuyoColor.EMPTY
+
+    def apply_gravity(self, toggles=None, columns=None):
+        """重力を適用してぷよを下に落とし、中身が変わったセルを返す
+
+        toggles にリストを渡すと、消えた・現れた (x, y, 色) をすべて追加する
+        （Zobristハッシュの差分更新用）。columns を渡すとその列だけを詰める。
+        """
+        changed = []
+        for x in (range(BOARD_WIDTH) if columns is None else sorted(columns)):
+            # 各列で空でないぷよを下に詰める
+            column = []
+            for y in range(BOARD_HEIGHT):
+                if self[y][x] != PuyoColor.EMPTY:
+                    column.append(self[y][x])
+
+            # 上を空にして下から詰め直す（変わったセルだけ書き換える）
+            top = BOARD_HEIGHT - len(column)
+            for y in range(BOARD_HEIGHT):
+                puyo = PuyoColor.EMPTY if y < top else column[y - top]
+                if self[y][x] != puyo:
+                    if toggles is not None:
+                        toggles.append((x, y, self[y][x]))
+                        toggles.append((x, y, puyo))
+                    self[y][x] = puyo
+                    changed.append((x, y))
+        return changed
+
+def chain_step_score(chain_count, removed_count) -> int:
+    """連鎖1段の得点（ぷよ1個につき10点＋連鎖数×50点の連鎖ボーナス）"""
+    return removed_count * 10 + chain_count * 50
+
+# 盤面をテキストで表すときの文字
+BOARD_CHARS = {
+    PuyoColor.EMPTY: '.',
+    PuyoColor.RED: 'R',
+    PuyoColor.BLUE: 'B',
+    PuyoColor.GREEN: 'G',
+    PuyoColor.YELLOW: 'Y',
+    PuyoColor.OJAMA: 'O',
+}
+
+def format_board(board) -> str:
+    """盤面を1行1段のテキストにする（ログやコマンドライン表示用）"""
+    return "\n".join("".join(BOARD_CHARS[color] for color in row) for row in board)
+
+class FixedTimestep:
+    """可変の経過時間を固定ステップの回数に変換する（アキュムレータ方式）"""
+    def __init__(self, step=SIMULATION_STEP, max_steps=25):
+        self.step = step
+        self.max_steps = max_steps  # 1回で進める最大ステップ数（処理落ち時の暴走防止）
+        self.accumulator = 0.0
+
+    def advance(self, dt) -> int:
+        """経過時間dtを加え、今回進めるべきステップ数を返す"""
+        self.accumulator += dt
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            # 追いつけない分は切り捨てる
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """直前のステップから次のステップまでの進み具合（描画の補間用、0.0〜1.0）"""
+        return self.accumulator / self.step
+
+class PairQueue:
+    """シード付き乱数で作るぷよペアの列
+
+    同じシードからは常に同じ順番でペアが出る。必要になった分だけ生成して
+    覚えておくので、先の何手でも見られ、複数のプレイヤー（エンジン）で
+    共有すれば全員に同じ順番でペアが配られる。
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.rng = random.Random(seed)  # ペア専用（パーティクル等の乱数の影響を受けない）
+        self.pairs = []  # これまでに生成したペア
+
+    def get(self, index) -> List[PuyoColor]:
+        """index番目（0から）のペア"""
+        while len(self.pairs) <= index:
+            rng = self.rng
+            self.pairs.append((rng.choice(PUYO_COLORS), rng.choice(PUYO_COLORS)))
+        return list(self.pairs[index])
+
+    def peek(self, start, count) -> List[List[PuyoColor]]:
+        """start番目からcount個のペア"""
+        return [self.get(i) for i in range(start, start + count)]
+
+# GameSnapshot にそのまま保存するエンジンの属性（すべて変更できない値）
+SNAPSHOT_FIELDS = (
+    'pair_index', 'puyo_x', 'puyo_y', 'puyo_rotation',
+    'fall_timer', 'fall_speed', 'level', 'lines_cleared',
+    'ojama_timer', 'ojama_count', 'score', 'max_chain_count',
+    'pieces_placed', 'ojama_received',
+    'chain_phase', 'chain_timer', 'chain_count', 'chain_score',
+    'game_over', 'tick_count',
+)
+_get_snapshot_fields = attrgetter(*SNAPSHOT_FIELDS)
+# 属性名から values の位置を引く表
+_SNAPSHOT_INDEX = {name: index for index, name in enumerate(SNAPSHOT_FIELDS)}
+
+class GameSnapshot:
+    """ゲーム状態の変更できないスナップショット（PuyoEngine.snapshot / restore 用）
+
+    盤面は board.snapshot() の値（ListBoard は行のタプル、BitBoard はマスクのタプル）で
+    持ち、ほかの状態は数値のタプルにまとめる。ハッシュは盤面のZobristハッシュから
+    求めるので、辞書のキーにしても盤面全体を調べ直すことはない。
+    描画側の状態（パーティクルやアニメーション）は含まない。
+    """
+    __slots__ = ('board', 'board_hash', 'heights', 'current_puyo', 'next_puyo',
+                 'dirty_cells', 'unsettled_columns', 'values', 'ojama_rng_state', '_hash')
+
+    def __init__(self, board, board_hash, heights, current_puyo, next_puyo,
+                 dirty_cells, unsettled_columns, values, ojama_rng_state):
+        set_slot = object.__setattr__
+        set_slot(self, 'board', board)
+        set_slot(self, 'board_hash', board_hash)
+        set_slot(self, 'heights', heights)
+        set_slot(self, 'current_puyo', current_puyo)
+        set_slot(self, 'next_puyo', next_puyo)
+        set_slot(self, 'dirty_cells', dirty_cells)
+        set_slot(self, 'unsettled_columns', unsettled_columns)
+        set_slot(self, 'values', values)
+        set_slot(self, 'ojama_rng_state', ojama_rng_state)
+        set_slot(self, '_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameSnapshot は変更できません")
+
+    def __getattr__(self, name):
+        # SNAPSHOT_FIELDS の属性は values から読む（snapshot.score など）
+        index = _SNAPSHOT_INDEX.get(name)
+        if index is None:
+            raise AttributeError(name)
+        return self.values[index]
+
+    def __reduce__(self):
+        # pickle でもプロセス間で受け渡せるようにする
+        return (GameSnapshot, (self.board, self.board_hash, self.heights, self.current_puyo,
+                               self.next_puyo, self.dirty_cells, self.unsettled_columns,
+                               self.values, self.ojama_rng_state))
+
+    def __eq__(self, other):
+        if not isinstance(other, GameSnapshot):
+            return NotImplemented
+        # 安い比較から順に行う
+        return (self.board_hash == other.board_hash and self.values == other.values and
+                self.current_puyo == other.current_puyo and self.next_puyo == other.next_puyo and
+                self.board == other.board and self.dirty_cells == other.dirty_cells and
+                self.unsettled_columns == other.unsettled_columns and
+                self.ojama_rng_state == other.ojama_rng_state)
+
+    def __hash__(self):
+        if self._hash is None:
+            # 乱数の状態は大きいので、同じ値になったときの比較（__eq__）にまかせる
+            object.__setattr__(self, '_hash', hash((self.board_hash, self.values)))
+        return self._hash
+
+    def __repr__(self):
+        return (f"GameSnapshot(tick_count={self.tick_count}, score={self.score}, "
+                f"board_hash={self.board_hash:#018x})")
+
+class PuyoEngine:
+    """ゲームルールのみを扱うクラス（描画・入力・待機なし）"""
+    # 壁キック時に試すずらし量（右、左、右2マス、左2マス）
+    KICK_OFFSETS = (1, -1, 2, -2)
+    # 時間経過でおじゃまぷよを落とすかどうか
+    OJAMA_ENABLED = True
+    # レベルアップの曲線（LEVEL_CHAINS連鎖ごとにレベルが上がり、落下間隔が
+    # FALL_SPEED_STEPミリ秒ずつ短くなる。MIN_FALL_SPEEDより速くはならない）
+    LEVEL_CHAINS = 10
+    FALL_SPEED_STEP = 80
+    MIN_FALL_SPEED = 50
+
+    def __init__(self, board_class=None, seed=None, pair_queue=None):
+        # ボードの実装（ListBoard または puyo_bitboard.BitBoard）
+        self.board_class = board_class or ListBoard
+
+        # ゲームボード初期化
+        self.board = self.board_class()
+        # 前回の連鎖判定以降に中身が変わったセル（Noneなら全セルを調べる）
+        self.dirty_cells = set()
+        # 盤面のZobristハッシュ（配置・重力・消去のたびに差分で更新）
+        self.board_hash = 0
+        # 各列のぷよの数（重力で落ち切った盤面では列の高さと同じ）
+        self.heights = [0] * BOARD_WIDTH
+        # 前回の重力以降にぷよを置いた・消した列（Noneなら全列を詰める）
+        self.unsettled_columns = set()
+
+        # ぷよペアとおじゃまぷよの乱数（pair_queueを渡すと他のプレイヤーと共有する）
+        self.init_random(seed, pair_queue)
+
+        # 現在のぷよペア
+        self.current_puyo = self.create_new_puyo()
+        self.next_puyo = self.create_new_puyo()  # 次のぷよ
+        self.puyo_x = BOARD_WIDTH // 2 - 1
+        self.puyo_y = 0
+        self.puyo_rotation = 0  # 0:上, 1:右, 2:下, 3:左
+
+        # 落下タイマー
+        self.fall_timer = 0
+        self.fall_speed = 500  # ミリ秒
+        self.base_fall_speed = 500  # 基本落下速度
+
+        # レベルシステム
+        self.level = 1
+        self.lines_cleared = 0  # 消去したライン数（連鎖回数）
+
+        # おじゃまぷよシステム
+        self.ojama_timer = 0
+        self.ojama_interval = 30000  # 30秒ごとにおじゃまぷよ
+        self.ojama_count = 0  # 次に落とすおじゃまぷよの数
+
+        # スコアシステム
+        self.score = 0
+        self.max_chain_count = 0  # 最大連鎖数を記録
+
+        # 統計
+        self.pieces_placed = 0  # 置いたぷよペアの数
+        self.ojama_received = 0  # 降ってきたおじゃまぷよの数
+
+        # 連鎖処理（chain_delay が0なら着地時にすべての段を一度に処理する）
+        self.chain_delay = 0  # 消去・落下の各段階のあいだの待ち時間（ミリ秒）
+        self.chain_phase = None  # 処理中の段階（CHAIN_POP / CHAIN_SETTLE、処理中でなければNone）
+        self.chain_timer = 0  # 次の段階までの残り時間
+        self.chain_count = 0  # 処理中の連鎖数
+        self.chain_score = 0  # 処理中の連鎖で得た点数
+
+        # ゲーム状態
+        self.game_over = False
+        self.tick_count = 0  # 進めた固定ステップ数
+        # 操作の記録先（(tick_count, 操作) を追加していくリスト、記録しないならNone）
+        self.input_log = None
+        # simulate_chains の結果を覚えておく ChainSimulator（最初に使うときに作る。
+        # 複数のエンジンで1つを共有してもよい）
+        self.chain_simulator = None
+
+    # ------------------------------------------------------------
+    # サブクラス（描画側）が上書きするフック
+    # ------------------------------------------------------------
+    def on_chain_step(self, chain_count):
+        """連鎖1段の消去と落下が終わった直後に呼ばれる"""
+        pass
+
+    def on_ojama_dropped(self, x, y):
+        """おじゃまぷよを1個配置した直後に呼ばれる"""
+        pass
+
+    def on_game_over(self):
+        """ゲームオーバーになった直後に呼ばれる"""
+        pass
+
+    # ------------------------------------------------------------
+    # ゲーム進行
+    # ------------------------------------------------------------
+    def update(self, dt):
+        """経過時間dt（ミリ秒）だけ自動落下・連鎖処理・おじゃまタイマーを進める"""
+        # 連鎖処理中は落下とおじゃまぷよを止めて連鎖を進める
+        if self.chain_phase is not None:
+            self.update_chain_resolution(dt)
+            return
+
+        # ぷよの自動落下（ゲームオーバー時は停止）
+        if not self.game_over:
+            self.fall_timer += dt
+            if self.fall_timer >= self.fall_speed:
+                self.log_action(ACTION_GRAVITY)
+                self.move_puyo_down()
+                self.fall_timer = 0
+
+        # おじゃまぷよタイマー更新
+        if self.OJAMA_ENABLED:
+            self.update_ojama_timer(dt)
+
+    def step(self):
+        """固定ステップ1回ぶんゲームを進める"""
+        self.tick_count += 1
+        self.update(SIMULATION_STEP)
+
+    def simulate(self, duration):
+        """duration（ミリ秒）ぶん待ち時間なしでゲームを進める（画面なしでの高速実行用）"""
+        for _ in range(int(duration // SIMULATION_STEP)):
+            if self.game_over:
+                break
+            self.step()
+
+    def apply_action(self, action):
+        """操作を1つ行う（記録中なら input_log にも残す）"""
+        self.log_action(action)
+        if action == ACTION_LEFT:
+            self.move_puyo(-1, 0)
+        elif action == ACTION_RIGHT:
+            self.move_puyo(1, 0)
+        elif action == ACTION_DOWN:
+            self.move_puyo_down()
+        elif action == ACTION_ROTATE:
+            self.rotate_puyo()
+        elif action == ACTION_END:
+            self.end_game()
+
+    def log_action(self, action):
+        """記録中なら現在のステップ数と操作を input_log に追加"""
+        if self.input_log is not None:
+            self.input_log.append((self.tick_count, action))
+
+    def is_resolving_chains(self):
+        """連鎖を段階的に処理している最中かどうか"""
+        return self.chain_phase is not None
+
+    def init_random(self, seed=None, pair_queue=None):
+        """ペアの列とおじゃまぷよ用の乱数を用意する（seedがNoneなら毎回違う列）"""
+        self.pair_queue = pair_queue or PairQueue(seed)
+        self.seed = self.pair_queue.seed
+        self.pair_index = 0  # 次に pair_queue から取り出すペアの番号
+        # おじゃまぷよの落ちる列はペアとは別の乱数で決める
+        self.ojama_rng = random.Random(f"{self.seed}-ojama")
+        # snapshot() 用に取り出した ojama_rng の状態（おじゃまぷよを落とすまで使い回す）
+        self.ojama_rng_state = None
+
+    def create_new_puyo(self):
+        """ペアの列から次のぷよペアを取り出す"""
+        pair = self.pair_queue.get(self.pair_index)
+        self.pair_index += 1
+        return pair
+
+    def get_upcoming_pairs(self, count):
+        """次のぷよ（next_puyo）のさらに先のペアをcount個返す"""
+        return self.pair_queue.peek(self.pair_index, count)
+
+    def get_puyo_positions(self):
+        """現在のぷよペアの位置を取得"""
+        main_pos = (self.puyo_x, self.puyo_y)
+        offset_x, offset_y = ROTATION_OFFSETS[self.puyo_rotation]
+        sub_pos = (self.puyo_x + offset_x, self.puyo_y + offset_y)
+
+        return main_pos, sub_pos
+
+    def move_puyo(self, dx, dy):
+        """ぷよを移動"""
+        if self.chain_phase is not None:
+            return False
+
+        new_x = self.puyo_x + dx
+        new_y = self.puyo_y + dy
+
+        if self.is_valid_position(new_x, new_y):
+            self.puyo_x = new_x
+            self.puyo_y = new_y
+            return True
+        return False
+
+    def move_puyo_down(self):
+        """ぷよを下に移動し、着地したら固定する"""
+        if self.chain_phase is not None:
+            return
+        if not self.move_puyo(0, 1):
+            self.lock_puyo()
+
+    def lock_puyo(self):
+        """着地したぷよを固定して連鎖を処理し、次のぷよを出す"""
+        self.place_puyo()
+        self.pieces_placed += 1
+        # 着地後に重力を適用（個別のぷよが独立して落下）
+        self.apply_gravity()
+
+        if self.chain_delay > 0:
+            # 連鎖は update() で1段ずつ進め、終わってから次のぷよを出す
+            self.begin_chains()
+            self.chain_phase = CHAIN_POP
+            self.chain_timer = 0
+        else:
+            self.check_chains()
+            self.spawn_next_puyo()
+
+    def spawn_next_puyo(self):
+        """次のぷよを出現させる（置けなければゲームオーバー）"""
+        if self.check_game_over():
+            self.game_over = True
+            self.on_game_over()
+            return
+
+        # 次のぷよを現在のぷよにして、新しい次のぷよを生成
+        self.current_puyo = self.next_puyo
+        self.next_puyo = self.create_new_puyo()
+        self.puyo_x = BOARD_WIDTH // 2 - 1
+        self.puyo_y = 0
+        self.puyo_rotation = 0
+
+    def end_game(self):
+        """ゲームを手動で終了"""
+        if not self.game_over:
+            self.game_over = True
+            self.on_game_over()
+
+    def is_valid_position(self, x, y, rotation=None):
+        """位置が有効かチェック"""
+        if rotation is None:
+            rotation = self.puyo_rotation
+
+        # 操作中は盤面が落ち切っているので、列の高さより上なら空いている
+        heights = self.heights
+
+        # 主ぷよの位置チェック
+        if x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT - heights[x]:
+            return False
+
+        # 副ぷよの位置チェック
+        offset_x, offset_y = ROTATION_OFFSETS[rotation]
+        sub_x, sub_y = x + offset_x, y + offset_y
+
+        if sub_x < 0 or sub_x >= BOARD_WIDTH or sub_y < 0 or sub_y >= BOARD_HEIGHT - heights[sub_x]:
+            return False
+
+        return True
+
+    def place_puyo(self):
+        """ぷよをボードに配置"""
+        main_pos, sub_pos = self.get_puyo_positions()
+        self.set_cell(main_pos[0], main_pos[1], self.current_puyo[0])
+        self.set_cell(sub_pos[0], sub_pos[1], self.current_puyo[1])
+        if self.unsettled_columns is not None:
+            # 横向きに置いたときは片方が浮いているので次の重力で詰める
+            self.unsettled_columns.update((main_pos[0], sub_pos[0]))
+        if sub_pos[1] < 0:
+            # 盤面の上に出た副ぷよはリストの負の添字で最下段に入るため全体を調べ直す
+            self.mark_all_dirty()
+        else:
+            self.mark_dirty((main_pos, sub_pos))
+
+    def set_cell(self, x, y, color):
+        """セルに色を置き、盤面ハッシュと列の高さを更新する"""
+        old = self.board[y][x]
+        self.board[y][x] = color
+        # 負の y はリストと同じく下から数えた段になる
+        keys = ZOBRIST_KEYS[x][y % BOARD_HEIGHT]
+        self.board_hash ^= keys[old.value] ^ keys[color.value]
+        self.heights[x] += (color != PuyoColor.EMPTY) - (old != PuyoColor.EMPTY)
+
+    # ------------------------------------------------------------
+    # 変更セルの記録（連鎖判定の起点を絞り込む）
+    # ------------------------------------------------------------
+    def mark_dirty(self, cells):
+        """中身が変わったセルを記録"""
+        if self.dirty_cells is not None:
+            self.dirty_cells.update(cells)
+
+    def mark_all_dirty(self):
+        """次の連鎖判定で全セルを調べるようにする"""
+        self.dirty_cells = None
+
+    def load_board(self, board):
+        """外部で作ったボードに差し替える（二次元リストも可）"""
+        if not isinstance(board, self.board_class):
+            board = self.board_class.from_rows(board)
+        self.board = board
+        self.board_hash = zobrist_hash(board)
+        # 浮いたぷよがあるかもしれないので高さはぷよの数で持ち（置く・消すと
+        # 1つずつ増減させる数と揃える）、次の重力では全列を詰める
+        self.heights = board.column_counts()
+        self.unsettled_columns = None
+        self.mark_all_dirty()
+
+    def rotate_puyo(self):
+        """ぷよを回転（4方向回転）- 壁キック機能付き"""
+        if self.chain_phase is not None:
+            return
+
+        new_rotation = (self.puyo_rotation + 1) % 4
+
+        # 回転後の位置が有効かチェック
+        if self.is_valid_position(self.puyo_x, self.puyo_y, new_rotation):
+            # 通常回転
+            self.puyo_rotation = new_rotation
+        else:
+            # 壁キック処理（左右にずらして回転を試みる）
+            for offset in self.KICK_OFFSETS:
+                if self.is_valid_position(self.puyo_x + offset, self.puyo_y, new_rotation):
+                    self.puyo_x += offset
+                    self.puyo_rotation = new_rotation
+                    break
+
+    # ------------------------------------------------------------
+    # 連鎖・重力
+    # ------------------------------------------------------------
+    def check_chains(self):
+        """連鎖チェック - 4つ以上つながったぷよを消去（全段を一度に処理）"""
+        self.begin_chains()
+        while self.pop_chain_step():
+            # 重力適用（ぷよを下に落とす）
+            self.apply_gravity()
+            self.on_chain_step(self.chain_count)
+        return self.finish_chains()
+
+    def begin_chains(self):
+        """連鎖処理を始める"""
+        self.chain_count = 0
+        self.chain_score = 0
+
+    def pop_chain_step(self):
+        """連鎖1段ぶんのぷよを消す。消えるものがなければFalse"""
+        # 前回の判定以降に変わったセルからだけグループを探す
+        groups = self.board.find_groups(self.dirty_cells)
+        self.dirty_cells = set()
+        if not groups:
+            return False
+
+        self.chain_count += 1
+
+        # スコア計算（連鎖数とぷよ数に応じて）
+        removed_count = sum(group.size for group in groups)
+        self.chain_score += chain_step_score(self.chain_count, removed_count)
+
+        # おじゃまぷよも消去（隣接するものを探す）
+        popped = [cell for group in groups for cell in group.cells]
+        ojama_to_remove = self.board.find_adjacent_ojama(popped)
+        self.remove_puyos(groups, ojama_to_remove, self.chain_count)
+        return True
+
+    def finish_chains(self):
+        """連鎖処理を終えてスコアとレベルに反映し、連鎖数を返す"""
+        chain_count = self.chain_count
+
+        # 総スコアを加算
+        self.score += self.chain_score
+
+        # 連鎖があった場合、レベルアップをチェック
+        if chain_count > 0:
+            self.lines_cleared += chain_count
+            self.update_level()
+            # 最大連鎖数を記録
+            self.max_chain_count = max(self.max_chain_count, chain_count)
+
+        self.chain_count = 0
+        self.chain_score = 0
+        return chain_count
+
+    def update_chain_resolution(self, dt):
+        """連鎖処理を時間dtだけ進める（消去→落下→次の段）"""
+        self.chain_timer -= dt
+        while self.chain_phase is not None and self.chain_timer <= 0:
+            if self.chain_phase == CHAIN_POP:
+                if self.pop_chain_step():
+                    self.chain_phase = CHAIN_SETTLE
+                    self.chain_timer += self.chain_delay
+                else:
+                    # 連鎖終了
+                    self.chain_phase = None
+                    self.finish_chains()
+                    if not self.game_over:
+                        self.spawn_next_puyo()
+            else:
+                self.apply_gravity()
+                self.on_chain_step(self.chain_count)
+                self.chain_phase = CHAIN_POP
+                self.chain_timer += self.chain_delay
+
+    def remove_puyos(self, groups, ojama_to_remove, chain_count):
+        """消去対象のグループとおじゃまぷよをボードから取り除く"""
+        # 消えるセルの色を盤面ハッシュから外す（おじゃまぷよのグループと
+        # 巻き込まれるおじゃまぷよが重なることがあるのでセルごとに1回だけ）
+        removed = {}
+        for group in groups:
+            for cell in group.cells:
+                removed[cell] = group.color
+        for cell in ojama_to_remove:
+            removed[cell] = PuyoColor.OJAMA
+        heights = self.heights
+        for (x, y), color in removed.items():
+            self.board_hash ^= ZOBRIST_KEYS[x][y][color.value]
+            heights[x] -= 1
+        if self.unsettled_columns is not None:
+            self.unsettled_columns.update(x for x, _ in removed)
+
+        for group in groups:
+            self.board.remove_cells(group.cells)
+        if ojama_to_remove:
+            self.board.remove_cells(ojama_to_remove)
+
+    def find_connected_puyos(self, start_x, start_y, color):
+        """指定した色のつながったぷよを探す"""
+        return self.board.find_connected(start_x, start_y, color)
+
+    def update_level(self):
+        """レベルアップをチェックして落下速度を調整"""
+        # LEVEL_CHAINS（10）連鎖ごとにレベルアップ
+        new_level = (self.lines_cleared // self.LEVEL_CHAINS) + 1
+
+        if new_level > self.level:
+            self.level = new_level
+            # レベルが上がるごとに落下速度を速くする
+            # レベル1: 500ms, レベル2: 420ms, レベル3: 340ms...
+            self.fall_speed = max(self.MIN_FALL_SPEED,
+                                  self.base_fall_speed - (self.level - 1) * self.FALL_SPEED_STEP)
+
+    def apply_gravity(self):
+        """重力を適用してぷよを下に落とす"""
+        # 前回の重力以降にぷよを置いた・消した列だけを詰める
+        columns = self.unsettled_columns
+        self.unsettled_columns = set()
+        toggles = []
+        self.mark_dirty(self.board.apply_gravity(toggles, columns))
+        board_hash = self.board_hash
+        for x, y, color in toggles:
+            board_hash ^= ZOBRIST_KEYS[x][y][color.value]
+        self.board_hash = board_hash
+        if columns is None:
+            # 外から読み込んだ盤面は落ち切ったところで高さを数え直す
+            self.heights = self.board.column_heights()
+
+    def check_game_over(self):
+        """ゲームオーバー判定（列の高さだけで判定するので盤面は走査しない）"""
+        # 新しいぷよが配置できるかチェック
+        start_x = BOARD_WIDTH // 2 - 1
+        start_y = 1  # y=1から開始
+
+        # 4つの回転状態すべてで配置可能かチェック
+        for rotation in range(4):
+            if self.is_valid_position(start_x, start_y, rotation):
+                return False  # どれか1つでも配置できればゲーム続行
+
+        # どの回転でも配置できない場合のみゲームオーバー
+        return True
+
+    # ------------------------------------------------------------
+    # おじゃまぷよ
+    # ------------------------------------------------------------
+    def update_ojama_timer(self, dt):
+        """おじゃまぷよタイマーの更新"""
+        self.ojama_timer += dt
+        if self.ojama_timer >= self.ojama_interval:
+            self.ojama_timer = 0
+            # レベルに応じておじゃまぷよの数を決定
+            self.ojama_count += self.level
+            self.drop_ojama_puyos()
+
+    def drop_ojama_puyos(self):
+        """おじゃまぷよを落とす"""
+        if self.ojama_count <= 0:
+            return
+
+        # 各列にランダムにおじゃまぷよを配置
+        columns = list(range(BOARD_WIDTH))
+        self.ojama_rng.shuffle(columns)
+        self.ojama_rng_state = None
+
+        for i in range(min(self.ojama_count, BOARD_WIDTH)):
+            col = columns[i]
+            # 列が埋まっていなければ一番上の段に置く（すぐ下の重力で積み上がる）
+            if self.heights[col] < BOARD_HEIGHT:
+                row = 0
+                self.set_cell(col, row, PuyoColor.OJAMA)
+                self.mark_dirty(((col, row),))
+                if self.unsettled_columns is not None:
+                    self.unsettled_columns.add(col)
+                self.ojama_received += 1
+                self.on_ojama_dropped(col, row)
+
+        # 残りのおじゃまぷよを次回に持ち越し
+        self.ojama_count -= min(self.ojama_count, BOARD_WIDTH)
+
+        # 重力適用
+        self.apply_gravity()
+
+    def reset_game(self, seed=None, pair_queue=None):
+        """ゲームリセット（seedかpair_queueを渡すと同じペアの順番で始められる）"""
+        self.board = self.board_class()
+        self.dirty_cells = set()
+        self.board_hash = 0
+        self.heights = [0] * BOARD_WIDTH
+        self.unsettled_columns = set()
+        self.init_random(seed, pair_queue)
+        self.current_puyo = self.create_new_puyo()
+        self.next_puyo = self.create_new_puyo()  # 次のぷよも生成
+        self.puyo_x = BOARD_WIDTH // 2 - 1
+        self.puyo_y = 0
+        self.puyo_rotation = 0
+        self.score = 0
+        self.game_over = False
+        self.fall_timer = 0
+        # レベルシステムもリセット
+        self.level = 1
+        self.lines_cleared = 0
+        self.fall_speed = self.base_fall_speed
+
+        # おじゃまぷよリセット
+        self.ojama_timer = 0
+        self.ojama_count = 0
+        self.max_chain_count = 0
+        self.pieces_placed = 0
+        self.ojama_received = 0
+
+        self.tick_count = 0
+        self.input_log = None
+
+        # 連鎖処理リセット
+        self.chain_phase = None
+        self.chain_timer = 0
+        self.chain_count = 0
+        self.chain_score = 0
+
+    # ------------------------------------------------------------
+    # スナップショット（探索・巻き戻し用）
+    # ------------------------------------------------------------
+    def snapshot(self) -> GameSnapshot:
+        """現在のゲーム状態を GameSnapshot として取り出す"""
+        dirty_cells = self.dirty_cells
+        unsettled_columns = self.unsettled_columns
+        return GameSnapshot(
+            self.board.snapshot(), self.board_hash, tuple(self.heights),
+            tuple(self.current_puyo), tuple(self.next_puyo),
+            None if dirty_cells is None else frozenset(dirty_cells),
+            None if unsettled_columns is None else frozenset(unsettled_columns),
+            _get_snapshot_fields(self), self.get_ojama_rng_state())
+
+    def restore(self, snapshot):
+        """snapshot() で取り出した状態に戻す（同じ board_class のエンジンで使う）"""
+        self.board = self.board_class.from_snapshot(snapshot.board)
+        self.board_hash = snapshot.board_hash
+        self.heights = list(snapshot.heights)
+        self.current_puyo = list(snapshot.current_puyo)
+        self.next_puyo = list(snapshot.next_puyo)
+        self.dirty_cells = None if snapshot.dirty_cells is None else set(snapshot.dirty_cells)
+        self.unsettled_columns = (None if snapshot.unsettled_columns is None
+                                  else set(snapshot.unsettled_columns))
+        for name, value in zip(SNAPSHOT_FIELDS, snapshot.values):
+            setattr(self, name, value)
+        if snapshot.ojama_rng_state is not self.ojama_rng_state:
+            self.ojama_rng.setstate(snapshot.ojama_rng_state)
+            self.ojama_rng_state = snapshot.ojama_rng_state
+
+    def get_ojama_rng_state(self):
+        """ojama_rng の状態（変わっていなければ前回取り出したものを返す）"""
+        if self.ojama_rng_state is None:
+            self.ojama_rng_state = self.ojama_rng.getstate()
+        return self.ojama_rng_state
+
+    def get_placements(self, with_boards=True) -> List['PairPlacement']:
+        """操作中のぷよを今の位置から動かして置ける場所をすべて返す"""
+        return generate_placements(self.board, self.current_puyo, self.heights,
+                                   origin=(self.puyo_x, self.puyo_y, self.puyo_rotation),
+                                   kick_offsets=self.KICK_OFFSETS, with_boards=with_boards)
+
+    def placement_target(self, column, rotation):
+        """操作中のペアを列 column・向き rotation で真下に落とした結果の placement_key
+
+        列が盤面の外ならNone。
+        """
+        column, rotation = int(column), int(rotation) % 4
+        sub_column = column + ROTATION_OFFSETS[rotation][0]
+        if not (0 <= column < BOARD_WIDTH and 0 <= sub_column < BOARD_WIDTH):
+            return None
+        floors = [BOARD_HEIGHT - 1 - height for height in self.heights]
+        _, main_pos, sub_pos = landing_cells(floors, column, rotation)
+        return placement_key(self.current_puyo, main_pos, sub_pos)
+
+    def find_placement(self, column, rotation) -> Optional['PairPlacement']:
+        """列 column・向き rotation に置いたのと同じ盤面になる、操作で届く置き方（なければNone）
+
+        出現位置では向き0の副ぷよが盤面の上にはみ出すので、先に回転してから動かすなどの
+        操作の列は get_placements で求める。
+        """
+        key = self.placement_target(column, rotation)
+        if key is None:
+            return None
+        pair = self.current_puyo
+        for placement in self.get_placements(with_boards=False):
+            if placement_key(pair, placement.main_pos, placement.sub_pos) == key:
+                return placement
+        return None
+
+    def simulate_chains(self, placement=None) -> 'ChainResult':
+        """操作中のぷよを placement に置いたら（省略時は今の盤面のまま）どう連鎖するか
+
+        ゲームの状態は変えない。placement は get_placements の置き方か (列, 向き)。
+        """
+        if self.chain_simulator is None:
+            self.chain_simulator = ChainSimulator()
+        return self.chain_simulator.simulate(self.board, placement, self.current_puyo,
+                                             board_hash=self.board_hash, heights=self.heights)
+
+# ------------------------------------------------------------
+# 置き場所の列挙（AI・探索用）
+# ------------------------------------------------------------
+# 置き場所を探すときに操作する段（これより下へは移動・回転せずにそのまま落とす）
+SEARCH_ROWS = 2
+
+@dataclass
+class PairPlacement:
+    """ぷよペアの置き方と、置いた結果"""
+    x: int  # 着地したときの主ぷよの列
+    y: int  # 着地したときの主ぷよの段（ちぎれる前）
+    rotation: int
+    actions: List[int]  # 今の位置からこの置き方にするための操作（最後の落下は含まない）
+    main_pos: Tuple[int, int]  # ちぎれて落ちたあとの主ぷよの位置
+    sub_pos: Tuple[int, int]  # ちぎれて落ちたあとの副ぷよの位置
+    board: object = None  # 置いたあとの盤面（連鎖の処理前）
+
+def landing_cells(floors, x, rotation):
+    """列x・向きrotationのペアを真下に落としたときの (着地段, 主ぷよの位置, 副ぷよの位置)
+
+    floors は各列で空いている一番下の段。横向きのペアはちぎれて
+    それぞれの列の底まで落ちる。位置の段が負なら盤面の上にはみ出している。
+    """
+    offset_x, offset_y = ROTATION_OFFSETS[rotation]
+    if offset_x == 0:
+        landing_y = floors[x] - max(offset_y, 0)
+        return landing_y, (x, landing_y), (x, landing_y + offset_y)
+    sub_x = x + offset_x
+    return min(floors[x], floors[sub_x]), (x, floors[x]), (sub_x, floors[sub_x])
+
+def placement_key(pair, main_pos, sub_pos):
+    """ペアを main_pos・sub_pos に置いた結果を区別するキー（同じ盤面なら同じキー）"""
+    if pair[0] == pair[1]:
+        # 同色ペアは主ぷよと副ぷよを入れ替えても同じ盤面
+        return frozenset((main_pos, sub_pos))
+    return main_pos, sub_pos
+
+def generate_placements(board, pair, heights=None, origin=None,
+                        kick_offsets=PuyoEngine.KICK_OFFSETS,
+                        with_boards=True) -> List[PairPlacement]:
+    """ペアpairを盤面boardに置く方法のうち、結果が異なるものをすべて返す
+
+    origin (x, y, 向き) から左右移動・回転（PuyoEngine.rotate_puyo と同じ壁キック）・
+    上から SEARCH_ROWS 段までの下移動で届く位置を幅優先で探し、真下に落とした
+    結果を返す。位置の判定と着地段は列の高さ heights（省略時は盤面から1回だけ
+    求める）から計算するので、1段ずつ落として確かめることはしない。
+    2色が同じペアの上下・左右反転のように同じ盤面になる置き方は、
+    操作の少ないほうだけを残す。盤面の上にはみ出す置き方は含めない。
+    盤面は重力で落ち切った状態（宙に浮いたぷよがない）であること。
+    """
+    if heights is None:
+        heights = board.column_heights()
+    if origin is None:
+        origin = (BOARD_WIDTH // 2 - 1, 0, 0)
+    # 各列で空いている一番下の段（この段より上は空き）
+    floors = [BOARD_HEIGHT - 1 - height for height in heights]
+
+    def is_valid(x, y, rotation):
+        # PuyoEngine.is_valid_position と同じ判定を列の高さで行う
+        if not (0 <= x < BOARD_WIDTH and 0 <= y <= floors[x]):
+            return False
+        offset_x, offset_y = ROTATION_OFFSETS[rotation]
+        sub_x, sub_y = x + offset_x, y + offset_y
+        return 0 <= sub_x < BOARD_WIDTH and 0 <= sub_y <= floors[sub_x]
+
+    placements = []
+    landed = set()  # 着地した (列, 段, 向き)
+    results = set()  # 置いたあとの盤面のキー（placement_key）
+    queue = deque([(origin, [])])
+    seen = {origin}
+    while queue:
+        (x, y, rotation), actions = queue.popleft()
+
+        # 真下に落としたときの着地位置と、ちぎれたあとの位置
+        landing_y, main_pos, sub_pos = landing_cells(floors, x, rotation)
+        key = (x, landing_y, rotation)
+        if key not in landed and main_pos[1] >= 0 and sub_pos[1] >= 0:
+            landed.add(key)
+            result = placement_key(pair, main_pos, sub_pos)
+            if result not in results:
+                results.add(result)
+                placed = None
+                if with_boards:
+                    placed = board.copy()
+                    placed[main_pos[1]][main_pos[0]] = pair[0]
+                    placed[sub_pos[1]][sub_pos[0]] = pair[1]
+                placements.append(PairPlacement(x, landing_y, rotation, actions,
+                                                main_pos, sub_pos, placed))
+
+        moves = []
+        if is_valid(x - 1, y, rotation):
+            moves.append((ACTION_LEFT, (x - 1, y, rotation)))
+        if is_valid(x + 1, y, rotation):
+            moves.append((ACTION_RIGHT, (x + 1, y, rotation)))
+        if y + 1 < SEARCH_ROWS and is_valid(x, y + 1, rotation):
+            moves.append((ACTION_DOWN, (x, y + 1, rotation)))
+        # 回転（回せなければ左右にずらして試す）
+        new_rotation = (rotation + 1) % 4
+        for offset in (0,) + tuple(kick_offsets):
+            if is_valid(x + offset, y, new_rotation):
+                moves.append((ACTION_ROTATE, (x + offset, y, new_rotation)))
+                break
+
+        for action, state in moves:
+            if state not in seen:
+                seen.add(state)
+                queue.append((state, actions + [action]))
+
+    return placements
+
+# ------------------------------------------------------------
+# 連鎖の予測（ヒント・AI・分析用）
+# ------------------------------------------------------------
+@dataclass
+class ChainStep:
+    """連鎖1段ぶんの結果"""
+    chain_count: int  # 何連鎖目か
+    groups: List[PuyoGroup]  # 消えたグループ
+    ojama_cells: List[Tuple[int, int]]  # 巻き込まれて消えたおじゃまぷよ
+    score: int  # この段の得点
+
+@dataclass
+class ChainResult:
+    """盤面が落ち着くまで連鎖させた結果（ChainSimulator が返すものは共有されるので書き換えないこと）"""
+    steps: List[ChainStep]
+    score: int
+    board: object  # 連鎖が終わったあとの盤面
+    board_hash: int  # board の Zobristハッシュ
+
+    @property
+    def chain_count(self) -> int:
+        return len(self.steps)
+
+class ChainSimulator:
+    """盤面（と置き方）から連鎖の結果を求め、盤面のハッシュをキーに覚えておく
+
+    同じ盤面について何度聞かれても、2回目からは表を引くだけで答える。
+    キーはペアを置いて落としたあとの盤面の Zobristハッシュ。
+    """
+    def __init__(self, capacity=10000):
+        self.table = TranspositionTable(capacity)
+
+    def simulate(self, board, placement=None, pair=None, board_hash=None,
+                 heights=None) -> ChainResult:
+        """board にペア pair を placement に置いたときの連鎖の結果（board は変更しない）
+
+        placement は PairPlacement（generate_placements の置き方）か (列, 向き)。
+        board_hash・heights を渡すとそれを使い、盤面から求め直さない。
+        """
+        if board_hash is None:
+            board_hash = zobrist_hash(board)
+        placed = None
+        if placement is not None:
+            placed = self.place(board, placement, pair, heights)
+            for (x, y), color in placed:
+                board_hash ^= ZOBRIST_KEYS[x][y][color.value]
+
+        result = self.table.get(board_hash)
+        if result is None:
+            result = self.resolve(board, placed)
+            self.table.put(board_hash, result)
+        return result
+
+    @staticmethod
+    def place(board, placement, pair, heights=None):
+        """置き方から、ペアの2個が落ち着く ((x, y), 色) を求める"""
+        if isinstance(placement, PairPlacement):
+            main_pos, sub_pos = placement.main_pos, placement.sub_pos
+        else:
+            x, rotation = placement
+            sub_x = x + ROTATION_OFFSETS[rotation % 4][0]
+            if not (0 <= x < BOARD_WIDTH and 0 <= sub_x < BOARD_WIDTH):
+                raise ValueError(f"盤面の外には置けません: {placement}")
+            if heights is None:
+                heights = board.column_heights()
+            floors = [BOARD_HEIGHT - 1 - height for height in heights]
+            _, main_pos, sub_pos = landing_cells(floors, x, rotation % 4)
+        if main_pos[1] < 0 or sub_pos[1] < 0:
+            raise ValueError(f"盤面の上にはみ出します: {placement}")
+        return ((main_pos, pair[0]), (sub_pos, pair[1]))
+
+    @staticmethod
+    def resolve(board, placed=None) -> ChainResult:
+        """盤面の複製の上で連鎖を最後まで進める（PuyoEngine.check_chains と同じ規則）"""
+        board = board.copy()
+        if placed:
+            for (x, y), color in placed:
+                board[y][x] = color
+        board.apply_gravity()
+
+        steps = []
+        total = 0
+        seeds = None  # 最初は全体を調べ、あとは落ちて動いたセルから探す
+        while True:
+            groups = board.find_groups(seeds)
+            if not groups:
+                break
+            chain_count = len(steps) + 1
+            removed_count = sum(group.size for group in groups)
+            score = chain_step_score(chain_count, removed_count)
+            total += score
+
+            popped = [cell for group in groups for cell in group.cells]
+            ojama_cells = sorted(board.find_adjacent_ojama(popped))
+            for group in groups:
+                board.remove_cells(group.cells)
+            if ojama_cells:
+                board.remove_cells(ojama_cells)
+            seeds = board.apply_gravity()
+            steps.append(ChainStep(chain_count, groups, ojama_cells, score))
+
+        return ChainResult(steps, total, board, zobrist_hash(board))
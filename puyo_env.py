@@ -0,0 +1,292 @@
+"""
+強化学習用の環境（Gym形式の reset() / step(action)）
+
+PuyoEngine を画面なしで動かし、1手ごとに「操作中のペアをどの列・向きに置くか」を
+行動として受け取る。行動 (列, 向き) は PuyoEngine.get_placements で実際の操作
+（左右移動・回転・壁キック）で届く置き方に変換し、そのまま真下に落とす。
+届かない行動を選んだときは何も操作せずに落とす。
+
+観測は次の numpy 配列の辞書:
+    board  (12, 6) uint8   盤面（PuyoColor.value）
+    pairs  (2, 2)  uint8   操作中のペアと次のペア
+    ojama  (2,)    int32   落ちてくる予定のおじゃまぷよの数と、次に落ちるまでのミリ秒
+報酬はその手で増えた得点。
+
+PuyoVectorEnv は複数の環境を子プロセスに分けて同時に進める。観測・報酬は
+共有メモリの配列に直接書き込むので、プロセス間で pickle するのは命令だけになる。
+
+使い方（numpy が必要）:
+    env = PuyoEnv(seed=0)
+    obs, info = env.reset()
+    obs, reward, terminated, truncated, info = env.step((2, 1))
+
+    with PuyoVectorEnv(64, seed=0) as envs:
+        obs, infos = envs.reset()
+        obs, rewards, terminated, truncated, infos = envs.step(actions)  # actions: (64, 2)
+"""
+
+import os
+from multiprocessing import Pipe, Process, RawArray
+
+import numpy as np
+
+from puyo_engine import PuyoEngine, ACTION_DOWN, BOARD_WIDTH, BOARD_HEIGHT, placement_key
+
+# 1手ごとに進めるおじゃまぷよタイマーの時間（ミリ秒）
+MOVE_TIME = 1000
+
+# 観測・結果の配列（名前: (型, 1環境ぶんの形)）。PuyoVectorEnv の共有メモリもこの形で作る
+OBSERVATION_SPACE = {
+    'board': (np.uint8, (BOARD_HEIGHT, BOARD_WIDTH)),
+    'pairs': (np.uint8, (2, 2)),
+    'ojama': (np.int32, (2,)),
+}
+_RESULT_SPACE = {
+    'action': (np.int32, (2,)),
+    'reward': (np.int64, ()),
+    'terminated': (np.bool_, ()),
+    'truncated': (np.bool_, ()),
+    'score': (np.int64, ()),
+    'chain_count': (np.int32, ()),
+    'valid': (np.bool_, ()),
+}
+# numpy の型に対応する RawArray の型コード
+_TYPECODES = {np.uint8: 'B', np.int32: 'i', np.int64: 'q', np.bool_: 'B'}
+
+class PuyoEnv:
+    """1ゲームを reset() / step(action) で進める環境"""
+    def __init__(self, seed=None, board_class=None, move_time=MOVE_TIME, max_moves=None):
+        self.engine = PuyoEngine(board_class, seed=seed)
+        self.engine.chain_delay = 0  # 連鎖は着地時にすべて処理する
+        self.seed = seed  # k 回目の reset() はシード seed + k で始める（Noneなら毎回違う列）
+        self.episode = 0  # reset() した回数
+        self.move_time = move_time
+        self.max_moves = max_moves  # 1ゲームの最大手数（超えたら truncated）
+        self.moves = 0
+        # 操作中のペアで届く置き方（盤面のキー → 置き方）と、それを求めたときの状態
+        self.placements = {}
+        self.placements_state = None
+
+    def reset(self, seed=None):
+        """新しいゲームを始めて (観測, 情報) を返す（seed を省くとコンストラクタのシードから決める）"""
+        if seed is None and self.seed is not None:
+            seed = self.seed + self.episode
+        self.episode += 1
+        self.engine.reset_game(seed)
+        self.moves = 0
+        return self.observe(), {'score': 0, 'chain_count': 0, 'valid': True}
+
+    def step(self, action):
+        """行動 (列, 向き) でペアを置き、(観測, 報酬, 終了, 打ち切り, 情報) を返す"""
+        engine = self.engine
+        score = engine.score
+        lines_cleared = engine.lines_cleared
+
+        placement = self.find_placement(*action)
+        if placement is not None:
+            for move in placement.actions:
+                engine.apply_action(move)
+        # 着地するまで落とす（連鎖は着地と同時に処理される）
+        pair_index = engine.pair_index
+        while engine.pair_index == pair_index and not engine.game_over:
+            engine.apply_action(ACTION_DOWN)
+
+        # おじゃまぷよのタイマーだけを1手ぶん進める
+        if engine.OJAMA_ENABLED and not engine.game_over:
+            engine.update_ojama_timer(self.move_time)
+
+        self.moves += 1
+        truncated = self.max_moves is not None and self.moves >= self.max_moves
+        info = {
+            'score': engine.score,
+            'chain_count': engine.lines_cleared - lines_cleared,
+            'valid': placement is not None,
+        }
+        return self.observe(), engine.score - score, engine.game_over, truncated, info
+
+    def find_placement(self, column, rotation):
+        """行動 (列, 向き) と同じ盤面になる、操作で届く置き方（なければNone）"""
+        engine = self.engine
+        key = engine.placement_target(column, rotation)
+        if key is None:
+            return None
+
+        # 同色ペアの上下反転のように同じ盤面になる置き方は1つにまとめられているので
+        # 置いたあとの盤面で探す
+        state = (engine.pair_index, engine.board_hash,
+                 engine.puyo_x, engine.puyo_y, engine.puyo_rotation)
+        if state != self.placements_state:
+            pair = engine.current_puyo
+            self.placements = {placement_key(pair, placement.main_pos, placement.sub_pos): placement
+                               for placement in engine.get_placements(with_boards=False)}
+            self.placements_state = state
+        return self.placements.get(key)
+
+    def action_mask(self):
+        """操作で届く行動を True にした (列, 向き) = (6, 4) の配列"""
+        mask = np.zeros((BOARD_WIDTH, 4), dtype=bool)
+        for column in range(BOARD_WIDTH):
+            for rotation in range(4):
+                mask[column, rotation] = self.find_placement(column, rotation) is not None
+        return mask
+
+    def observe(self):
+        """現在の観測"""
+        observation = {name: np.zeros(shape, dtype) for name, (dtype, shape)
+                       in OBSERVATION_SPACE.items()}
+        self.write_observation(observation)
+        return observation
+
+    def write_observation(self, observation):
+        """観測を observation の各配列に書き込む（共有メモリへの書き込み用）"""
+        engine = self.engine
+        observation['board'][...] = [[color.value for color in row] for row in engine.board]
+        pairs = observation['pairs']
+        pairs[0] = [color.value for color in engine.current_puyo]
+        pairs[1] = [color.value for color in engine.next_puyo]
+        ojama = observation['ojama']
+        ojama[0] = engine.ojama_count
+        ojama[1] = engine.ojama_interval - engine.ojama_timer
+
+# ------------------------------------------------------------
+# 複数プロセスで進める環境
+# ------------------------------------------------------------
+def _allocate(spaces, count):
+    """各配列を count 環境ぶんの共有メモリとして確保する"""
+    return {name: RawArray(_TYPECODES[dtype], count * int(np.prod(shape, dtype=int)))
+            for name, (dtype, shape) in spaces.items()}
+
+def _views(spaces, raw_arrays, count):
+    """共有メモリを numpy 配列として見る（コピーしない）"""
+    return {name: np.frombuffer(raw_arrays[name], dtype=dtype).reshape((count,) + shape)
+            for name, (dtype, shape) in spaces.items()}
+
+def _write_result(results, index, reward, terminated, truncated, info):
+    """1環境ぶんの step の結果を共有メモリに書き込む"""
+    results['reward'][index] = reward
+    results['terminated'][index] = terminated
+    results['truncated'][index] = truncated
+    results['score'][index] = info['score']
+    results['chain_count'][index] = info['chain_count']
+    results['valid'][index] = info['valid']
+
+def _vector_worker(conn, start, stop, seed, count, env_kwargs, raw_observations, raw_results):
+    """子プロセス: 担当する環境 [start, stop) を命令どおりに進める"""
+    observations = _views(OBSERVATION_SPACE, raw_observations, count)
+    results = _views(_RESULT_SPACE, raw_results, count)
+    envs = {index: PuyoEnv(**env_kwargs) for index in range(start, stop)}
+    episodes = {index: 0 for index in envs}
+
+    def reset(index):
+        # 環境 index の k 回目のゲームはシード seed + index + k * count で始める
+        env_seed = None if seed is None else seed + index + episodes[index] * count
+        episodes[index] += 1
+        envs[index].reset(env_seed)
+        envs[index].write_observation({name: array[index]
+                                       for name, array in observations.items()})
+
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                for index, env in envs.items():
+                    observation, reward, terminated, truncated, info = env.step(
+                        tuple(results['action'][index]))
+                    _write_result(results, index, reward, terminated, truncated, info)
+                    if terminated or truncated:
+                        # 終わったゲームはすぐ次を始める（観測は新しいゲームのもの）
+                        reset(index)
+                    else:
+                        for name, array in observations.items():
+                            array[index] = observation[name]
+            elif command == 'reset':
+                for index in envs:
+                    reset(index)
+                    _write_result(results, index, 0, False, False,
+                                  {'score': 0, 'chain_count': 0, 'valid': True})
+            elif command == 'close':
+                break
+            conn.send(None)
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        conn.close()
+
+class PuyoVectorEnv:
+    """num_envs 個の PuyoEnv を子プロセスに分けて同時に進める環境
+
+    返す観測・報酬は共有メモリの配列そのもので、次の reset() / step() で
+    上書きされる（残しておくときはコピーする）。終わったゲームは step() の中で
+    すぐ次のゲームになり、そのとき返る観測は新しいゲームのもの。
+    """
+    def __init__(self, num_envs, seed=0, workers=None, **env_kwargs):
+        self.num_envs = num_envs
+        self.connections = []
+        self.processes = []
+        self.closed = False
+        workers = max(1, min(workers or os.cpu_count() or 1, num_envs))
+
+        raw_observations = _allocate(OBSERVATION_SPACE, num_envs)
+        raw_results = _allocate(_RESULT_SPACE, num_envs)
+        self.observations = _views(OBSERVATION_SPACE, raw_observations, num_envs)
+        self.results = _views(_RESULT_SPACE, raw_results, num_envs)
+
+        for worker in range(workers):
+            start = num_envs * worker // workers
+            stop = num_envs * (worker + 1) // workers
+            parent, child = Pipe()
+            process = Process(target=_vector_worker,
+                              args=(child, start, stop, seed, num_envs, env_kwargs,
+                                    raw_observations, raw_results),
+                              daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def _broadcast(self, command):
+        """全ワーカーに命令を送り、終わるまで待つ"""
+        for conn in self.connections:
+            conn.send(command)
+        for conn in self.connections:
+            conn.recv()
+
+    def _infos(self):
+        return {name: self.results[name] for name in ('score', 'chain_count', 'valid')}
+
+    def reset(self):
+        """すべての環境で新しいゲームを始めて (観測, 情報) を返す"""
+        self._broadcast('reset')
+        return self.observations, self._infos()
+
+    def step(self, actions):
+        """環境ごとの行動 (num_envs, 2) で1手進め、(観測, 報酬, 終了, 打ち切り, 情報) を返す"""
+        self.results['action'][:] = actions
+        self._broadcast('step')
+        results = self.results
+        return (self.observations, results['reward'], results['terminated'],
+                results['truncated'], self._infos())
+
+    def close(self):
+        """子プロセスを終了する"""
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self.connections:
+            try:
+                conn.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
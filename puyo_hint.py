@@ -0,0 +1,117 @@
+"""
+ゲーム中のヒント（おすすめの置き場所）をバックグラウンドで求める
+
+HintWorker は専用のスレッドで BeamSearchAI を動かす。メインループからは毎フレーム
+update(engine) を呼ぶだけでよく、新しいペアが出る（または盤面が変わる）と
+前の探索を打ち切って次の探索を頼む。update() と get() は状態の
+スナップショットを渡して結果を読むだけなので、探索が終わるのを待つことはない。
+
+探索中のスレッドは候補を1つ調べるごとに GIL を手放すので、
+描画のフレームは探索が動いていても遅れない。
+"""
+
+import threading
+import time
+
+from puyo_engine import PuyoEngine, PairQueue
+from puyo_ai import BeamSearchAI
+
+# ヒント1回あたりの思考時間（ミリ秒）。バックグラウンドなのでゲームのAIより長く読める
+HINT_TIME_BUDGET = 200
+
+class HintWorker:
+    """操作中のペアのおすすめの置き場所を別スレッドで探す"""
+    def __init__(self, ai=None):
+        self.ai = ai or BeamSearchAI(depth=3, beam_width=12, time_budget=HINT_TIME_BUDGET)
+
+        self.condition = threading.Condition()
+        self.cancel_event = threading.Event()  # 実行中の探索を打ち切る合図
+        self.pending = None  # 次に探す (キー, スナップショット, 設定)
+        self.result = None  # 直前の探索の (キー, 置き方)
+        self.requested_key = None  # 最後に頼んだ探索のキー
+        self.running = True
+
+        # 探索用のエンジン（ペアの列はゲーム側から渡された先のペアで作り、ゲーム側と共有しない）
+        self.scratch = None
+
+        self.thread = threading.Thread(target=self.worker_loop, name="puyo-hint", daemon=True)
+        self.thread.start()
+
+    def upcoming_pairs(self, engine):
+        """AIが読む next_puyo より先のペア（なぞぷよでは決まったペアがそのまま入る）"""
+        return tuple(tuple(pair) for pair in engine.get_upcoming_pairs(max(0, self.ai.depth - 2)))
+
+    def state_key(self, engine):
+        """探索をやり直すべきかを見分けるキー（ゲーム・ペア・盤面・先のペア）"""
+        return engine.seed, engine.pair_index, engine.board_hash, self.upcoming_pairs(engine)
+
+    def update(self, engine):
+        """毎フレーム呼ぶ。新しいペアが出ていれば前の探索を打ち切って探し直す"""
+        if engine.game_over or engine.is_resolving_chains():
+            return
+        key = self.state_key(engine)
+        if key == self.requested_key:
+            return
+        self.requested_key = key
+        settings = (engine.board_class, key[3], tuple(engine.KICK_OFFSETS))
+        with self.condition:
+            self.pending = (key, engine.snapshot(), settings)
+            self.cancel_event.set()
+            self.condition.notify()
+
+    def get(self, engine):
+        """今のペアのヒント（puyo_ai.Placement）。まだ探し終えていなければNone"""
+        result = self.result
+        if result is None or result[0] != self.state_key(engine):
+            return None
+        return result[1]
+
+    def stop(self):
+        """探索を打ち切ってスレッドを終了する"""
+        with self.condition:
+            self.running = False
+            self.cancel_event.set()
+            self.condition.notify()
+        self.thread.join(timeout=1)
+
+    # ------------------------------------------------------------
+    # ここから下は探索スレッドで動く
+    # ------------------------------------------------------------
+    def should_stop(self):
+        """BeamSearchAI から候補ごとに呼ばれる（GILを手放してメインループを先に動かす）"""
+        time.sleep(0)
+        return self.cancel_event.is_set()
+
+    def worker_loop(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                key, snapshot, settings = self.pending
+                self.pending = None
+                self.cancel_event.clear()
+
+            try:
+                placement = self.search(snapshot, settings)
+            except Exception as e:
+                print(f"ヒントの計算に失敗しました: {e}")
+                continue
+            if not self.cancel_event.is_set():
+                self.result = (key, placement)
+
+    def search(self, snapshot, settings):
+        """スナップショットの状態から最善の置き方を探す"""
+        board_class, upcoming_pairs, kick_offsets = settings
+        if self.scratch is None or self.scratch.board_class is not board_class:
+            self.scratch = PuyoEngine(board_class, seed=0)
+        scratch = self.scratch
+        scratch.restore(snapshot)
+        # シードから作り直すとなぞぷよの決まったペアと違う列になるので、渡されたペアを読ませる
+        queue = PairQueue(0)
+        queue.pairs = list(upcoming_pairs)
+        scratch.pair_queue = queue
+        scratch.pair_index = 0
+        scratch.KICK_OFFSETS = kick_offsets
+        return self.ai.choose(scratch, stop=self.should_stop)
@@ -0,0 +1,435 @@
+"""
+なぞぷよ（決まった盤面と決まったペアの列で目標を達成するパズル）
+
+Puzzle は盤面・ペアの列・目標（全消し、またはN連鎖）をまとめたもの。
+Puzzle.create_engine() で画面なしの PuyoEngine を、main.py にパズルファイルを
+渡すとゲーム画面でのなぞぷよモードを始められる（おじゃまぷよは降らない）。
+
+PuzzleSolver はペアの置き方（generate_placements で列挙する、壁キック込みで
+実際に操作して届くもの）をすべて試して解を探す。次の2つで枝を刈る:
+    - 置換表: 同じ盤面・同じ手数からの探索は一度だけ行う
+    - 上界: 残りのぷよをすべて使っても目標に届かない盤面は読まない
+      （N連鎖には各色4個ずつのグループがN個以上必要、全消しでは
+      1〜3個しか残らない色があってはいけない）
+
+パズルは JSON Lines で1行1問:
+    {"name": "例題", "board": ["......", ..., "RRB..."], "pairs": ["RB", "BB"],
+     "goal": "chain", "chain": 2}
+board は上の段から順に書き、12段より少なければ上を空きで埋める。
+
+使い方:
+    python puyo_puzzle.py solve puzzles.jsonl --unique
+    python puyo_puzzle.py generate --count 1000 --chain 3 --output puzzles.jsonl
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import List, Optional
+
+from puyo_engine import (PuyoEngine, PuyoColor, PairQueue, PUYO_COLORS, BOARD_CHARS,
+                         BOARD_WIDTH, BOARD_HEIGHT, generate_placements, zobrist_hash)
+from puyo_bitboard import BitBoard, FULL_MASK, popcount
+from puyo_ai import simulate_placement
+
+# 目標の種類
+GOAL_ALL_CLEAR = 'all_clear'  # ぷよを全部消す
+GOAL_CHAIN = 'chain'  # chain 連鎖以上する
+GOALS = (GOAL_ALL_CLEAR, GOAL_CHAIN)
+
+# BOARD_CHARS の逆引き（'R' → PuyoColor.RED）
+CHAR_COLORS = {char: color for color, char in BOARD_CHARS.items()}
+
+@dataclass
+class Puzzle:
+    """なぞぷよ1問"""
+    board: List[str]  # 上の段から順に、1段を BOARD_CHARS の6文字で書いたもの
+    pairs: List[str]  # 操作するペアの列（"RB" なら主ぷよが赤、副ぷよが青）
+    goal: str = GOAL_CHAIN
+    chain: int = 0  # goal が chain のときの目標連鎖数
+    name: str = ""
+
+    def __post_init__(self):
+        if self.goal not in GOALS:
+            raise ValueError(f"目標の種類が正しくありません: {self.goal}")
+        if self.goal == GOAL_CHAIN and self.chain < 1:
+            raise ValueError(f"目標の連鎖数が正しくありません: {self.chain}")
+        if len(self.board) > BOARD_HEIGHT:
+            raise ValueError(f"盤面が{BOARD_HEIGHT}段を超えています")
+        # 足りない段は上を空きで埋める
+        self.board = ['.' * BOARD_WIDTH] * (BOARD_HEIGHT - len(self.board)) + list(self.board)
+        for row in self.board:
+            if len(row) != BOARD_WIDTH or any(char not in CHAR_COLORS for char in row):
+                raise ValueError(f"盤面の段が正しくありません: {row!r}")
+        if not self.pairs:
+            raise ValueError("ペアがありません")
+        for pair in self.pairs:
+            if (len(pair) != 2 or
+                    any(CHAR_COLORS.get(char) not in PUYO_COLORS for char in pair)):
+                raise ValueError(f"ペアが正しくありません: {pair!r}")
+
+    def to_dict(self) -> dict:
+        data = {'name': self.name, 'board': self.board, 'pairs': self.pairs, 'goal': self.goal}
+        if self.goal == GOAL_CHAIN:
+            data['chain'] = self.chain
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Puzzle':
+        return cls(list(data['board']), list(data['pairs']), data.get('goal', GOAL_CHAIN),
+                   data.get('chain', 0), data.get('name', ""))
+
+    @property
+    def description(self) -> str:
+        """目標の説明（画面表示用）"""
+        if self.goal == GOAL_ALL_CLEAR:
+            return "ぷよを全部消せ"
+        return f"{self.chain}連鎖せよ"
+
+    def board_rows(self) -> List[List[PuyoColor]]:
+        """盤面を board[y][x] 形式の二次元リストにする"""
+        return [[CHAR_COLORS[char] for char in row] for row in self.board]
+
+    def pair_colors(self) -> List[tuple]:
+        """ペアの列を (主ぷよの色, 副ぷよの色) のリストにする"""
+        return [(CHAR_COLORS[pair[0]], CHAR_COLORS[pair[1]]) for pair in self.pairs]
+
+    def pair_queue(self, seed=0) -> PairQueue:
+        """このパズルのペアを順に配るペアの列（最後のペアの先はシードから作る）"""
+        queue = PairQueue(seed)
+        queue.pairs = self.pair_colors()
+        return queue
+
+    def setup(self, engine):
+        """pair_queue() でリセットしたエンジンに盤面を読み込み、おじゃまぷよを止める"""
+        engine.load_board(self.board_rows())
+        engine.apply_gravity()
+        engine.OJAMA_ENABLED = False
+
+    def create_engine(self, board_class=None) -> PuyoEngine:
+        """このパズルを始めた状態の PuyoEngine"""
+        engine = PuyoEngine(board_class, pair_queue=self.pair_queue())
+        self.setup(engine)
+        return engine
+
+    def result(self, engine) -> Optional[bool]:
+        """エンジンの状態から、クリアならTrue・失敗ならFalse・途中ならNone"""
+        if engine.is_resolving_chains():
+            return None
+        if self.goal == GOAL_CHAIN:
+            if engine.max_chain_count >= self.chain:
+                return True
+        elif engine.pieces_placed and not any(engine.heights):
+            return True
+        if engine.game_over or engine.pieces_placed >= len(self.pairs):
+            return False
+        return None
+
+def load_puzzles(path) -> List[Puzzle]:
+    """JSON Lines のパズルファイルを読み込む"""
+    puzzles = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                puzzles.append(Puzzle.from_dict(json.loads(line)))
+    return puzzles
+
+# ------------------------------------------------------------
+# ソルバー
+# ------------------------------------------------------------
+@dataclass
+class PuzzleSolution:
+    """パズルの解（各ペアの置き方）"""
+    moves: List[tuple] = field(default_factory=list)  # (列, 向き) の列
+    actions: List[List[int]] = field(default_factory=list)  # 各ペアを出現位置から動かす操作
+
+class PuzzleSolver:
+    """置き方をすべて試してパズルの解を探す"""
+    def __init__(self, kick_offsets=PuyoEngine.KICK_OFFSETS, max_nodes=None):
+        self.kick_offsets = kick_offsets
+        self.max_nodes = max_nodes  # 調べる盤面の上限（Noneなら最後まで）
+
+        # 直前の探索の統計
+        self.nodes_searched = 0
+        self.pruned = 0
+        self.complete = True  # max_nodes で打ち切らずに最後まで調べたか
+
+    def solve(self, puzzle) -> Optional[PuzzleSolution]:
+        """解を1つ返す（見つからなければNone、complete がTrueなら解なし）"""
+        solutions = []
+        self.search(puzzle, 1, solutions)
+        return solutions[0] if solutions else None
+
+    def count_solutions(self, puzzle, limit=2) -> int:
+        """解の数（limit 個見つかったらそこで止める。limit=2 で解が1つだけかを確かめる）"""
+        return self.search(puzzle, limit)
+
+    def search(self, puzzle, limit, solutions=None) -> int:
+        """解を limit 個まで数える（solutions を渡すと見つけた手順を追加する）"""
+        self.puzzle = puzzle
+        self.pairs = puzzle.pair_colors()
+        # remaining[i][色] = i手目以降のペアに含まれるその色の数
+        self.remaining = [[0] * len(PuyoColor) for _ in range(len(self.pairs) + 1)]
+        for depth in range(len(self.pairs) - 1, -1, -1):
+            counts = list(self.remaining[depth + 1])
+            for color in self.pairs[depth]:
+                counts[color.value] += 1
+            self.remaining[depth] = counts
+        # 解の数がわかっている (盤面, 手数)（limit に届かなかったものだけ覚える）
+        self.table = {}
+        self.solutions = solutions
+        self.path = []
+        self.nodes_searched = 0
+        self.pruned = 0
+        self.complete = True
+
+        board = BitBoard.from_rows(puzzle.board_rows())
+        board.settle()
+        return self.search_node(board, zobrist_hash(board), FULL_MASK, 0, limit)
+
+    def search_node(self, board, board_hash, pending, depth, limit) -> int:
+        """盤面 board から depth 手目以降で達成できる解の数（limit 個まで）"""
+        if depth >= len(self.pairs):
+            return 0
+        key = (board_hash, depth)
+        known = self.table.get(key)
+        if known is not None:
+            return known
+        if not self.reachable(board, depth):
+            self.pruned += 1
+            self.table[key] = 0
+            return 0
+
+        pair = self.pairs[depth]
+        found = 0
+        for placed in generate_placements(board, pair, kick_offsets=self.kick_offsets):
+            if self.max_nodes is not None and self.nodes_searched >= self.max_nodes:
+                self.complete = False
+                return found
+            self.nodes_searched += 1
+            placement = simulate_placement(placed, board_hash, pair, pending)
+            self.path.append(placement)
+            if self.is_goal(placement):
+                count = 1
+                self.record_solution()
+            elif self.is_game_over(placement.board):
+                count = 0
+            else:
+                count = self.search_node(placement.board, placement.board_hash, 0,
+                                         depth + 1, limit - found)
+            self.path.pop()
+            found += count
+            if found >= limit:
+                return found
+
+        if self.complete:
+            self.table[key] = found
+        return found
+
+    def is_goal(self, placement) -> bool:
+        if self.puzzle.goal == GOAL_CHAIN:
+            return placement.chain_count >= self.puzzle.chain
+        return placement.chain_count > 0 and not any(placement.board.masks[1:])
+
+    @staticmethod
+    def is_game_over(board) -> bool:
+        """次のぷよを出せない盤面か（PuyoEngine.check_game_over と同じ）"""
+        spawn_x = BOARD_WIDTH // 2 - 1
+        return board.column_heights()[spawn_x] >= BOARD_HEIGHT - 1
+
+    def reachable(self, board, depth) -> bool:
+        """残りのペアで目標に届く可能性があるか（上界による枝刈り）"""
+        remaining = self.remaining[depth]
+        counts = [popcount(mask) + remaining[index] for index, mask in enumerate(board.masks)]
+        ojama = counts[PuyoColor.OJAMA.value]
+        colors = [counts[color.value] for color in PUYO_COLORS]
+        if self.puzzle.goal == GOAL_CHAIN:
+            # 連鎖1段ごとに4個以上の同色（おじゃまぷよ同士を含む）のグループが1つ以上消える
+            return sum(count // 4 for count in colors) + ojama // 4 >= self.puzzle.chain
+        # 全消しは残りのペアを使い切る前にも起こるので、k 手目までのペアを足した数ごとに確かめる
+        counts = [popcount(mask) for mask in board.masks]
+        for pair in self.pairs[depth:]:
+            for color in pair:
+                counts[color.value] += 1
+            if self.can_all_clear(counts):
+                return True
+        return False
+
+    @staticmethod
+    def can_all_clear(counts) -> bool:
+        """色ごとのぷよの数が counts のとき、全消しになる可能性があるか"""
+        ojama = counts[PuyoColor.OJAMA.value]
+        colors = [counts[color.value] for color in PUYO_COLORS]
+        # どの色も4個以上ずつ消えるので1〜3個だけ残る色があってはいけない
+        if any(0 < count < 4 for count in colors):
+            return False
+        return not ojama or sum(colors) > 0 or ojama >= 4
+
+    def record_solution(self):
+        if self.solutions is not None:
+            self.solutions.append(PuzzleSolution(
+                [(placement.x, placement.rotation) for placement in self.path],
+                [list(placement.actions) for placement in self.path]))
+
+# ------------------------------------------------------------
+# パズルの生成と一括検証（複数プロセス）
+# ------------------------------------------------------------
+def generate_puzzle(seed, pair_count=2, chain=2, fill=10, goal=GOAL_CHAIN) -> Puzzle:
+    """シードから問題の候補を作る（解けるとは限らないので solve_puzzle で確かめる）
+
+    シードのペアの列から fill 個をランダムな場所に消えないように積んで盤面にし、
+    続く pair_count 個のペアを問題のペアにする。
+    """
+    rng = random.Random(seed)
+    queue = PairQueue(seed)
+    board = BitBoard()
+    board_hash = 0
+    for index in range(fill):
+        pair = queue.get(index)
+        candidates = []
+        for placed in generate_placements(board, pair):
+            placement = simulate_placement(placed, board_hash, pair)
+            if not placement.chain_count and not PuzzleSolver.is_game_over(placement.board):
+                candidates.append(placement)
+        if not candidates:
+            break
+        placement = rng.choice(candidates)
+        board, board_hash = placement.board, placement.board_hash
+
+    rows = ["".join(BOARD_CHARS[color] for color in row) for row in board.to_rows()]
+    pairs = ["".join(BOARD_CHARS[color] for color in queue.get(fill + i))
+             for i in range(pair_count)]
+    return Puzzle(rows, pairs, goal, chain if goal == GOAL_CHAIN else 0, f"seed-{seed}")
+
+def solve_puzzle(puzzle, unique=False, max_nodes=None) -> dict:
+    """1問を解いた結果（solvable: 解けるか、unique: 解が1つだけか）"""
+    solver = PuzzleSolver(max_nodes=max_nodes)
+    start = time.perf_counter()
+    solution = solver.solve(puzzle)
+    result = {
+        'name': puzzle.name,
+        'solvable': solution is not None,
+        'complete': solver.complete,
+        'nodes': solver.nodes_searched,
+        'solution': solution.moves if solution else None,
+    }
+    if unique and solution is not None:
+        result['unique'] = solver.count_solutions(puzzle, 2) == 1 and solver.complete
+        result['nodes'] += solver.nodes_searched
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def _solve_worker(args):
+    """プロセスプールから呼ばれる"""
+    data, unique, max_nodes = args
+    return solve_puzzle(Puzzle.from_dict(data), unique, max_nodes)
+
+def _generate_worker(args):
+    """プロセスプールから呼ばれる（解けない・解が複数ある候補はNone）"""
+    seed, options, unique, max_nodes = args
+    puzzle = generate_puzzle(seed, **options)
+    result = solve_puzzle(puzzle, unique, max_nodes)
+    if not result['solvable'] or (unique and not result['unique']):
+        return None
+    return puzzle.to_dict()
+
+def _run_pool(worker, tasks, workers):
+    """tasks を複数プロセスで処理し、入力と同じ順番で結果を返す"""
+    if workers == 1:
+        for task in tasks:
+            yield worker(task)
+        return
+    with Pool(workers) as pool:
+        for result in pool.imap(worker, tasks, chunksize=16):
+            yield result
+
+def solve_many(puzzles, unique=False, max_nodes=None, workers=None):
+    """複数のパズルを複数プロセスで解き、入力と同じ順番で結果を返す"""
+    tasks = ((puzzle.to_dict(), unique, max_nodes) for puzzle in puzzles)
+    yield from _run_pool(_solve_worker, tasks, workers)
+
+def generate_many(count, options=None, unique=False, max_nodes=None, workers=None,
+                  base_seed=0, max_attempts=None):
+    """解ける問題を count 問できるまでシードを変えて生成する"""
+    options = options or {}
+    max_attempts = max_attempts or count * 1000
+    tasks = ((base_seed + i, options, unique, max_nodes) for i in range(max_attempts))
+    found = 0
+    for data in _run_pool(_generate_worker, tasks, workers):
+        if data is not None:
+            yield Puzzle.from_dict(data)
+            found += 1
+            if found >= count:
+                return
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="なぞぷよの検証と生成を画面なしで行います")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    solve_parser = subparsers.add_parser('solve', help="パズルファイルの各問を解く")
+    solve_parser.add_argument('path', help="JSON Lines のパズルファイル")
+
+    generate_parser = subparsers.add_parser('generate', help="解ける問題を生成する")
+    generate_parser.add_argument('--count', type=int, default=100, help="生成する問題数")
+    generate_parser.add_argument('--goal', choices=GOALS, default=GOAL_CHAIN, help="目標")
+    generate_parser.add_argument('--chain', type=int, default=2, help="目標の連鎖数")
+    generate_parser.add_argument('--pairs', type=int, default=2, help="問題のペアの数")
+    generate_parser.add_argument('--fill', type=int, default=10,
+                                 help="盤面に積んでおくペアの数")
+    generate_parser.add_argument('--seed', type=int, default=0, help="最初のシード")
+
+    for sub in (solve_parser, generate_parser):
+        sub.add_argument('--unique', action='store_true', help="解が1つだけかも確かめる")
+        sub.add_argument('--max-nodes', type=int, help="1問あたりに調べる盤面の上限")
+        sub.add_argument('--workers', type=int, default=None,
+                         help="プロセス数（省略時はCPU数）")
+        sub.add_argument('--output', help="結果を書き出すJSON Linesファイル")
+    args = parser.parse_args(argv)
+
+    try:
+        output = open(args.output, "w", encoding="utf-8") if args.output else None
+    except IOError as e:
+        print(f"出力ファイルを開けません: {e}")
+        return 1
+
+    start = time.perf_counter()
+    try:
+        if args.command == 'solve':
+            try:
+                puzzles = load_puzzles(args.path)
+            except (IOError, ValueError, KeyError) as e:
+                print(f"パズルファイルを読み込めません: {e}")
+                return 1
+            solved = 0
+            for result in solve_many(puzzles, args.unique, args.max_nodes, args.workers):
+                solved += result['solvable']
+                if output:
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                else:
+                    print(json.dumps(result, ensure_ascii=False))
+            print(f"{len(puzzles)}問中{solved}問が解けます"
+                  f"（{time.perf_counter() - start:.1f}秒）")
+        else:
+            options = {'pair_count': args.pairs, 'chain': args.chain, 'fill': args.fill,
+                       'goal': args.goal}
+            generated = 0
+            for puzzle in generate_many(args.count, options, args.unique, args.max_nodes,
+                                        args.workers, args.seed):
+                generated += 1
+                line = json.dumps(puzzle.to_dict(), ensure_ascii=False)
+                if output:
+                    output.write(line + "\n")
+                else:
+                    print(line)
+            print(f"{generated}問を生成しました（{time.perf_counter() - start:.1f}秒）")
+    finally:
+        if output:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+リプレイの記録と再生
+
+リプレイにはシード・ルール設定と (ステップ数, 操作) の列だけを保存する。
+エンジンは固定ステップで決定的に進むので、同じ操作を同じステップで
+与え直せば最終盤面と得点まで再現できる。自動落下（ACTION_GRAVITY）も
+記録しておき、再生時に同じステップで落下したかを照合して食い違いを検出する。
+
+ファイル形式（マジックとバージョン以外はすべて符号なしvarint）:
+    b"PYRP" バージョン(1バイト)
+    seed(zigzag) chain_delay ojama_enabled ojama_interval
+    キック数 キック量(zigzag)...
+    end_tick score pair_count イベント数
+    イベントごとに (前のイベントからのステップ差 << 3) | 操作
+
+使い方:
+    python puyo_replay.py last_replay.bin
+"""
+
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from puyo_engine import PuyoEngine, ACTION_GRAVITY, SIMULATION_STEP, format_board
+
+REPLAY_MAGIC = b"PYRP"
+REPLAY_VERSION = 1
+# イベント1つのうち操作に使うビット数
+ACTION_BITS = 3
+
+def encode_varint(value, out: bytearray):
+    """0以上の整数を7ビットずつ書き出す"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, pos) -> Tuple[int, int]:
+    """pos から varint を読み、(値, 次の位置) を返す"""
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("リプレイデータが途中で切れています")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def zigzag(value) -> int:
+    """符号付き整数を符号なしに変換（0, -1, 1, -2, ... → 0, 1, 2, 3, ...）"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value) -> int:
+    """zigzag の逆変換"""
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+@dataclass
+class Replay:
+    """1ゲームぶんのリプレイ"""
+    seed: int
+    chain_delay: int = 0
+    ojama_enabled: bool = True
+    ojama_interval: int = 30000
+    kick_offsets: Tuple[int, ...] = (1, -1, 2, -2)
+    events: List[Tuple[int, int]] = field(default_factory=list)  # (ステップ数, 操作)
+    end_tick: int = 0  # 記録を終えたときのステップ数
+    score: int = 0  # 記録を終えたときの得点
+    pair_count: int = 0  # 記録を終えたときまでに出たぷよペアの数
+
+    @classmethod
+    def start_recording(cls, engine) -> 'Replay':
+        """エンジンの現在の設定で記録を始める（ゲーム開始直後に呼ぶ）"""
+        replay = cls(seed=engine.seed,
+                     chain_delay=engine.chain_delay,
+                     ojama_enabled=engine.OJAMA_ENABLED,
+                     ojama_interval=engine.ojama_interval,
+                     kick_offsets=tuple(engine.KICK_OFFSETS))
+        engine.input_log = replay.events
+        return replay
+
+    def finish(self, engine):
+        """記録を終え、終了時のステップ数と得点を残す"""
+        self.end_tick = engine.tick_count
+        self.score = engine.score
+        self.pair_count = engine.pair_index
+
+    def create_engine(self, board_class=None) -> PuyoEngine:
+        """記録時と同じ設定・シードのエンジンを作る"""
+        engine = PuyoEngine(board_class, seed=self.seed)
+        engine.chain_delay = self.chain_delay
+        engine.OJAMA_ENABLED = self.ojama_enabled
+        engine.ojama_interval = self.ojama_interval
+        engine.KICK_OFFSETS = self.kick_offsets
+        return engine
+
+    def to_bytes(self) -> bytes:
+        """バイナリ形式に変換"""
+        out = bytearray(REPLAY_MAGIC)
+        out.append(REPLAY_VERSION)
+        for value in (zigzag(self.seed), self.chain_delay, int(self.ojama_enabled),
+                      self.ojama_interval, len(self.kick_offsets)):
+            encode_varint(value, out)
+        for offset in self.kick_offsets:
+            encode_varint(zigzag(offset), out)
+        for value in (self.end_tick, self.score, self.pair_count, len(self.events)):
+            encode_varint(value, out)
+
+        last_tick = 0
+        for tick, action in self.events:
+            encode_varint(((tick - last_tick) << ACTION_BITS) | action, out)
+            last_tick = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'Replay':
+        """バイナリ形式から復元"""
+        if data[:len(REPLAY_MAGIC)] != REPLAY_MAGIC:
+            raise ValueError("リプレイファイルではありません")
+        version = data[len(REPLAY_MAGIC)]
+        if version != REPLAY_VERSION:
+            raise ValueError(f"未対応のリプレイバージョンです: {version}")
+        pos = len(REPLAY_MAGIC) + 1
+
+        header = []
+        for _ in range(5):
+            value, pos = decode_varint(data, pos)
+            header.append(value)
+        seed, chain_delay, ojama_enabled, ojama_interval, kick_count = header
+        kick_offsets = []
+        for _ in range(kick_count):
+            value, pos = decode_varint(data, pos)
+            kick_offsets.append(unzigzag(value))
+        end_tick, pos = decode_varint(data, pos)
+        score, pos = decode_varint(data, pos)
+        pair_count, pos = decode_varint(data, pos)
+        event_count, pos = decode_varint(data, pos)
+
+        events = []
+        tick = 0
+        for _ in range(event_count):
+            value, pos = decode_varint(data, pos)
+            tick += value >> ACTION_BITS
+            events.append((tick, value & ((1 << ACTION_BITS) - 1)))
+
+        return cls(seed=unzigzag(seed), chain_delay=chain_delay,
+                   ojama_enabled=bool(ojama_enabled), ojama_interval=ojama_interval,
+                   kick_offsets=tuple(kick_offsets), events=events,
+                   end_tick=end_tick, score=score, pair_count=pair_count)
+
+    def save(self, path):
+        """ファイルに保存"""
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path) -> 'Replay':
+        """ファイルから読み込み"""
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+@dataclass
+class ReplayResult:
+    """リプレイを再生した結果"""
+    engine: PuyoEngine  # 再生を終えたエンジン（board, score などを参照できる）
+    verified: bool  # 自動落下のタイミング・得点・ペア数が記録と一致したか
+    desync_tick: Optional[int] = None  # 記録と最初に食い違ったステップ数
+
+def play_replay(replay, board_class=None) -> ReplayResult:
+    """画面・待ち時間なしでリプレイを最後まで再生する"""
+    engine = replay.create_engine(board_class)
+    replayed = []
+    engine.input_log = replayed
+
+    for tick, action in replay.events:
+        while engine.tick_count < tick:
+            engine.step()
+        # 自動落下はエンジン自身が同じステップで起こすはずなので与え直さない
+        if action != ACTION_GRAVITY:
+            engine.apply_action(action)
+    while engine.tick_count < replay.end_tick:
+        engine.step()
+
+    # 再生中に起きた操作・自動落下を記録と突き合わせる
+    desync_tick = None
+    for recorded, actual in zip(replay.events, replayed):
+        if recorded != actual:
+            desync_tick = min(recorded[0], actual[0])
+            break
+    else:
+        if len(replay.events) != len(replayed):
+            shorter = min(len(replay.events), len(replayed))
+            longer = replay.events if len(replay.events) > shorter else replayed
+            desync_tick = longer[shorter][0]
+
+    verified = (desync_tick is None and engine.score == replay.score and
+                engine.pair_index == replay.pair_count)
+    return ReplayResult(engine, verified, desync_tick)
+
+def main(argv):
+    if len(argv) < 2:
+        print("使い方: python puyo_replay.py リプレイファイル")
+        return 1
+
+    try:
+        replay = Replay.load(argv[1])
+    except (IOError, ValueError) as e:
+        print(f"リプレイの読み込みに失敗しました: {e}")
+        return 1
+
+    start = time.perf_counter()
+    result = play_replay(replay)
+    elapsed = time.perf_counter() - start
+
+    engine = result.engine
+    print(format_board(engine.board))
+    print(f"スコア: {engine.score}（記録: {replay.score}）")
+    print(f"最大連鎖: {engine.max_chain_count}  レベル: {engine.level}")
+    print(f"ゲーム内時間: {engine.tick_count * SIMULATION_STEP / 1000:.1f}秒  再生時間: {elapsed:.3f}秒")
+    if result.verified:
+        print("記録と一致しました")
+        return 0
+    if result.desync_tick is not None:
+        print(f"ステップ {result.desync_tick} で記録と食い違いました")
+    else:
+        print("最終的な得点またはぷよの数が記録と一致しません")
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
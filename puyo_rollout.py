@@ -0,0 +1,272 @@
+"""
+モンテカルロ・ロールアウトによる置き方の評価（AIの強さ調整・難易度の見積もり用）
+
+RolloutEvaluator は操作中のペアの置き方ごとに、その手を打ったあとを
+ランダムな置き方で horizon 手先まで何度も（rollouts 回）進め、得た点数・
+最大連鎖数・ゲームオーバーになった割合の平均でその手を評価する。
+ロールアウトにはゲームのペアの列（get_upcoming_pairs）をそのまま渡すので、
+なぞぷよの決まったペアや外から渡した列でも create_new_puyo が配るのと
+同じ順番になる（ランダムなのは置き方だけ）。
+
+ロールアウトは concurrent.futures のプロセスプールで並列に進める。
+1タスクで batch_size 回ぶんのロールアウトをまとめて行い、プロセス間で
+受け渡すのはスナップショットと手順と点数だけにしてタスクあたりの負担を減らす。
+
+estimate_difficulty は空の盤面から同じようにランダムに置き続けて、
+ojama_interval やレベルの設定ごとの生き残りやすさを比べる。
+
+使い方:
+    with RolloutEvaluator(rollouts=64, horizon=20) as evaluator:
+        results = evaluator.evaluate(engine)  # 置き方ごとの RolloutResult
+        placement = evaluator.choose(engine)
+
+    python puyo_rollout.py --games 500 --levels 1 3 5 --ojama-intervals 30000 15000
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from puyo_engine import PuyoEngine, PairQueue, PairPlacement, ACTION_DOWN
+
+# 1手ごとに進めるおじゃまぷよタイマーの時間（ミリ秒、puyo_env.MOVE_TIME と同じ）
+MOVE_TIME = 1000
+# ゲームオーバーになった割合1あたりの評価の減点
+GAME_OVER_PENALTY = 2000
+# ロールアウト用のエンジンにそのまま設定する値（None なら既定のまま）
+SETTING_NAMES = ('ojama_interval', 'OJAMA_ENABLED', 'KICK_OFFSETS')
+
+@dataclass
+class RolloutResult:
+    """1つの置き方をロールアウトで評価した結果"""
+    placement: PairPlacement
+    mean_score: float  # その手から horizon 手先までに得た点数の平均
+    mean_chain: float  # その手から horizon 手先までの最大連鎖数の平均
+    game_over_rate: float  # ゲームオーバーになったロールアウトの割合
+    rollouts: int
+
+    @property
+    def value(self) -> float:
+        """評価値（大きいほど良い）"""
+        return self.mean_score - GAME_OVER_PENALTY * self.game_over_rate
+
+# ------------------------------------------------------------
+# ロールアウト（子プロセスで動く）
+# ------------------------------------------------------------
+def play_placement(engine, actions, move_time=MOVE_TIME):
+    """actions で動かしたペアを着地するまで落とし、おじゃまぷよのタイマーを1手ぶん進める"""
+    for action in actions:
+        engine.apply_action(action)
+    pair_index = engine.pair_index
+    while engine.pair_index == pair_index and not engine.game_over:
+        engine.apply_action(ACTION_DOWN)
+    if engine.OJAMA_ENABLED and not engine.game_over:
+        engine.update_ojama_timer(move_time)
+
+def run_rollout(engine, rng, horizon, move_time=MOVE_TIME) -> int:
+    """置ける場所からランダムに選んで horizon 手進め、置いた手数を返す"""
+    for move in range(horizon):
+        if engine.game_over:
+            return move
+        placements = engine.get_placements(with_boards=False)
+        play_placement(engine, rng.choice(placements).actions if placements else [],
+                       move_time)
+    return horizon
+
+def _rollout_engine(settings) -> PuyoEngine:
+    """設定どおりのロールアウト用のエンジンを作る"""
+    engine = PuyoEngine(settings.get('board_class'), seed=0)
+    engine.chain_delay = 0  # 連鎖は着地時にすべて処理する
+    for name in SETTING_NAMES:
+        if settings.get(name) is not None:
+            setattr(engine, name, settings[name])
+    return engine
+
+def _rollout_batch(task):
+    """プロセスプールから呼ばれる: まとめて渡された回数ぶんのロールアウトを行う
+
+    task は (スナップショット, 最初の手の操作, この先のペア, ロールアウトごとの
+    (ペアのシード, 置き方のシード), horizon, 設定)。スナップショットが None なら
+    ペアのシードの列で空の盤面から始め、そうでなければ渡されたペアを配る。
+    ロールアウトごとの (得た点数, 最大連鎖数, 置いた手数, ゲームオーバーか) を返す。
+    """
+    snapshot, first_actions, upcoming_pairs, seeds, horizon, settings = task
+    engine = _rollout_engine(settings)
+    move_time = settings.get('move_time', MOVE_TIME)
+    queue = None
+    if snapshot is not None:
+        # シードから作り直すとなぞぷよの決まったペアと違う列になるので、渡されたペアを読ませる
+        queue = PairQueue(0)
+        queue.pairs = list(upcoming_pairs)
+    results = []
+    for pair_seed, rollout_seed in seeds:
+        if snapshot is None:
+            if queue is None or queue.seed != pair_seed:
+                queue = PairQueue(pair_seed)
+            engine.reset_game(pair_queue=queue)
+            engine.level = settings.get('level') or engine.level
+        else:
+            engine.restore(snapshot)
+            engine.pair_queue = queue
+            engine.pair_index = 0
+        score = engine.score
+        engine.max_chain_count = 0
+
+        moves = 0
+        if first_actions is not None:
+            play_placement(engine, first_actions, move_time)
+            moves = 1
+        moves += run_rollout(engine, random.Random(rollout_seed), horizon - moves, move_time)
+        results.append((engine.score - score, engine.max_chain_count, moves, engine.game_over))
+    return results
+
+# ------------------------------------------------------------
+# 評価器
+# ------------------------------------------------------------
+class RolloutEvaluator:
+    """置き方をランダムなロールアウトの平均で評価する（プロセスプールで並列実行）"""
+    def __init__(self, rollouts=32, horizon=20, batch_size=8, workers=None, seed=0,
+                 move_time=MOVE_TIME):
+        self.rollouts = rollouts  # 置き方1つあたりのロールアウト回数
+        self.horizon = horizon  # 1回のロールアウトで置く手数（評価する手を含む）
+        self.batch_size = batch_size  # 1タスクにまとめるロールアウト回数
+        self.workers = workers  # プロセス数（Noneなら CPU 数、1ならこのプロセスで実行）
+        self.seed = seed  # ロールアウトの置き方を選ぶ乱数のシード
+        self.move_time = move_time
+        self.executor = None  # 最初に使うときに作る
+
+    def __call__(self, engine, rng=None):
+        """puyo_simulate の方針と同じ形（policy(engine, rng)）で使う"""
+        return self.choose(engine)
+
+    def choose(self, engine) -> Optional[PairPlacement]:
+        """評価値が最も高い置き方（連鎖処理中・ゲームオーバー時はNone）"""
+        results = self.evaluate(engine)
+        if not results:
+            return None
+        return max(results, key=lambda result: result.value).placement
+
+    def evaluate(self, engine) -> List[RolloutResult]:
+        """操作中のペアの置き方ごとの評価（get_placements と同じ順番）"""
+        if engine.game_over or engine.is_resolving_chains():
+            return []
+        placements = engine.get_placements(with_boards=False)
+        snapshot = engine.snapshot()
+        settings = self.engine_settings(engine)
+        # 1回のロールアウトで配られるのは次のぷよのさらに先の horizon 個まで
+        upcoming_pairs = tuple(tuple(pair) for pair in engine.get_upcoming_pairs(self.horizon))
+
+        tasks = []
+        for index, placement in enumerate(placements):
+            # 置き方が違っても k 回目のロールアウトは同じ乱数で比べる
+            seeds = [(None, f"{self.seed}-{engine.pair_index}-{k}")
+                     for k in range(self.rollouts)]
+            for batch in self.split(seeds):
+                tasks.append((index, (snapshot, placement.actions, upcoming_pairs, batch,
+                                      self.horizon, settings)))
+
+        outcomes = [[] for _ in placements]
+        for (index, _), results in zip(tasks, self.map([task for _, task in tasks])):
+            outcomes[index].extend(results)
+        return [self.summarize(placement, results)
+                for placement, results in zip(placements, outcomes)]
+
+    def estimate_difficulty(self, games=100, settings=None, base_seed=0) -> dict:
+        """空の盤面からランダムに置き続けたときの成績（設定ごとの難しさの比較用）
+
+        settings には ojama_interval・level・OJAMA_ENABLED などを指定する。
+        ゲーム i はシード base_seed + i のペアの列で進める。
+        """
+        settings = dict(settings or {})
+        settings.setdefault('move_time', self.move_time)
+        seeds = [(base_seed + i, f"{self.seed}-{base_seed + i}") for i in range(games)]
+        tasks = [(None, None, None, batch, self.horizon, settings)
+                 for batch in self.split(seeds)]
+        results = [result for batch in self.map(tasks) for result in batch]
+        count = len(results)
+        return {
+            'games': count,
+            'game_over_rate': sum(result[3] for result in results) / count,
+            'mean_moves': sum(result[2] for result in results) / count,
+            'mean_score': sum(result[0] for result in results) / count,
+            'mean_chain': sum(result[1] for result in results) / count,
+        }
+
+    def engine_settings(self, engine) -> dict:
+        """ロールアウト用のエンジンに引き継ぐ設定"""
+        settings = {name: getattr(engine, name) for name in SETTING_NAMES}
+        settings['board_class'] = engine.board_class
+        settings['move_time'] = self.move_time
+        return settings
+
+    def split(self, seeds):
+        """ロールアウトを batch_size 回ずつのタスクに分ける"""
+        size = max(1, self.batch_size)
+        return [seeds[start:start + size] for start in range(0, len(seeds), size)]
+
+    def map(self, tasks):
+        """タスクをプロセスプールで実行し、同じ順番で結果を返す"""
+        if self.workers == 1:
+            return [_rollout_batch(task) for task in tasks]
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        return list(self.executor.map(_rollout_batch, tasks))
+
+    @staticmethod
+    def summarize(placement, results) -> RolloutResult:
+        count = len(results) or 1
+        return RolloutResult(
+            placement,
+            sum(result[0] for result in results) / count,
+            sum(result[1] for result in results) / count,
+            sum(result[3] for result in results) / count,
+            len(results))
+
+    def close(self):
+        """プロセスプールを終了する"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="ランダムなロールアウトでレベル・おじゃまぷよ間隔ごとの難しさを見積もります")
+    parser.add_argument('--games', type=int, default=200, help="設定ごとのゲーム数")
+    parser.add_argument('--horizon', type=int, default=50, help="1ゲームで置く最大の手数")
+    parser.add_argument('--levels', type=int, nargs='+', default=[1], help="開始レベル")
+    parser.add_argument('--ojama-intervals', type=int, nargs='+', default=[30000],
+                        help="おじゃまぷよの間隔（ミリ秒）")
+    parser.add_argument('--move-time', type=int, default=MOVE_TIME,
+                        help="1手あたりに進むおじゃまぷよタイマーの時間（ミリ秒）")
+    parser.add_argument('--batch-size', type=int, default=16, help="1タスクにまとめるゲーム数")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="プロセス数（省略時はCPU数）")
+    parser.add_argument('--seed', type=int, default=0, help="最初のゲームのシード")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with RolloutEvaluator(horizon=args.horizon, batch_size=args.batch_size,
+                          workers=args.workers, move_time=args.move_time) as evaluator:
+        print(f"{'レベル':>6} {'間隔(ms)':>8} {'負け率':>6} {'手数':>6} {'得点':>8} {'連鎖':>5}")
+        for level in args.levels:
+            for interval in args.ojama_intervals:
+                summary = evaluator.estimate_difficulty(
+                    args.games, {'level': level, 'ojama_interval': interval}, args.seed)
+                print(f"{level:>6} {interval:>8} {summary['game_over_rate']:>6.2f} "
+                      f"{summary['mean_moves']:>6.1f} {summary['mean_score']:>8.1f} "
+                      f"{summary['mean_chain']:>5.2f}")
+    print(f"（{time.perf_counter() - start:.1f}秒）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
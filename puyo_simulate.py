@@ -0,0 +1,273 @@
+"""
+ゲームの一括シミュレーション（コマンドライン用）
+
+PuyoEngine を画面なしで動かし、方針（policy）が選んだ位置にぷよを置かせて
+多数のゲームを複数プロセスで最後まで進める。1ゲームごとの結果
+（得点・最大連鎖数・到達レベル・置いたペア数・受けたおじゃまぷよ数）を
+JSON Lines で書き出し、最後に集計を表示する。ojama_interval や
+レベルアップの曲線、落下速度をデータを見ながら調整するためのもの。
+
+方針は policy(engine, rng) -> (x, rotation) の関数で、ペアが出るたびに
+呼ばれる（操作の列 actions を持つ puyo_ai.Placement を返してもよい）。
+組み込みの random / greedy / beam のほか、"モジュール名:関数名" で
+自作の関数を指定できる。
+
+使い方:
+    python puyo_simulate.py --games 1000 --policy greedy --output results.jsonl
+    python puyo_simulate.py --policy my_bot:choose --ojama-interval 20000
+"""
+
+import argparse
+import importlib
+import json
+import random
+import statistics
+import sys
+import time
+from multiprocessing import Pool
+
+from puyo_engine import PuyoEngine, PuyoColor, BOARD_WIDTH, SIMULATION_STEP, ACTION_DOWN
+from puyo_ai import BeamSearchAI
+
+# 集計対象の項目
+RESULT_FIELDS = ['score', 'max_chain_count', 'level', 'pieces_placed', 'ojama_received']
+
+# 置き場所の評価に使う作業用エンジン（ボードの実装ごと、プロセスごとに1つ）
+_scratch_engines = {}
+
+# ------------------------------------------------------------
+# 方針
+# ------------------------------------------------------------
+def random_policy(engine, rng):
+    """列と向きをランダムに選ぶ"""
+    return rng.randrange(BOARD_WIDTH), rng.randrange(4)
+
+def evaluate_placement(engine, scratch, placement):
+    """置き方 placement（PairPlacement）の連鎖を scratch 上で処理し (得点, 盤面) を返す"""
+    scratch.load_board(placement.board)
+    # 連鎖判定は置いたぷよと、エンジンでまだ調べていないセルからだけ行う
+    if engine.dirty_cells is not None:
+        scratch.dirty_cells = set(engine.dirty_cells) | {placement.main_pos, placement.sub_pos}
+    scratch.score = 0
+    scratch.check_chains()
+    return scratch.score, scratch.board
+
+def greedy_policy(engine, rng):
+    """すぐに得られる得点が最大、次に同色の隣接が多く、低く積める置き方を選ぶ
+
+    候補は PuyoEngine.get_placements（出現位置での回転・壁キックを含めて届く置き方）。
+    """
+    scratch = _scratch_engines.get(engine.board_class)
+    if scratch is None:
+        scratch = _scratch_engines[engine.board_class] = PuyoEngine(engine.board_class, seed=0)
+
+    best = None
+    best_value = None
+    for placement in engine.get_placements():
+        score, board = evaluate_placement(engine, scratch, placement)
+        value = (score, count_same_neighbors(board), -stack_height(board), rng.random())
+        if best_value is None or value > best_value:
+            best_value = value
+            best = placement
+    return best
+
+def count_same_neighbors(board):
+    """上下・左右に同じ色が並んでいる組の数（色ぷよのみ）"""
+    count = 0
+    rows = board.to_rows()
+    for y, row in enumerate(rows):
+        for x, color in enumerate(row):
+            if color == PuyoColor.EMPTY or color == PuyoColor.OJAMA:
+                continue
+            if x + 1 < BOARD_WIDTH and row[x + 1] == color:
+                count += 1
+            if y + 1 < len(rows) and rows[y + 1][x] == color:
+                count += 1
+    return count
+
+def stack_height(board):
+    """一番高い列の高さ"""
+    rows = board.to_rows()
+    for y, row in enumerate(rows):
+        if any(color != PuyoColor.EMPTY for color in row):
+            return len(rows) - y
+    return 0
+
+# ビームサーチAI（プロセスごとに1つ）
+_beam_ai = None
+
+def beam_policy(engine, rng):
+    """puyo_ai.BeamSearchAI で数手先まで読んで置く"""
+    global _beam_ai
+    if _beam_ai is None:
+        _beam_ai = BeamSearchAI()
+    return _beam_ai.choose(engine)
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'beam': beam_policy,
+}
+
+def load_policy(name):
+    """方針名（random / greedy / "モジュール名:関数名"）から関数を得る"""
+    if name in POLICIES:
+        return POLICIES[name]
+    if ':' not in name:
+        raise ValueError(f"不明な方針です: {name}")
+    module_name, func_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+# ------------------------------------------------------------
+# 1ゲームの実行
+# ------------------------------------------------------------
+def steer(engine, x, rotation):
+    """操作中のぷよを向きrotation・列xへ動かす（届かなければ動かさない）
+
+    出現位置では向き0の副ぷよが盤面の上にはみ出して横に動かせないので、
+    操作の列は PuyoEngine.find_placement で回転・壁キックを含めて求める。
+    """
+    placement = engine.find_placement(x, rotation)
+    if placement is not None:
+        for action in placement.actions:
+            engine.apply_action(action)
+
+def run_game(seed, policy, settings):
+    """1ゲームを最後まで（または max_seconds まで）進めて結果を返す"""
+    engine = PuyoEngine(settings.get('board_class'), seed=seed)
+    engine.chain_delay = settings.get('chain_delay', 0)
+    for name in ('ojama_interval', 'base_fall_speed'):
+        if settings.get(name) is not None:
+            setattr(engine, name, settings[name])
+    engine.fall_speed = engine.base_fall_speed
+    for name in ('LEVEL_CHAINS', 'FALL_SPEED_STEP', 'MIN_FALL_SPEED'):
+        if settings.get(name) is not None:
+            setattr(engine, name, settings[name])
+
+    rng = random.Random(seed)
+    hard_drop = settings.get('hard_drop', False)
+    max_ticks = int(settings.get('max_seconds', 600) * 1000 // SIMULATION_STEP)
+
+    handled = None
+    while not engine.game_over and engine.tick_count < max_ticks:
+        if engine.pair_index != handled and not engine.is_resolving_chains():
+            # 新しいペアが出たら方針に置き場所を聞く
+            handled = engine.pair_index
+            choice = policy(engine, rng)
+            if hasattr(choice, 'actions'):
+                for action in choice.actions:
+                    engine.apply_action(action)
+            elif choice is not None:
+                steer(engine, *choice)
+            if hard_drop:
+                while (engine.pair_index == handled and not engine.game_over and
+                       not engine.is_resolving_chains()):
+                    engine.apply_action(ACTION_DOWN)
+        engine.step()
+
+    result = {'seed': seed}
+    for name in RESULT_FIELDS:
+        result[name] = getattr(engine, name)
+    result['seconds'] = engine.tick_count * SIMULATION_STEP / 1000
+    result['game_over'] = engine.game_over
+    return result
+
+def _run_game_worker(args):
+    """プロセスプールから呼ばれる（方針は名前で受け取り、プロセス内で読み込む）"""
+    seed, policy_name, settings = args
+    return run_game(seed, load_policy(policy_name), settings)
+
+def run_batch(games, policy_name='greedy', settings=None, workers=None, base_seed=0):
+    """games回のゲームを複数プロセスで実行し、終わった順に結果を返す"""
+    settings = settings or {}
+    tasks = [(base_seed + i, policy_name, settings) for i in range(games)]
+    if workers == 1:
+        for task in tasks:
+            yield _run_game_worker(task)
+        return
+    with Pool(workers) as pool:
+        for result in pool.imap_unordered(_run_game_worker, tasks, chunksize=8):
+            yield result
+
+def summarize(results):
+    """項目ごとの平均・中央値・最大値"""
+    summary = {}
+    for name in RESULT_FIELDS:
+        values = [result[name] for result in results]
+        summary[name] = {
+            'mean': statistics.mean(values),
+            'median': statistics.median(values),
+            'max': max(values),
+        }
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ぷよぷよのゲームを画面なしで一括実行します")
+    parser.add_argument('--games', type=int, default=100, help="実行するゲーム数")
+    parser.add_argument('--policy', default='greedy',
+                        help="random / greedy / beam / モジュール名:関数名")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="プロセス数（省略時はCPU数）")
+    parser.add_argument('--seed', type=int, default=0, help="最初のゲームのシード")
+    parser.add_argument('--output', help="1ゲームごとの結果を書き出すJSON Linesファイル")
+    parser.add_argument('--ojama-interval', type=int, help="おじゃまぷよの間隔（ミリ秒）")
+    parser.add_argument('--fall-speed', type=int, help="レベル1の落下間隔（ミリ秒）")
+    parser.add_argument('--level-chains', type=int, help="レベルアップに必要な連鎖数")
+    parser.add_argument('--fall-speed-step', type=int,
+                        help="レベルごとに短くなる落下間隔（ミリ秒）")
+    parser.add_argument('--chain-delay', type=int, default=150,
+                        help="連鎖の各段階の待ち時間（ミリ秒、ゲームと同じ150が既定）")
+    parser.add_argument('--max-seconds', type=float, default=600,
+                        help="1ゲームの最大時間（ゲーム内の秒数）")
+    parser.add_argument('--hard-drop', action='store_true',
+                        help="自動落下を待たずにすぐ落とす")
+    parser.add_argument('--bitboard', action='store_true', help="BitBoardで実行")
+    args = parser.parse_args(argv)
+
+    try:
+        load_policy(args.policy)
+    except (ValueError, ImportError, AttributeError) as e:
+        print(f"方針を読み込めません: {e}")
+        return 1
+
+    settings = {
+        'ojama_interval': args.ojama_interval,
+        'base_fall_speed': args.fall_speed,
+        'LEVEL_CHAINS': args.level_chains,
+        'FALL_SPEED_STEP': args.fall_speed_step,
+        'chain_delay': args.chain_delay,
+        'max_seconds': args.max_seconds,
+        'hard_drop': args.hard_drop,
+    }
+    if args.bitboard:
+        from puyo_bitboard import BitBoard
+        settings['board_class'] = BitBoard
+
+    output = None
+    if args.output:
+        try:
+            output = open(args.output, "w")
+        except IOError as e:
+            print(f"出力ファイルを開けません: {e}")
+            return 1
+
+    start = time.perf_counter()
+    results = []
+    try:
+        for result in run_batch(args.games, args.policy, settings, args.workers, args.seed):
+            results.append(result)
+            if output:
+                output.write(json.dumps(result) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(results)}ゲーム（方針: {args.policy}、{elapsed:.1f}秒）")
+    for name, stats in summarize(results).items():
+        print(f"  {name:16} 平均 {stats['mean']:10.1f}  中央値 {stats['median']:10.1f}  "
+              f"最大 {stats['max']:8}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""元の PuyoGame（main.py）の連鎖・重力・得点の処理をそのまま写したもの（テストの基準）"""
+
+from puyo_engine import PuyoColor, BOARD_WIDTH, BOARD_HEIGHT
+
+COLORS = [PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW, PuyoColor.OJAMA]
+
+def reference_connected(board, start_x, start_y, color):
+    visited = set()
+    stack = [(start_x, start_y)]
+    connected = []
+    while stack:
+        x, y = stack.pop()
+        if (x, y) in visited:
+            continue
+        if (x < 0 or x >= BOARD_WIDTH or y < 0 or y >= BOARD_HEIGHT or
+                board[y][x] != color):
+            continue
+        visited.add((x, y))
+        connected.append((x, y))
+        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+            if (x + dx, y + dy) not in visited:
+                stack.append((x + dx, y + dy))
+    return connected
+
+def reference_gravity(board):
+    for x in range(BOARD_WIDTH):
+        column = [board[y][x] for y in range(BOARD_HEIGHT) if board[y][x] != PuyoColor.EMPTY]
+        for y in range(BOARD_HEIGHT):
+            board[y][x] = PuyoColor.EMPTY
+        for i, puyo in enumerate(reversed(column)):
+            board[BOARD_HEIGHT - 1 - i][x] = puyo
+
+def reference_chains(board):
+    """連鎖を最後まで処理し (連鎖数, 得点) を返す"""
+    chain_count = 0
+    total_score = 0
+    while True:
+        to_remove = set()
+        for y in range(BOARD_HEIGHT):
+            for x in range(BOARD_WIDTH):
+                if board[y][x] != PuyoColor.EMPTY:
+                    connected = reference_connected(board, x, y, board[y][x])
+                    if len(connected) >= 4:
+                        to_remove.update(connected)
+        if not to_remove:
+            return chain_count, total_score
+        chain_count += 1
+        total_score += len(to_remove) * 10 + chain_count * 50
+
+        ojama_to_remove = set()
+        for x, y in to_remove:
+            for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+                nx, ny = x + dx, y + dy
+                if (0 <= nx < BOARD_WIDTH and 0 <= ny < BOARD_HEIGHT and
+                        board[ny][nx] == PuyoColor.OJAMA):
+                    ojama_to_remove.add((nx, ny))
+        for x, y in to_remove | ojama_to_remove:
+            board[y][x] = PuyoColor.EMPTY
+        reference_gravity(board)
+
+def random_board(rng):
+    """列ごとに高さを決めて積んだ盤面（浮いたぷよはない）"""
+    board = [[PuyoColor.EMPTY] * BOARD_WIDTH for _ in range(BOARD_HEIGHT)]
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT - rng.randint(0, BOARD_HEIGHT), BOARD_HEIGHT):
+            board[y][x] = rng.choice(COLORS if rng.random() < 0.9 else COLORS[:3])
+    return board
+
+def random_floating_board(rng):
+    """浮いたぷよを含む盤面"""
+    return [[rng.choice(COLORS) if rng.random() < 0.4 else PuyoColor.EMPTY
+             for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
@@ -0,0 +1,68 @@
+"""ビームサーチAIの思考時間と打ち切り"""
+
+import puyo_ai
+from puyo_engine import PuyoEngine
+from puyo_bitboard import BitBoard
+from puyo_ai import BeamSearchAI
+
+class FakeClock:
+    """time.perf_counter の代わり（advance した分だけ進む）"""
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def advance(self, milliseconds):
+        self.now += milliseconds / 1000
+
+def test_time_budget_includes_evaluation(monkeypatch):
+    """盤面の評価や置き方の列挙に時間がかかっても思考時間を超えない"""
+    clock = FakeClock()
+    monkeypatch.setattr(puyo_ai.time, "perf_counter", clock.perf_counter)
+    evaluate_board = puyo_ai.evaluate_board
+    generate_placements = puyo_ai.generate_placements
+
+    def slow_evaluate(board):
+        clock.advance(1)
+        return evaluate_board(board)
+
+    def slow_generate(*args, **kwargs):
+        clock.advance(1)
+        return generate_placements(*args, **kwargs)
+
+    monkeypatch.setattr(puyo_ai, "evaluate_board", slow_evaluate)
+    monkeypatch.setattr(puyo_ai, "generate_placements", slow_generate)
+    engine = PuyoEngine(BitBoard, seed=1)
+    ai = BeamSearchAI(depth=3, beam_width=8, time_budget=5)
+    assert ai.choose(engine) is not None
+    assert clock.now <= 0.005
+
+def test_time_budget_is_checked_between_candidates():
+    """締め切りを過ぎたら、最初の候補を調べた時点で読みを打ち切る"""
+    engine = PuyoEngine(BitBoard, seed=1)
+    ai = BeamSearchAI(depth=3, beam_width=8, time_budget=0)
+    placement = ai.choose(engine)
+    assert placement is not None
+    assert ai.nodes_searched == 1
+    assert ai.depth_reached == 1
+
+def test_stop_still_returns_a_move():
+    """stop が最初から True でも置き方を1つは返す"""
+    engine = PuyoEngine(BitBoard, seed=2)
+    calls = []
+    def stop():
+        calls.append(1)
+        return True
+    ai = BeamSearchAI(depth=3, time_budget=1000)
+    assert ai.choose(engine, stop=stop) is not None
+    assert ai.nodes_searched == 1
+    assert calls
+
+def test_full_search_within_budget():
+    """時間が十分あれば最後の手まで読む"""
+    engine = PuyoEngine(BitBoard, seed=3)
+    ai = BeamSearchAI(depth=2, beam_width=4, time_budget=10000)
+    assert ai.choose(engine) is not None
+    assert ai.depth_reached == 2
+    assert ai.nodes_searched > 1
@@ -0,0 +1,74 @@
+"""NumPy のバッチエンジンが PuyoEngine と同じ結果になること"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from puyo_engine import PuyoEngine, BOARD_WIDTH, ROTATION_OFFSETS, landing_cells
+from puyo_batch import BatchEngine, apply_gravity, check_chains, board_to_array, array_to_rows
+from reference_rules import random_board, random_floating_board
+
+def test_gravity_matches_engine():
+    rng = random.Random(1)
+    boards = [random_floating_board(rng) for _ in range(200)]
+    batch = np.array([board_to_array(board) for board in boards])
+    apply_gravity(batch)
+    for board, result in zip(boards, batch):
+        engine = PuyoEngine(seed=0)
+        engine.load_board(board)
+        engine.apply_gravity()
+        assert array_to_rows(result) == engine.board.to_rows()
+
+def test_chains_match_engine():
+    """連鎖数・得点・消したあとの盤面が PuyoEngine.check_chains と同じ"""
+    rng = random.Random(2)
+    boards = [random_board(rng) for _ in range(300)]
+    batch = np.array([board_to_array(board) for board in boards])
+    chain_counts, scores = check_chains(batch)
+    assert chain_counts.max() >= 2
+    for board, result, chain_count, score in zip(boards, batch, chain_counts, scores):
+        engine = PuyoEngine(seed=0)
+        engine.load_board(board)
+        assert engine.check_chains() == chain_count
+        assert engine.score == score
+        assert array_to_rows(result) == engine.board.to_rows()
+
+def test_step_matches_engine():
+    """同じシードのゲームを同じ手で進めると、盤面・得点・連鎖数・ゲームオーバーが一致する"""
+    count, seed = 16, 5
+    batch = BatchEngine(count, seed=seed)
+    engines = [PuyoEngine(seed=seed + i) for i in range(count)]
+    rng = np.random.default_rng(0)
+    for _ in range(80):
+        pairs = batch.get_pairs()
+        columns = rng.integers(0, BOARD_WIDTH, count)
+        rotations = rng.integers(0, 4, count)
+        result = batch.step(columns, rotations)
+        for i, engine in enumerate(engines):
+            if engine.game_over:
+                assert not result.placed[i]
+                continue
+            assert [color.value for color in engine.current_puyo] == pairs[i].tolist()
+            floors = [len(engine.board) - 1 - height for height in engine.heights]
+            x, rotation = int(columns[i]), int(rotations[i])
+            sub_x = x + ROTATION_OFFSETS[rotation][0]
+            if not 0 <= sub_x < BOARD_WIDTH:
+                assert not result.placed[i]
+                continue
+            landing_y, (_, main_y), (_, sub_y) = landing_cells(floors, x, rotation)
+            if min(main_y, sub_y) < 0:
+                assert not result.placed[i]
+                continue
+            assert result.placed[i]
+            score, lines_cleared = engine.score, engine.lines_cleared
+            engine.puyo_x, engine.puyo_y, engine.puyo_rotation = x, landing_y, rotation
+            engine.lock_puyo()
+            assert result.scores[i] == engine.score - score
+            assert result.chain_counts[i] == engine.lines_cleared - lines_cleared
+            assert result.game_over[i] == engine.game_over
+            assert array_to_rows(batch.boards[i]) == engine.board.to_rows()
+    assert batch.max_chain_counts.tolist() == [engine.max_chain_count for engine in engines]
+    assert batch.scores.tolist() == [engine.score for engine in engines]
+    assert batch.game_over.any() and batch.max_chain_counts.any()
@@ -0,0 +1,63 @@
+"""BitBoard が ListBoard と同じ結果になること"""
+
+import random
+
+import pytest
+
+from puyo_engine import PuyoEngine, ListBoard, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE
+from puyo_bitboard import BitBoard
+from reference_rules import reference_chains, reference_gravity, random_board, random_floating_board
+
+def play_random_game(board_class, seed, steps=3000):
+    """シードのゲームをランダムな操作で進め、終わったときの状態を返す"""
+    engine = PuyoEngine(board_class, seed=seed)
+    engine.ojama_interval = 3000
+    rng = random.Random(seed + 1)
+    actions = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN]
+    for _ in range(steps):
+        if engine.game_over:
+            break
+        choice = rng.randrange(len(actions) + 1)
+        if choice < len(actions):
+            engine.apply_action(actions[choice])
+        engine.update(100)
+    return (engine.score, engine.max_chain_count, engine.level, engine.pieces_placed,
+            engine.board.to_rows(), engine.board_hash)
+
+def test_chains_match_reference():
+    rng = random.Random(1)
+    for _ in range(500):
+        board = random_board(rng)
+        expected = [list(row) for row in board]
+        chain_count, score = reference_chains(expected)
+
+        engine = PuyoEngine(BitBoard, seed=0)
+        engine.load_board(board)
+        assert engine.check_chains() == chain_count
+        assert engine.score == score
+        assert engine.board.to_rows() == expected
+
+def test_gravity_matches_reference():
+    rng = random.Random(2)
+    for _ in range(200):
+        board = random_floating_board(rng)
+        expected = [list(row) for row in board]
+        reference_gravity(expected)
+
+        engine = PuyoEngine(BitBoard, seed=0)
+        engine.load_board(board)
+        engine.apply_gravity()
+        assert engine.board.to_rows() == expected
+
+def test_rows_round_trip():
+    rng = random.Random(3)
+    for _ in range(100):
+        rows = random_floating_board(rng)
+        board = BitBoard.from_rows(rows)
+        assert board.to_rows() == rows
+        assert board.column_heights() == ListBoard.from_rows(rows).column_heights()
+
+@pytest.mark.parametrize("seed", range(10))
+def test_list_and_bit_boards_play_the_same(seed):
+    """同じシード・同じ操作なら ListBoard と BitBoard で同じゲームになる"""
+    assert play_random_game(ListBoard, seed) == play_random_game(BitBoard, seed)
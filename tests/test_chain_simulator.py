@@ -0,0 +1,78 @@
+"""ChainSimulator（連鎖の予測）が実際に置いたときと同じ結果になること"""
+
+import random
+
+import pytest
+
+from puyo_engine import PuyoEngine, ListBoard, ChainSimulator, PuyoColor, zobrist_hash
+from puyo_bitboard import BitBoard
+from reference_rules import random_board
+
+def random_engine(board_class, rng):
+    engine = PuyoEngine(board_class, seed=rng.randrange(1000))
+    board = random_board(rng)
+    # 出現位置の列は空けておく
+    for row in board[:6]:
+        row[2] = PuyoColor.EMPTY
+    engine.load_board(board)
+    engine.apply_gravity()
+    engine.check_chains()
+    engine.score = 0
+    return engine
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+def test_simulation_matches_lock(board_class):
+    """置き方ごとの予測（得点・連鎖数・盤面）が lock_puyo で置いた結果と同じ"""
+    rng = random.Random(4)
+    chained = 0
+    for _ in range(40):
+        engine = random_engine(board_class, rng)
+        snapshot = engine.snapshot()
+        rows = engine.board.to_rows()
+        for placement in engine.get_placements():
+            result = engine.simulate_chains(placement)
+            assert engine.board.to_rows() == rows  # 予測では盤面を変えない
+            # (列, 向き) で指定しても同じ盤面になるので表から同じ結果が返る
+            assert engine.simulate_chains((placement.x, placement.rotation)) is result
+
+            engine.puyo_x, engine.puyo_y = placement.x, placement.y
+            engine.puyo_rotation = placement.rotation
+            lines_cleared = engine.lines_cleared
+            engine.lock_puyo()
+            assert engine.score == result.score
+            assert engine.lines_cleared - lines_cleared == result.chain_count
+            assert engine.board.to_rows() == result.board.to_rows()
+            assert engine.board_hash == result.board_hash == zobrist_hash(result.board)
+            chained += result.chain_count > 0
+            engine.restore(snapshot)
+    assert chained > 20
+
+def test_simulator_reuses_results():
+    """同じ盤面になる問い合わせは2回目から表を引くだけで答える"""
+    rng = random.Random(5)
+    simulator = ChainSimulator()
+    pair = [PuyoColor.RED, PuyoColor.RED]
+    board = ListBoard.from_rows(random_board(rng))
+    for row in board[:4]:
+        row[0] = row[1] = PuyoColor.EMPTY
+    board.apply_gravity()
+
+    first = simulator.simulate(board, (0, 0), pair)
+    assert (simulator.table.hits, simulator.table.misses) == (0, 1)
+    assert simulator.simulate(board, (0, 0), pair, board_hash=zobrist_hash(board)) is first
+    # 同色ペアは上下を入れ替えても同じ盤面
+    assert simulator.simulate(board, (0, 2), pair) is first
+    assert simulator.simulate(board, (1, 0), pair) is not first
+    assert (simulator.table.hits, simulator.table.misses) == (2, 2)
+
+    # 置いたあとの盤面を直接渡しても同じ結果
+    placed = board.copy()
+    for (x, y), color in ChainSimulator.place(board, (0, 0), pair):
+        placed[y][x] = color
+    assert simulator.simulate(placed) is first
+
+    simulator.table.clear()
+    again = simulator.simulate(board, (0, 0), pair)
+    assert again is not first
+    assert (again.score, again.chain_count) == (first.score, first.chain_count)
+    assert again.board.to_rows() == first.board.to_rows()
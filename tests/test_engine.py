@@ -0,0 +1,76 @@
+"""PuyoEngine のルールが元の PuyoGame と同じであること"""
+
+import random
+
+import pytest
+
+from puyo_engine import PuyoEngine, ListBoard, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE
+from puyo_bitboard import BitBoard
+from reference_rules import reference_chains, reference_gravity, random_board, random_floating_board
+
+def test_chains_match_reference():
+    """連鎖数・得点・消したあとの盤面が元の PuyoGame と同じ"""
+    rng = random.Random(1)
+    for _ in range(500):
+        board = random_board(rng)
+        expected = [list(row) for row in board]
+        chain_count, score = reference_chains(expected)
+
+        engine = PuyoEngine(seed=0)
+        engine.load_board(board)
+        assert engine.check_chains() == chain_count
+        assert engine.score == score
+        assert engine.board.to_rows() == expected
+
+def test_gravity_matches_reference():
+    """浮いたぷよを含む盤面の重力が元の PuyoGame と同じ"""
+    rng = random.Random(2)
+    for _ in range(200):
+        board = random_floating_board(rng)
+        expected = [list(row) for row in board]
+        reference_gravity(expected)
+
+        engine = PuyoEngine(seed=0)
+        engine.load_board(board)
+        assert engine.heights == engine.board.column_counts()
+        engine.apply_gravity()
+        assert engine.board.to_rows() == expected
+        assert engine.heights == engine.board.column_heights()
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+def test_heights_follow_board(board_class):
+    """置く・消す・おじゃまぷよが降るたびに列の高さが盤面と揃っている"""
+    for seed in range(5):
+        engine = PuyoEngine(board_class, seed=seed)
+        engine.ojama_interval = 2000
+        rng = random.Random(seed)
+        actions = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN]
+        while not engine.game_over:
+            engine.apply_action(rng.choice(actions))
+            engine.update(100)
+            assert engine.heights == engine.board.column_counts()
+        assert engine.max_chain_count > 0 and engine.ojama_received > 0
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+def test_heights_after_loading_floating_board(board_class):
+    """浮いたぷよのある盤面を読み込んで連鎖させても高さがずれない"""
+    rng = random.Random(3)
+    for _ in range(200):
+        engine = PuyoEngine(board_class, seed=0)
+        engine.load_board(random_floating_board(rng))
+        engine.apply_gravity()
+        engine.check_chains()
+        assert engine.heights == engine.board.column_heights() == engine.board.column_counts()
+
+def test_game_runs_without_pygame():
+    """画面なしでゲームオーバーまで進められる"""
+    engine = PuyoEngine(seed=4)
+    rng = random.Random(4)
+    actions = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN]
+    for _ in range(20000):
+        if engine.game_over:
+            break
+        engine.apply_action(rng.choice(actions))
+        engine.update(100)
+    assert engine.game_over
+    assert engine.pieces_placed > 0
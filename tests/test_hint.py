@@ -0,0 +1,29 @@
+"""ゲーム中のヒント"""
+
+from puyo_ai import BeamSearchAI
+from puyo_engine import PairQueue
+from puyo_hint import HintWorker
+from puyo_puzzle import Puzzle
+
+def test_hint_reads_puzzle_pairs():
+    """なぞぷよでは、シードから作った列ではなく決まったペアを読んでヒントを出す"""
+    pairs = ['RB', 'GY', 'GG', 'BB']
+    puzzle = Puzzle(['......',
+                     'G.....',
+                     'RGY...',
+                     'RRGY..'], pairs, goal='chain', chain=2)
+    engine = puzzle.create_engine()
+    # シードから作った列の3手目は問題のペアと違う
+    assert PairQueue(0).get(2) != list(puzzle.pair_colors()[2])
+
+    worker = HintWorker(BeamSearchAI(depth=3, beam_width=12, time_budget=10000))
+    try:
+        key = worker.state_key(engine)
+        settings = (engine.board_class, key[3], tuple(engine.KICK_OFFSETS))
+        hint = worker.search(engine.snapshot(), settings)
+    finally:
+        worker.stop()
+
+    assert worker.scratch.get_upcoming_pairs(1) == [list(puzzle.pair_colors()[2])]
+    expected = BeamSearchAI(depth=3, beam_width=12, time_budget=10000).choose(engine)
+    assert (hint.x, hint.rotation) == (expected.x, expected.rotation)
@@ -0,0 +1,26 @@
+"""シード付きのペアの列"""
+
+from puyo_engine import PuyoEngine, PairQueue
+
+def test_seeded_pairs_are_reproducible():
+    """同じシードのエンジンは同じ順番でペアを配る"""
+    first = PuyoEngine(seed=5)
+    second = PuyoEngine(seed=5)
+    assert first.get_upcoming_pairs(20) == second.get_upcoming_pairs(20)
+    assert PuyoEngine(seed=6).get_upcoming_pairs(20) != first.get_upcoming_pairs(20)
+
+def test_shared_queue_deals_same_order():
+    """1つの PairQueue を共有したエンジンには同じ順番でペアが配られる"""
+    queue = PairQueue(7)
+    first = PuyoEngine(pair_queue=queue)
+    second = PuyoEngine(pair_queue=queue)
+    for _ in range(10):
+        assert first.create_new_puyo() == second.create_new_puyo()
+
+def test_ojama_rng_is_separate():
+    """おじゃまぷよ用の乱数を使ってもペアの順番は変わらない"""
+    engine = PuyoEngine(seed=8)
+    expected = PairQueue(8).peek(2, 10)
+    for _ in range(50):
+        engine.ojama_rng.random()
+    assert engine.get_upcoming_pairs(10) == expected
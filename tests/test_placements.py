@@ -0,0 +1,118 @@
+"""置ける場所の列挙（generate_placements）"""
+
+import random
+
+from puyo_engine import (PuyoEngine, PuyoColor, ListBoard, BOARD_WIDTH, BOARD_HEIGHT,
+                         ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE,
+                         SEARCH_ROWS, generate_placements, placement_key)
+
+RED, BLUE = PuyoColor.RED, PuyoColor.BLUE
+COLORS = [PuyoColor.RED, PuyoColor.BLUE, PuyoColor.GREEN, PuyoColor.YELLOW, PuyoColor.OJAMA]
+
+def stacked_board(heights, rng):
+    """列ごとの高さ heights に色をランダムに積んだ盤面"""
+    board = ListBoard()
+    for x, height in enumerate(heights):
+        for y in range(BOARD_HEIGHT - height, BOARD_HEIGHT):
+            board[y][x] = rng.choice(COLORS)
+    return board
+
+def random_boards(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        heights = [rng.randint(0, BOARD_HEIGHT - 1) for _ in range(BOARD_WIDTH)]
+        heights[BOARD_WIDTH // 2 - 1] = rng.randint(0, BOARD_HEIGHT - 3)
+        yield stacked_board(heights, rng), [rng.choice(COLORS[:4]), rng.choice(COLORS[:4])]
+
+def engine_for(board, pair):
+    """盤面 board で pair を操作し始めるエンジン（連鎖は着地しても始めない）"""
+    engine = PuyoEngine(seed=0)
+    engine.load_board(board.copy())
+    engine.current_puyo = list(pair)
+    engine.chain_delay = 1000  # 着地後の盤面を連鎖の前に見る
+    return engine
+
+def drop(engine):
+    pair_index = engine.pair_index
+    while engine.pair_index == pair_index and engine.chain_phase is None and not engine.game_over:
+        engine.apply_action(ACTION_DOWN)
+
+def reachable_boards(board, pair):
+    """エンジンの操作を実際に試して届く置き方をすべて探し、置いたあとの盤面を返す"""
+    start = engine_for(board, pair)
+    origin = start.snapshot()
+    boards = set()
+    seen = {(start.puyo_x, start.puyo_y, start.puyo_rotation)}
+    queue = [origin]
+    while queue:
+        snapshot = queue.pop()
+        engine = engine_for(board, pair)
+        engine.restore(snapshot)
+        drop(engine)
+        boards.add(tuple(map(tuple, engine.board.to_rows())))
+        for action in (ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN):
+            engine.restore(snapshot)
+            if action == ACTION_DOWN and engine.puyo_y + 1 >= SEARCH_ROWS:
+                continue
+            if action == ACTION_DOWN:
+                if not engine.move_puyo(0, 1):
+                    continue
+            else:
+                engine.apply_action(action)
+            state = (engine.puyo_x, engine.puyo_y, engine.puyo_rotation)
+            if state not in seen:
+                seen.add(state)
+                queue.append(engine.snapshot())
+    return boards
+
+def test_same_color_pairs_are_deduplicated():
+    """同色ペアは上下・左右を入れ替えても同じ盤面なので1つにまとめる"""
+    board = ListBoard()
+    same = generate_placements(board, [RED, RED])
+    different = generate_placements(board, [RED, BLUE])
+    # 縦置き6列・横置き5通り（異なる色ならそれぞれ2倍）
+    assert len(same) == 11
+    assert len(different) == 22
+    for placements, pair in ((same, [RED, RED]), (different, [RED, BLUE])):
+        keys = [placement_key(pair, placement.main_pos, placement.sub_pos)
+                for placement in placements]
+        assert len(set(keys)) == len(keys)
+        boards = {tuple(map(tuple, placement.board.to_rows())) for placement in placements}
+        assert len(boards) == len(placements)
+
+def test_wall_kick_placements_are_reachable():
+    """左右が埋まった列からは、壁キックで回したときだけ壁の向こうへ出られる"""
+    heights = [0, BOARD_HEIGHT, 0, BOARD_HEIGHT, 0, 0]
+    board = stacked_board(heights, random.Random(1))
+    pair = [RED, BLUE]
+    kicked = generate_placements(board, pair)
+    assert {placement.x for placement in kicked} >= {2, 4}
+    assert all(placement.x == 2 for placement in generate_placements(board, pair, kick_offsets=()))
+
+    for placement in kicked:
+        engine = engine_for(board, pair)
+        for action in placement.actions:
+            engine.apply_action(action)
+        drop(engine)
+        assert engine.board.to_rows() == placement.board.to_rows()
+
+def test_actions_land_where_placement_says():
+    """各置き方の actions をエンジンで打つと、その置き方の盤面・位置に着地する"""
+    for board, pair in random_boards(60):
+        for placement in generate_placements(board, pair):
+            engine = engine_for(board, pair)
+            for action in placement.actions:
+                engine.apply_action(action)
+            assert (engine.puyo_x, engine.puyo_rotation) == (placement.x, placement.rotation)
+            drop(engine)
+            rows = engine.board.to_rows()
+            assert rows == placement.board.to_rows()
+            (main_x, main_y), (sub_x, sub_y) = placement.main_pos, placement.sub_pos
+            assert (rows[main_y][main_x], rows[sub_y][sub_x]) == tuple(pair)
+
+def test_all_reachable_placements_are_generated():
+    """エンジンの操作で届く置き方の結果と、列挙した置き方の結果が一致する"""
+    for board, pair in random_boards(40, seed=1):
+        generated = {tuple(map(tuple, placement.board.to_rows()))
+                     for placement in generate_placements(board, pair)}
+        assert generated == reachable_boards(board, pair)
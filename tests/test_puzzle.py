@@ -0,0 +1,42 @@
+"""なぞぷよのソルバー"""
+
+from puyo_engine import ACTION_DOWN
+from puyo_puzzle import Puzzle, PuzzleSolver
+
+def play_solution(puzzle, solution):
+    """解の手順をエンジンで打ち、Puzzle.result の判定を返す"""
+    engine = puzzle.create_engine()
+    for actions in solution.actions:
+        for action in actions:
+            engine.apply_action(action)
+        pair_index = engine.pair_index
+        while engine.pair_index == pair_index and not engine.game_over:
+            engine.apply_action(ACTION_DOWN)
+    return puzzle.result(engine)
+
+def test_chain_puzzle():
+    puzzle = Puzzle(['......',
+                     '......',
+                     'B.....',
+                     'RBBY..',
+                     'RRYY..'], ['RB', 'YY'], goal='chain', chain=2)
+    solver = PuzzleSolver()
+    solution = solver.solve(puzzle)
+    assert solution is not None
+    assert play_solution(puzzle, solution) is True
+
+def test_all_clear_before_last_pair():
+    """残りのペアを使い切る前に全消しできる問題も解ける（後のペアの色で枝を刈らない）"""
+    puzzle = Puzzle(['RR....'], ['RR', 'BG'], goal='all_clear')
+    solver = PuzzleSolver()
+    solution = solver.solve(puzzle)
+    assert solution is not None
+    assert len(solution.moves) == 1
+    assert play_solution(puzzle, solution) is True
+
+def test_impossible_all_clear():
+    """どう置いても1〜3個残る色がある問題は解なし（最後まで調べたうえで）"""
+    puzzle = Puzzle(['RRB...'], ['RR', 'GG'], goal='all_clear')
+    solver = PuzzleSolver()
+    assert solver.solve(puzzle) is None
+    assert solver.complete
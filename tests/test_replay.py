@@ -0,0 +1,62 @@
+"""リプレイの保存形式と再生"""
+
+import random
+
+from puyo_engine import (PuyoEngine, ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE,
+                         ACTION_GRAVITY)
+from puyo_bitboard import BitBoard
+from puyo_replay import Replay, encode_varint, decode_varint, zigzag, unzigzag, play_replay
+
+def record_game(seed=3, ojama_interval=700):
+    """ランダムな操作でゲームオーバーまで進めたリプレイとエンジン"""
+    engine = PuyoEngine(seed=seed)
+    engine.ojama_interval = ojama_interval
+    replay = Replay.start_recording(engine)
+    rng = random.Random(seed)
+    actions = [ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE]
+    while not engine.game_over:
+        for _ in range(rng.randrange(0, 3)):
+            engine.apply_action(rng.choice(actions))
+        for _ in range(rng.randrange(1, 4)):
+            engine.step()
+    replay.finish(engine)
+    return replay, engine
+
+def test_varint_round_trip():
+    for value in [0, 1, 127, 128, 300, 2 ** 32, 2 ** 63 + 5]:
+        out = bytearray()
+        encode_varint(value, out)
+        assert decode_varint(bytes(out), 0) == (value, len(out))
+    for value in [0, 1, -1, 63, -64, 12345, -12345]:
+        assert unzigzag(zigzag(value)) == value
+
+def test_bytes_round_trip():
+    replay, _ = record_game()
+    replay.kick_offsets = (1, -1)
+    restored = Replay.from_bytes(replay.to_bytes())
+    assert restored == replay
+
+def test_save_and_load(tmp_path):
+    replay, _ = record_game(seed=9)
+    path = tmp_path / "replay.bin"
+    replay.save(path)
+    assert Replay.load(path) == replay
+
+def test_replay_reproduces_game():
+    """再生すると記録したゲームと同じ盤面・得点になる（どちらの盤面の実装でも）"""
+    replay, engine = record_game()
+    replay = Replay.from_bytes(replay.to_bytes())
+    for board_class in (None, BitBoard):
+        result = play_replay(replay, board_class)
+        assert result.verified
+        assert result.engine.score == engine.score
+        assert result.engine.board.to_rows() == engine.board.to_rows()
+
+def test_tampered_replay_is_detected():
+    """途中からの操作を抜くと食い違いとして検出される"""
+    replay, _ = record_game()
+    half = len(replay.events) // 2
+    replay.events[half:] = [event for event in replay.events[half:]
+                            if event[1] == ACTION_GRAVITY]
+    result = play_replay(replay)
+    assert not result.verified
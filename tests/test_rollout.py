@@ -0,0 +1,46 @@
+"""モンテカルロ・ロールアウトによる置き方の評価"""
+
+import random
+
+from puyo_engine import PuyoEngine, ACTION_DOWN
+from puyo_puzzle import Puzzle
+from puyo_rollout import RolloutEvaluator, play_placement, run_rollout
+
+def outcomes(results):
+    return [(result.placement.actions, result.mean_score, result.mean_chain,
+             result.game_over_rate, result.rollouts) for result in results]
+
+def test_pool_matches_single_process():
+    """プロセスプールでもこのプロセスで実行しても同じ評価になる"""
+    engine = PuyoEngine(seed=2)
+    engine.ojama_interval = 2000
+    for _ in range(30):
+        engine.apply_action(ACTION_DOWN)
+    settings = dict(rollouts=6, horizon=8, batch_size=4, seed=1)
+    with RolloutEvaluator(workers=1, **settings) as evaluator:
+        expected = evaluator.evaluate(engine)
+    with RolloutEvaluator(workers=2, **settings) as evaluator:
+        assert outcomes(evaluator.evaluate(engine)) == outcomes(expected)
+    assert any(result.mean_score for result in expected)
+
+def test_rollouts_deal_puzzle_pairs():
+    """なぞぷよのエンジンではロールアウトにもそのパズルのペアが配られる"""
+    puzzle = Puzzle(['......',
+                     '......',
+                     'R.R.R.',
+                     'RBRBRB'], ['GY', 'BG', 'RR', 'RR', 'RR'], goal='chain', chain=1)
+    engine = puzzle.create_engine()
+    evaluator = RolloutEvaluator(rollouts=8, horizon=5, workers=1, seed=3)
+    results = evaluator.evaluate(engine)
+
+    # 同じ乱数で、パズルのエンジンを複製して実際に進めた結果と比べる
+    for result in results:
+        scores = []
+        for k in range(evaluator.rollouts):
+            rollout = puzzle.create_engine()
+            play_placement(rollout, result.placement.actions)
+            run_rollout(rollout, random.Random(f"3-{engine.pair_index}-{k}"),
+                        evaluator.horizon - 1)
+            scores.append(rollout.score)
+        assert result.mean_score == sum(scores) / len(scores)
+    assert any(result.mean_score for result in results)
@@ -0,0 +1,59 @@
+"""一括シミュレーションの方針"""
+
+import random
+
+from puyo_engine import PuyoEngine, ACTION_DOWN, BOARD_WIDTH, ROTATION_OFFSETS
+from puyo_puzzle import Puzzle
+from puyo_simulate import greedy_policy, random_policy, run_game, steer
+
+def test_greedy_uses_upright_rotation():
+    """向き0（副ぷよが上）で置くときだけ消せる盤面では、向き0を選んで消す"""
+    # 左の列に縦に置くと、上の赤が2列目の赤3つとつながる
+    puzzle = Puzzle(['.Y....',
+                     '.R....',
+                     '.R....',
+                     '.R....',
+                     '.G....',
+                     'GY....'], ['BR'], chain=1)
+    engine = puzzle.create_engine()
+    placement = greedy_policy(engine, random.Random(0))
+    assert (placement.x, placement.rotation) == (0, 0)
+
+    for action in placement.actions:
+        engine.apply_action(action)
+    pair_index = engine.pair_index
+    while engine.pair_index == pair_index:
+        engine.apply_action(ACTION_DOWN)
+    assert engine.max_chain_count == 1
+
+def test_greedy_game_runs():
+    result = run_game(0, greedy_policy, {'hard_drop': True, 'max_seconds': 20})
+    assert result['pieces_placed'] > 0
+
+def drop(engine):
+    pair_index = engine.pair_index
+    while engine.pair_index == pair_index and not engine.game_over:
+        engine.apply_action(ACTION_DOWN)
+
+def test_steer_upright_reaches_edges():
+    """出現位置から向き0のまま両端の列まで動かせる"""
+    for x in (0, 5):
+        engine = PuyoEngine(seed=1)
+        steer(engine, x, 0)
+        assert (engine.puyo_x, engine.puyo_rotation) == (x, 0)
+        drop(engine)
+        assert engine.heights[x] == 2
+
+def test_random_policy_columns():
+    """random_policy の (列, 向き) どおりに置かれ、列2に偏らない"""
+    rng = random.Random(0)
+    for _ in range(40):
+        engine = PuyoEngine(seed=rng.randrange(1000))
+        x, rotation = random_policy(engine, rng)
+        steer(engine, x, rotation)
+        drop(engine)
+        main_x = x
+        sub_x = x + ROTATION_OFFSETS[rotation][0]
+        if 0 <= sub_x < BOARD_WIDTH:
+            assert engine.heights[main_x] > 0 and engine.heights[sub_x] > 0
+            assert sum(engine.heights) == 2
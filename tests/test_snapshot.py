@@ -0,0 +1,78 @@
+"""GameSnapshot による状態の保存と巻き戻し"""
+
+import pickle
+import random
+
+import pytest
+
+from puyo_engine import (PuyoEngine, ListBoard, GameSnapshot,
+                         ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE)
+from puyo_bitboard import BitBoard
+
+ACTIONS = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN]
+
+def state(engine):
+    """比べたいエンジンの状態（スナップショットを使わずに取り出す）"""
+    dirty_cells = None if engine.dirty_cells is None else set(engine.dirty_cells)
+    return (engine.board.to_rows(), list(engine.heights), engine.board_hash,
+            list(engine.current_puyo), list(engine.next_puyo), engine.pair_index,
+            engine.puyo_x, engine.puyo_y, engine.puyo_rotation,
+            engine.score, engine.ojama_count, engine.ojama_timer, engine.ojama_received,
+            engine.chain_phase, engine.chain_timer, engine.chain_count, engine.game_over,
+            engine.ojama_rng.getstate(), dirty_cells)
+
+def play(engine, actions):
+    trace = []
+    for action in actions:
+        if engine.game_over:
+            break
+        engine.apply_action(action)
+        engine.update(100)
+        trace.append(state(engine))
+    return trace
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+@pytest.mark.parametrize("chain_delay", [0, 150])
+def test_restore_continues_identically(board_class, chain_delay):
+    """スナップショットから戻すと、そのあとの展開が1手ずつ同じになる"""
+    rng = random.Random(3)
+    engine = PuyoEngine(board_class, seed=3)
+    engine.ojama_interval = 1500
+    engine.chain_delay = chain_delay
+    play(engine, [rng.choice(ACTIONS) for _ in range(200)])
+    assert engine.ojama_received > 0 and not engine.game_over
+
+    snapshot = engine.snapshot()
+    before = state(engine)
+    actions = [rng.choice(ACTIONS) for _ in range(300)]
+    first = play(engine, actions)
+    assert engine.pair_index > snapshot.pair_index
+
+    engine.restore(snapshot)
+    assert state(engine) == before
+    assert play(engine, actions) == first
+
+    # 別のエンジンに戻しても同じ
+    other = PuyoEngine(board_class, seed=99)
+    other.ojama_interval = 1500
+    other.chain_delay = chain_delay
+    other.pair_queue = engine.pair_queue
+    other.restore(snapshot)
+    assert state(other) == before
+    assert play(other, actions) == first
+
+def test_snapshot_is_immutable_and_picklable():
+    engine = PuyoEngine(seed=1)
+    play(engine, [ACTION_DOWN] * 50)
+    snapshot = engine.snapshot()
+    assert snapshot.score == engine.score
+    assert snapshot.pair_index == engine.pair_index
+    with pytest.raises(AttributeError):
+        snapshot.unknown
+    with pytest.raises(AttributeError):
+        snapshot.score = 0
+
+    copied = pickle.loads(pickle.dumps(snapshot))
+    assert isinstance(copied, GameSnapshot)
+    assert copied == snapshot and hash(copied) == hash(snapshot)
+    assert engine.snapshot() == snapshot
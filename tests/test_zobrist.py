@@ -0,0 +1,59 @@
+"""盤面の Zobrist ハッシュと置換表"""
+
+import random
+
+import pytest
+
+from puyo_engine import (PuyoEngine, ListBoard, TranspositionTable, zobrist_hash,
+                         ACTION_LEFT, ACTION_RIGHT, ACTION_DOWN, ACTION_ROTATE)
+from puyo_bitboard import BitBoard
+from reference_rules import random_board
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+def test_incremental_hash_matches_full_hash(board_class):
+    """配置・重力・おじゃまぷよのあとも差分で更新したハッシュが作り直したものと同じ"""
+    for seed in range(5):
+        engine = PuyoEngine(board_class, seed=seed)
+        engine.ojama_interval = 2000
+        rng = random.Random(seed)
+        actions = [ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_DOWN]
+        dropped = False
+        while not engine.game_over:
+            engine.apply_action(rng.choice(actions))
+            engine.update(100)
+            assert engine.board_hash == zobrist_hash(engine.board)
+            dropped = dropped or engine.ojama_received > 0
+        assert dropped
+
+@pytest.mark.parametrize("board_class", [ListBoard, BitBoard])
+def test_hash_after_chains(board_class):
+    rng = random.Random(1)
+    for _ in range(200):
+        engine = PuyoEngine(board_class, seed=0)
+        engine.load_board(random_board(rng))
+        engine.check_chains()
+        assert engine.board_hash == zobrist_hash(engine.board)
+
+def test_hash_distinguishes_boards():
+    empty = ListBoard()
+    assert zobrist_hash(empty) == 0
+    rng = random.Random(2)
+    hashes = {zobrist_hash(ListBoard.from_rows(random_board(rng))) for _ in range(200)}
+    assert len(hashes) > 190
+
+def test_transposition_table_evicts_least_recently_used():
+    table = TranspositionTable(capacity=2)
+    table.put('a', 1)
+    table.put('b', 2)
+    assert table.get('a') == 1  # a を使ったので次に捨てられるのは b
+    table.put('c', 3)
+    assert 'b' not in table
+    assert table.get('a') == 1
+    assert table.get('c') == 3
+    assert table.get('b', 'none') == 'none'
+    assert len(table) == 2
+    assert (table.hits, table.misses) == (3, 1)
+
+    table.clear()
+    assert len(table) == 0
+    assert (table.hits, table.misses) == (0, 0)